@@ -0,0 +1,381 @@
+import json
+import time
+import random
+import threading
+import zlib
+
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from hotjar.const import *
+
+FAKE_USER_ID = 1000
+FAKE_ACCESS_KEY = "fake-access-key"
+FAKE_SESSION_COOKIE = "fake_session"
+
+
+class FakeHotjarConfig:
+    def __init__(self,
+                 sites: int = 1,
+                 funnels: int = 5,
+                 steps: int = 4,
+                 days: int = 365,
+                 density: float = 0.3,
+                 widgets: int = 1,
+                 feedbacks: int = 1000,
+                 latency: float = 0.0,
+                 error_rate: float = 0.0,
+                 throttle_rate: float = 0.0,
+                 retry_after: int = 0,
+                 seed: int = 1):
+        """
+        :param sites: sites of the user
+        :param funnels: funnels per site
+        :param steps: steps per funnel
+        :param days: days since sites (and their funnels) were created
+        :param density: share of days with visits
+        :param widgets: feedback widgets per site
+        :param feedbacks: feedbacks per widget
+        :param latency: seconds to wait before each response
+        :param error_rate: share of requests answered with 500
+        :param throttle_rate: share of requests answered with 429
+        :param retry_after: Retry-After of throttled requests
+        :param seed: seed of injected errors
+        """
+        self.sites = sites
+        self.funnels = funnels
+        self.steps = steps
+        self.days = days
+        self.density = density
+        self.widgets = widgets
+        self.feedbacks = feedbacks
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.seed = seed
+
+
+class FakeHotjarData:
+    """
+    Synthetic account, every value is derived from ids and day,
+    so responses are the same across runs and no data is held in memory
+    """
+    def __init__(self, config: FakeHotjarConfig):
+        self._config = config
+
+        today = date.today()
+        created = datetime(today.year, today.month, today.day).timestamp() - config.days * 24 * 60 * 60
+
+        self.created = int(created)
+
+    def get_resources(self) -> dict:
+        sites = [{
+            PROP_ID: site_id,
+            PROP_NAME: f"Site {site_id}",
+            PROP_CREATED: self.created
+        } for site_id in self.get_site_ids()]
+
+        return {"sites": sites}
+
+    def get_site_ids(self) -> list:
+        return [100 + index for index in range(self._config.sites)]
+
+    def get_funnel_ids(self, site_id: int) -> list:
+        return [site_id * 1000 + index for index in range(self._config.funnels)]
+
+    def get_step_ids(self, funnel_id: int) -> list:
+        return [funnel_id * 100 + index for index in range(self._config.steps)]
+
+    def get_funnels(self, site_id: int) -> list:
+        funnels = [{
+            PROP_ID: funnel_id,
+            PROP_NAME: f"Funnel {funnel_id}",
+            PROP_CREATED_EPOCH_TIME: self.created
+        } for funnel_id in self.get_funnel_ids(site_id)]
+
+        return funnels
+
+    def get_funnel(self, site_id: int, funnel_id: int) -> dict:
+        steps = [{
+            PROP_ID: step_id,
+            PROP_NAME: f"Step {step_id}",
+            PROP_URL: f"https://site{site_id}.example.com/step/{step_id}"
+        } for step_id in self.get_step_ids(funnel_id)]
+
+        funnel = {
+            PROP_ID: funnel_id,
+            PROP_NAME: f"Funnel {funnel_id}",
+            PROP_CREATED_EPOCH_TIME: self.created,
+            PROP_STEPS: steps
+        }
+
+        return funnel
+
+    def get_funnel_counts(self, funnel_id: int, from_time: float, to_time: float) -> dict:
+        first_day = date.fromtimestamp(from_time).toordinal()
+        last_day = date.fromtimestamp(to_time).toordinal()
+        step_ids = self.get_step_ids(funnel_id)
+
+        totals = [0] * len(step_ids)
+
+        for day in range(first_day, last_day + 1):
+            visits = self.get_visits(funnel_id, day)
+
+            if visits > 0:
+                for position in range(len(step_ids)):
+                    # Every step loses about half of the visitors of the previous step
+                    totals[position] += visits >> position
+
+        result = {
+            PROP_VISIT_COUNTS_PER_STEP: {str(step_id): total for step_id, total in zip(step_ids, totals)}
+        }
+
+        return result
+
+    def get_visits(self, funnel_id: int, day: int) -> int:
+        value = zlib.crc32(f"{funnel_id}:{day}".encode("ascii"))
+
+        if value % 10000 >= self._config.density * 10000:
+            return 0
+
+        return value % 997 + 1
+
+    def get_feedback_widgets(self, site_id: int) -> list:
+        widgets = [{
+            PROP_ID: site_id * 10 + index,
+            PROP_NAME: f"Widget {site_id * 10 + index}"
+        } for index in range(self._config.widgets)]
+
+        return widgets
+
+    def get_feedbacks(self, widget_id: int, offset: int, amount: int) -> dict:
+        count = self._config.feedbacks
+        last = min(count, offset + amount)
+
+        # Newest first, ids are descending
+        data = [self.get_feedback(widget_id, count - index) for index in range(offset, last)]
+
+        return {"count": count, "data": data}
+
+    def get_feedback(self, widget_id: int, index: int) -> dict:
+        created = self.created + index * 60
+
+        feedback = {
+            "browser": "chrome",
+            "content": {"emotion": index % 5, "answer": f"Feedback #{index}"},
+            "created_datetime_string": datetime.fromtimestamp(created).isoformat(),
+            "created_epoch_time": created,
+            "country_code": "IL",
+            "country_name": "Israel",
+            "device": "desktop",
+            PROP_ID: widget_id * 10000000 + index,
+            "image_url": None,
+            "index": index,
+            "os": "linux",
+            "response_url": f"https://example.com/page/{index % 50}",
+            "short_visitor_uuid": f"{index:08x}",
+            "thumbnail_url": None,
+            "window_size": "1920x1080",
+        }
+
+        return feedback
+
+    def get_sentiment(self) -> dict:
+        feedbacks = self._config.feedbacks
+
+        return {"hate": feedbacks // 10, "dislike": feedbacks // 10, "neutral": feedbacks // 5,
+                "like": feedbacks // 4, "love": feedbacks - feedbacks // 10 * 2 - feedbacks // 5 - feedbacks // 4}
+
+
+class FakeHotjarServer:
+    """
+    Local stand-in of the Hotjar endpoints used by HotjarAPI / AsyncHotjarAPI,
+    with configurable latency, injected errors and data volume
+    """
+    def __init__(self, config: FakeHotjarConfig, host: str = "localhost", port: int = 0):
+        self._config = config
+        self._host = host
+        self._data = FakeHotjarData(config)
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+        self._server = ThreadingHTTPServer((host, port), self._create_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        port = self._server.server_address[1]
+
+        return f"http://{self._host}:{port}"
+
+    @property
+    def data(self) -> FakeHotjarData:
+        return self._data
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            result = dict(self._stats)
+
+        return result
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-hotjar", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+    def _get_injected_status(self):
+        with self._lock:
+            value = self._random.random()
+
+        if value < self._config.throttle_rate:
+            return HTTP_STATUS_TOO_MANY_REQUESTS
+
+        if value < self._config.throttle_rate + self._config.error_rate:
+            return 500
+
+        return None
+
+    def _route(self, path: str, query: dict):
+        """
+        :return: endpoint name and response data, None when path is unknown
+        """
+        data = self._data
+        parts = path.strip("/").split("/")
+
+        if path == USER_INFO_PATH:
+            return "user_info", {PROP_ID: FAKE_USER_ID, "email": "user@example.com"}
+
+        if path == RESOURCES_PATH.format(user_id=FAKE_USER_ID):
+            return "resources", data.get_resources()
+
+        if not path.startswith(f"{QUERY_PATH}/") or len(parts) < 5:
+            return None
+
+        site_id = int(parts[3])
+        endpoint = parts[4]
+        rest = parts[5:]
+
+        if endpoint == ENDPOINT_FUNNELS:
+            if len(rest) == 0:
+                return "funnels", data.get_funnels(site_id)
+
+            funnel_id = int(rest[0])
+
+            if len(rest) == 1:
+                return "funnel", data.get_funnel(site_id, funnel_id)
+
+            if rest[1] == "counts":
+                from_time = float(query["start_date"][0])
+                to_time = float(query["end_date"][0])
+
+                return "funnel_counts", data.get_funnel_counts(funnel_id, from_time, to_time)
+
+        if endpoint == ENDPOINT_FEEDBACK:
+            if len(rest) == 0:
+                return "feedback_widgets", data.get_feedback_widgets(site_id)
+
+            widget_id = int(rest[0])
+
+            if rest[1:] == ["responses"]:
+                offset = int(query.get("offset", ["0"])[0])
+                amount = int(query.get("amount", ["100"])[0])
+
+                return "feedbacks", data.get_feedbacks(widget_id, offset, amount)
+
+            if rest[1:] == ["responses", "sentiment"]:
+                return "sentiment", data.get_sentiment()
+
+        if endpoint in [ENDPOINT_STATISTICS, ENDPOINT_FEED]:
+            return endpoint, {}
+
+        return None
+
+    def _create_handler(self):
+        server = self
+
+        class FakeHotjarHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            # Headers and body are written separately, keep-alive clients would wait for delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+
+                if urlparse(self.path).path != LOGIN_PATH:
+                    self._send(404, {"error": "not found"})
+                    return
+
+                server._count("login")
+
+                headers = {"Set-Cookie": f"{FAKE_SESSION_COOKIE}=1; Path=/"}
+                body = {"access_key": FAKE_ACCESS_KEY, "success": True, "user_id": FAKE_USER_ID}
+
+                self._send(200, body, headers)
+
+            def do_GET(self):
+                if server._config.latency > 0:
+                    time.sleep(server._config.latency)
+
+                url = urlparse(self.path)
+
+                if f"{FAKE_SESSION_COOKIE}=1" not in self.headers.get("Cookie", ""):
+                    server._count("unauthorized")
+
+                    self._send(401, {"error": "unauthorized"})
+                    return
+
+                status = server._get_injected_status()
+
+                if status is not None:
+                    server._count(f"status_{status}")
+
+                    self._send(status, {"error": "injected"}, {"Retry-After": str(server._config.retry_after)})
+                    return
+
+                route = server._route(url.path, parse_qs(url.query))
+
+                if route is None:
+                    self._send(404, {"error": "not found"})
+                    return
+
+                endpoint, data = route
+
+                server._count(endpoint)
+
+                self._send(200, data)
+
+            def _send(self, status: int, data, headers: dict = None):
+                body = json.dumps(data).encode("utf-8")
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+
+                self.end_headers()
+                self.wfile.write(body)
+
+        return FakeHotjarHandler
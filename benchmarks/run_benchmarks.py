@@ -0,0 +1,235 @@
+"""
+Benchmarks of the sync pipeline against the local fake Hotjar server
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks --sites 2 --funnels 5 --days 365 --latency 0.005
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import tracemalloc
+
+import flask
+
+from benchmarks.fake_hotjar import FakeHotjarConfig, FakeHotjarServer
+
+
+class BenchmarkResult:
+    def __init__(self, name: str, wall_time: float, operations: int, api_calls: dict, peak_memory=None):
+        """
+        :param name: scenario name
+        :param wall_time: seconds
+        :param operations: operations performed (API requests, HTTP requests served or feedbacks exported)
+        :param api_calls: requests received by the fake server per endpoint
+        :param peak_memory: peak of traced memory (bytes), None when memory was not traced
+        """
+        self.name = name
+        self.wall_time = wall_time
+        self.operations = operations
+        self.api_calls = api_calls
+        self.peak_memory = peak_memory
+
+    @property
+    def operations_per_second(self) -> float:
+        return 0.0 if self.wall_time == 0 else self.operations / self.wall_time
+
+    def to_dict(self) -> dict:
+        result = {
+            "name": self.name,
+            "wall_time": round(self.wall_time, 3),
+            "operations": self.operations,
+            "operations_per_second": round(self.operations_per_second, 1),
+            "peak_memory": self.peak_memory,
+            "api_calls": self.api_calls,
+        }
+
+        return result
+
+
+class BenchmarkRunner:
+    def __init__(self, server: FakeHotjarServer, trace_memory: bool = True):
+        self._server = server
+        self._trace_memory = trace_memory
+
+    def measure(self, name: str, action, operations=None) -> BenchmarkResult:
+        """
+        Run the action once and measure it
+
+        :param name: scenario name
+        :param action: function to measure, may return the operations performed
+        :param operations: operations performed, None - API calls received by the fake server
+        :return: benchmark result
+        """
+        self._server.reset_stats()
+
+        if self._trace_memory:
+            tracemalloc.start()
+
+        started = time.perf_counter()
+
+        performed = action()
+
+        wall_time = time.perf_counter() - started
+        peak_memory = None
+
+        if self._trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+
+            tracemalloc.stop()
+
+        api_calls = self._server.stats
+
+        if operations is None:
+            operations = performed if performed is not None else sum(api_calls.values())
+
+        return BenchmarkResult(name, wall_time, operations, api_calls, peak_memory)
+
+
+def create_web_service(base_url: str, arguments):
+    """
+    WebService configured against the fake server, updates are triggered by the benchmark only
+    """
+    os.environ.update({
+        "ENVIRONMENT": "benchmark",
+        "HOTJAR_USERNAME": "user@example.com",
+        "HOTJAR_PASSWORD": "password",
+        "HOTJAR_BASE_URL": base_url,
+        "HOTJAR_INTERVAL": "0",
+        "HOTJAR_ASYNC": str(arguments.use_async).lower(),
+        "HOTJAR_MAX_IN_FLIGHT": str(arguments.max_in_flight),
+        "HOTJAR_PARALLEL_SITES": str(arguments.parallel_sites),
+        "HOTJAR_PARALLEL_FUNNELS": str(arguments.parallel_funnels),
+        "HOTJAR_STORAGE": arguments.storage,
+        "HOTJAR_BACKFILL_STRATEGY": arguments.backfill_strategy,
+        "HOTJAR_RATE_LIMIT": str(arguments.rate_limit),
+        "HOTJAR_PERSIST_SESSION": "false",
+        "HOTJAR_API_CACHE_PERSIST": "false",
+    })
+
+    # Environment is read by WebService.initialize, loggers of the service are created at DEBUG level on import
+    from index import WebService
+
+    for name in list(logging.Logger.manager.loggerDict.keys()):
+        logging.getLogger(name).setLevel(arguments.log_level)
+
+    web_service = WebService(flask.Flask("benchmark"))
+    web_service.initialize()
+
+    return web_service
+
+
+def run_benchmarks(arguments) -> list:
+    config = FakeHotjarConfig(sites=arguments.sites,
+                              funnels=arguments.funnels,
+                              steps=arguments.steps,
+                              days=arguments.days,
+                              density=arguments.density,
+                              widgets=1,
+                              feedbacks=arguments.feedbacks,
+                              latency=arguments.latency,
+                              error_rate=arguments.error_rate,
+                              throttle_rate=arguments.throttle_rate)
+
+    server = FakeHotjarServer(config)
+    server.start()
+
+    runner = BenchmarkRunner(server, not arguments.no_memory)
+    results = []
+
+    # Storage writes into the current directory outside of the production environment
+    os.chdir(tempfile.mkdtemp(prefix="hotjar-benchmark-"))
+
+    web_service = None
+
+    try:
+        web_service = create_web_service(server.base_url, arguments)
+        client = web_service.web_server.test_client()
+
+        results.append(runner.measure("cold_backfill", web_service.run_update_cycle))
+        results.append(runner.measure("steady_update", web_service.run_update_cycle))
+
+        for path in ["/json", "/flat", "/flat?stream=ndjson"]:
+            def serve():
+                for _ in range(arguments.requests):
+                    response = client.get(path)
+                    response.get_data()
+
+                return arguments.requests
+
+            results.append(runner.measure(f"serve {path}", serve))
+
+        site_id = server.data.get_site_ids()[0]
+        widget_id = server.data.get_feedback_widgets(site_id)[0]["id"]
+
+        def export_feedbacks():
+            feedbacks = web_service.api.iter_feedbacks(site_id, widget_id, "", prefetch=arguments.max_in_flight)
+
+            return sum(1 for _ in feedbacks)
+
+        results.append(runner.measure("feedback_export", export_feedbacks))
+
+    finally:
+        if web_service is not None:
+            web_service.close()
+
+        server.stop()
+
+    return results
+
+
+def print_results(results: list):
+    print(f"{'scenario':<24}{'wall (s)':>10}{'ops':>10}{'ops/s':>12}{'peak MB':>10}{'api calls':>12}")
+
+    for result in results:
+        peak_memory = "-" if result.peak_memory is None else f"{result.peak_memory / 1024 / 1024:.1f}"
+
+        print(f"{result.name:<24}{result.wall_time:>10.3f}{result.operations:>10}"
+              f"{result.operations_per_second:>12.1f}{peak_memory:>10}{sum(result.api_calls.values()):>12}")
+
+    print()
+
+    for result in results:
+        if len(result.api_calls) > 0:
+            print(f"{result.name}: {json.dumps(result.api_calls, sort_keys=True)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the sync pipeline against a fake Hotjar server")
+
+    parser.add_argument("--sites", type=int, default=1)
+    parser.add_argument("--funnels", type=int, default=5)
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--density", type=float, default=0.3, help="share of days with visits")
+    parser.add_argument("--feedbacks", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per fake API response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake API responses with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of fake API responses with 429")
+    parser.add_argument("--requests", type=int, default=20, help="requests per served endpoint")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use the async API client")
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--parallel-sites", type=int, default=2)
+    parser.add_argument("--parallel-funnels", type=int, default=4)
+    parser.add_argument("--storage", default="sqlite")
+    parser.add_argument("--backfill-strategy", default="daily")
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests per second, 0 - unlimited")
+    parser.add_argument("--log-level", default="ERROR")
+    parser.add_argument("--no-memory", action="store_true", help="skip memory tracing (faster, less overhead)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+
+    arguments = parser.parse_args()
+
+    results = run_benchmarks(arguments)
+
+    if arguments.json:
+        print(json.dumps([result.to_dict() for result in results], indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+
+def write_atomic(file: str, content):
+    """
+    Write file content using temp file, fsync and rename,
+    the file is either fully replaced or left untouched
+
+    :param file: path of the file
+    :param content: str or bytes
+    """
+    directory = os.path.dirname(os.path.abspath(file))
+    mode = "wb" if isinstance(content, bytes) else "w"
+
+    handle, temp_file = tempfile.mkstemp(prefix=f".{os.path.basename(file)}.", suffix=".tmp", dir=directory)
+
+    try:
+        with os.fdopen(handle, mode) as outfile:
+            outfile.write(content)
+            outfile.flush()
+
+            os.fsync(outfile.fileno())
+
+        os.replace(temp_file, file)
+
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+        raise
+
+    fsync_directory(directory)
+
+
+def append_durable(file: str, line: str):
+    """
+    Append line to file and fsync it
+
+    :param file: path of the file
+    :param line: line to append, without line break
+    """
+    with open(file, "a") as outfile:
+        outfile.write(f"{line}\n")
+        outfile.flush()
+
+        os.fsync(outfile.fileno())
+
+
+def fsync_directory(directory: str):
+    # Makes the rename durable, not supported on all platforms
+    try:
+        handle = os.open(directory, os.O_RDONLY)
+
+        try:
+            os.fsync(handle)
+        finally:
+            os.close(handle)
+
+    except OSError:
+        pass
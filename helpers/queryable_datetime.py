@@ -1,56 +1,144 @@
 import datetime
 
+from array import array
+from functools import lru_cache
+from typing import Optional
 
-class QueryableDateTime(object):
-    def __init__(self, epoch: float):
-        self._epoch = epoch
-        self._date = self._get_date_from_epoch(epoch)
+DAY_CACHE_SIZE = 1 << 16
 
-    @property
-    def date(self) -> datetime:
-        return self._date
 
-    @property
-    def from_time(self) -> int:
-        return int(self.date.timestamp())
+@lru_cache(maxsize=DAY_CACHE_SIZE)
+def get_day_start(ordinal: int, tz: Optional[datetime.tzinfo] = None) -> int:
+    """
+    Start of the day (epoch)
 
-    @property
-    def to_time(self) -> int:
-        to_time = datetime.datetime(self.date.year, self.date.month, self.date.day, 23, 59, 59)
+    :param ordinal: date ordinal
+    :param tz: timezone of the day boundaries, None - local time
+    :return: epoch of midnight
+    """
+    day = datetime.date.fromordinal(ordinal)
+
+    return int(datetime.datetime(day.year, day.month, day.day, tzinfo=tz).timestamp())
+
+
+@lru_cache(maxsize=DAY_CACHE_SIZE)
+def get_day_iso(ordinal: int) -> str:
+    return datetime.date.fromordinal(ordinal).isoformat()
+
+
+@lru_cache(maxsize=DAY_CACHE_SIZE)
+def get_epoch_datetime(epoch: float, tz: Optional[datetime.tzinfo] = None) -> datetime.datetime:
+    """
+    Datetime of epoch, shared between callers (datetime is immutable)
+
+    :param epoch: epoch
+    :param tz: timezone, None - local time (naive datetime)
+    """
+    return datetime.datetime.fromtimestamp(epoch, tz)
+
+
+def get_day_ordinal(epoch: float, tz: Optional[datetime.tzinfo] = None) -> int:
+    return datetime.datetime.fromtimestamp(epoch, tz).toordinal()
+
+
+class DayRange(object):
+    """
+    Consecutive days as (from, to) epochs without an object per day,
+    day boundaries are computed once per day in explicit timezone (None - local time)
+    and stored in a single array, to time of a day is the second before the next day starts
+    """
+    __slots__ = ["_first_day", "_tz", "_starts"]
+
+    def __init__(self, first_day: int, last_day: int, tz: Optional[datetime.tzinfo] = None):
+        """
+        :param first_day: ordinal of the first day
+        :param last_day: ordinal of the last day (inclusive)
+        :param tz: timezone of the day boundaries, None - local time
+        """
+        self._first_day = first_day
+        self._tz = tz
 
-        return int(to_time.timestamp())
+        days = last_day - first_day + 1
+
+        # Start of every day and of the day after the last one
+        self._starts = array("q", [get_day_start(first_day + position, tz) for position in range(days + 1)]
+                             if days > 0 else [])
 
     @staticmethod
-    def _get_date_from_epoch(epoch) -> datetime:
-        date = datetime.datetime.fromtimestamp(epoch)
+    def since(epoch: float, until: Optional[float] = None, tz: Optional[datetime.tzinfo] = None):
+        """
+        Days from the day of epoch until the day of until (inclusive)
+
+        :param epoch: epoch within the first day
+        :param until: epoch within the last day, None - today
+        :param tz: timezone of the day boundaries, None - local time
+        :return: day range
+        """
+        if until is None:
+            last_day = datetime.datetime.now(tz).toordinal()
+        else:
+            last_day = get_day_ordinal(until, tz)
+
+        return DayRange(get_day_ordinal(epoch, tz), last_day, tz)
+
+    @property
+    def tz(self) -> Optional[datetime.tzinfo]:
+        return self._tz
+
+    def __len__(self):
+        return max(0, len(self._starts) - 1)
+
+    def __iter__(self):
+        """
+        (from, to) epochs of the days
+        """
+        starts = self._starts
 
-        return date
+        for position in range(len(starts) - 1):
+            yield starts[position], starts[position + 1] - 1
 
     def __repr__(self):
-        return f"Date: {self.date}, From: {self.from_time}, To: {self.to_time}"
+        if len(self) == 0:
+            return "Days: 0"
+
+        return f"Days: {len(self)}, From: {self.get_date_iso(0)}, To: {self.get_date_iso(len(self) - 1)}"
+
+    def get_ordinal(self, position: int) -> int:
+        return self._first_day + position
 
-    def _get_epoch_since(self) -> list:
-        start_date = self._date
-        today = datetime.datetime.today()
-        days_since = (today - start_date).days
+    def get_date_iso(self, position: int) -> str:
+        return get_day_iso(self._first_day + position)
 
-        dates = []
+    def get_from_time(self, position: int) -> int:
+        return self._starts[position]
 
-        for i in range(days_since + 1):
-            day = start_date + datetime.timedelta(days=i)
-            current_date = datetime.datetime(day.year, day.month, day.day)
+    def get_to_time(self, position: int) -> int:
+        return self._starts[position + 1] - 1
 
-            dates.append(current_date.timestamp())
 
-        return dates
+class QueryableDateTime(object):
+    def __init__(self, epoch: float, tz: Optional[datetime.tzinfo] = None):
+        self._epoch = epoch
+        self._tz = tz
+        self._date = get_epoch_datetime(epoch, tz)
+
+    @property
+    def date(self) -> datetime:
+        return self._date
 
-    def get_all_since(self) -> list:
-        epoch_list = self._get_epoch_since()
-        result = []
+    @property
+    def from_time(self) -> int:
+        return get_day_start(self._date.toordinal(), self._tz)
 
-        for epoch in epoch_list:
-            queryable_datetime = QueryableDateTime(epoch)
+    @property
+    def to_time(self) -> int:
+        return get_day_start(self._date.toordinal() + 1, self._tz) - 1
 
-            result.append(queryable_datetime)
+    def __repr__(self):
+        return f"Date: {self.date}, From: {self.from_time}, To: {self.to_time}"
 
-        return result
\ No newline at end of file
+    def get_all_since(self) -> DayRange:
+        """
+        Days from the day of this date until today
+        """
+        return DayRange.since(self._epoch, tz=self._tz)
@@ -0,0 +1,76 @@
+import hashlib
+import threading
+
+
+class CachedResponse:
+    def __init__(self, generation: int, body: bytes):
+        self.generation = generation
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+
+
+class ResponseCache:
+    """
+    Serialized responses, built once per generation,
+    generation is increased whenever the underlying data might have changed
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._generation = 0
+        self._items = {}
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidate(self, generation: int = None):
+        """
+        Drop cached responses
+
+        :param generation: new generation (generation of the published data), None - next generation
+        """
+        with self._lock:
+            self._generation = self._generation + 1 if generation is None else generation
+            self._items = {}
+
+    def get(self, key: str, serialize) -> CachedResponse:
+        """
+        Get cached response, build it when it is not available for the current generation
+
+        :param key: response key
+        :param serialize: function returning the response body (bytes / str)
+        :return: cached response
+        """
+        item = self._items.get(key)
+
+        if item is None or item.generation != self._generation:
+            # Single build per key and generation, concurrent requests of the key wait for it,
+            # requests of other keys are not blocked by the build
+            with self._get_key_lock(key):
+                item = self._items.get(key)
+
+                if item is None or item.generation != self._generation:
+                    generation = self._generation
+                    body = serialize()
+
+                    if isinstance(body, str):
+                        body = body.encode("utf-8")
+
+                    item = CachedResponse(generation, body)
+
+                    with self._lock:
+                        self._items[key] = item
+
+        return item
+
+    def _get_key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+
+            if lock is None:
+                lock = threading.Lock()
+
+                self._key_locks[key] = lock
+
+        return lock
@@ -1,45 +1,78 @@
 import json
-import math
+import time
 import requests
+import threading
 
-from typing import Optional
+from typing import Optional, Iterator
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from helpers.docker_logger import get_logger
 
 from .const import *
 from .exceptions import AuthorizationError
+from .api_cache import ApiCache
+from .base_api import BaseHotjarAPI, FeedbacksDeduplicator
+from .metrics import API_REQUEST_DURATION, API_REQUESTS, LOGINS
+from .request_policy import RequestPolicy
+from .session_store import SessionStore
 
 _LOGGER = get_logger(__name__)
 
 
-class HotjarAPI:
-    def __init__(self, email: str, password: str):
-        self._email = email
-        self._password = password
+class HotjarAPI(BaseHotjarAPI):
+    def __init__(self,
+                 email: str,
+                 password: str,
+                 policy: Optional[RequestPolicy] = None,
+                 session_store: Optional[SessionStore] = None,
+                 cache: Optional[ApiCache] = None,
+                 base_url: str = DEFAULT_BASE_URL):
+        super().__init__(email, password, policy, session_store, cache, base_url)
 
-        self._user_id = None
-        self._access_key = None
         self._session = None
+        self._login_lock = threading.Lock()
 
-        self._logged_in = False
-
-        self.headers = {
-            "Content-Type": "application/json",
-            "user-agent": HEADERS_USER_AGENT,
-        }
+    @property
+    def name(self) -> str:
+        return "API"
 
     def initialize(self):
-        try:
-            self._session = requests.Session()
-            self._session.headers = self.headers
+        """
+        Logs in with a new session, concurrent callers wait for a single login operation and reuse its result,
+        the new session replaces the current one only when logged in, requests of other threads keep their session
+        """
+        generation = self._login_generation
+
+        with self._login_lock:
+            if self._logged_in or generation != self._login_generation:
+                return
+
+            try:
+                session = requests.Session()
+                session.headers = self.headers
+
+                if self._restore_session(session):
+                    LOGINS.labels("restored").inc()
+
+                else:
+                    _LOGGER.debug("Initializing API connection")
 
-            _LOGGER.debug("Initializing API connection")
+                    self._login(session)
 
-            self._login(email=self._email, password=self._password)
+                    self._store_session(session)
 
-            self._logged_in = True
-        except Exception as ex:
-            _LOGGER.error(f"Failed to initialize API connection for {self._email}, Error: {str(ex)}")
+                    LOGINS.labels("success").inc()
+
+                self._session = session
+                self._logged_in = True
+            except Exception as ex:
+                _LOGGER.error(f"Failed to initialize API connection for {self._email}, Error: {str(ex)}")
+
+                LOGINS.labels("failure").inc()
+
+            finally:
+                self._login_generation += 1
 
     def has_valid_session(self):
         can_perform = self._logged_in
@@ -51,48 +84,122 @@ class HotjarAPI:
 
         return can_perform
 
-    def api_get_by_endpoint(self, site_id: int, endpoint: str, query_data: str = "", params: dict = {}):
-        url = f"{QUERY_URL}/{site_id}/{endpoint}{query_data}"
+    def api_get_by_endpoint(self,
+                            site_id: int,
+                            endpoint: str,
+                            query_data: str = "",
+                            params: dict = {},
+                            ttl: Optional[float] = None,
+                            revalidate: bool = False):
+        url = self._get_endpoint_url(site_id, endpoint, query_data)
 
-        result = self.api_get(url, params)
+        result = self.api_get(url, params, ttl, revalidate, endpoint)
 
         return result
 
-    def api_get(self, url, params: dict = None):
+    def api_get(self,
+                url,
+                params: dict = None,
+                ttl: Optional[float] = None,
+                revalidate: bool = False,
+                endpoint: str = METRICS_ENDPOINT_OTHER):
+        """
+        Perform GET request according to the request policy:
+        rate limited, throttled and failed requests are retried with backoff,
+        only unauthorized requests invalidate the session
+
+        :param url: url
+        :param params: query string parameters
+        :param ttl: seconds to cache the response (CACHE_TTL_PERMANENT - forever), None - not cached
+        :param revalidate: True - cached response is used only when upstream confirms it is not modified
+        :param endpoint: endpoint label of metrics
+        :return: response JSON, None when all attempts failed
+        """
         result = None
+        policy = self._policy
+        cache_key, cached_result, headers = self._get_cached(url, params, ttl, revalidate, endpoint)
 
-        for i in range(2):
-            try:
-                if self.has_valid_session():
-                    session: requests.Session = self._session
+        if cached_result is not None:
+            return cached_result
 
-                    response = session.get(url, params=params)
+        for i in range(policy.max_attempts):
+            generation = None
 
-                    response.raise_for_status()
+            if self.has_valid_session():
+                generation = self._login_generation
 
-                    result = response.json()
+                time.sleep(policy.acquire())
 
-                    if i > 0:
-                        _LOGGER.info(f"API GET request performed on retry #{i + 1}, Url: {url}")
+                try:
+                    response = self._get(url, params, headers, endpoint)
 
-                    break
-            except Exception as ex:
-                self._logged_in = False
+                    if response.status_code == HTTP_STATUS_NOT_MODIFIED:
+                        body = self._refresh_cached(cache_key, ttl)
 
-                if i + 1 == 2:
-                    _LOGGER.error(f"Failed to perform API GET request #{i + 1}, Url: {url}, Error: {str(ex)}")
-                else:
-                    _LOGGER.warning(f"Failed to perform API GET request #{i + 1}, Url: {url}, Error: {str(ex)}")
+                        if body is not None:
+                            result = json.loads(body)
+
+                            self._on_request_success(i, url)
+
+                            break
+
+                        # Cached response was evicted during revalidation, handled as cache miss
+                        headers = None
+                        response = self._get(url, params, headers, endpoint)
+
+                    if response.ok:
+                        result = response.json()
+
+                        self._store_response(cache_key, ttl, response.text, response.headers)
+                        self._on_request_success(i, url)
+
+                        break
+
+                    action, delay = policy.on_response(i, response.status_code, response.headers.get("Retry-After"))
+                    error = f"HTTP {response.status_code}"
+
+                except (requests.RequestException, ValueError) as ex:
+                    action, delay = policy.on_error(i)
+                    error = str(ex)
+
+            else:
+                action, delay = policy.on_login_failure(i)
+                error = "Not logged in"
+
+            if not self._on_request_failure(i, url, endpoint, action, delay, error, generation):
+                break
+
+            time.sleep(delay)
 
         return result
 
+    def _get(self, url, params: Optional[dict], headers: Optional[dict], endpoint: str) -> requests.Response:
+        """
+        Single GET request (attempt), measured per endpoint
+        """
+        started = time.perf_counter()
+        status = "error"
+
+        try:
+            session: requests.Session = self._session
+
+            response = session.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+
+            status = str(response.status_code)
+
+            return response
+
+        finally:
+            API_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+            API_REQUESTS.labels(endpoint, status).inc()
+
     def get_current_user_info(self) -> dict:
         """
         Get current user info.
 
         :return: user info
         """
-        response = self.api_get(USER_INFO_URL)
+        response = self.api_get(f"{self._base_url}{USER_INFO_PATH}", endpoint=METRICS_ENDPOINT_USER_INFO)
         return response
 
     def get_site_feed(self, site_id: int) -> list:
@@ -113,30 +220,43 @@ class HotjarAPI:
         :param site_id: site id
         :return: site statistics
         """
-        response = self.api_get_by_endpoint(site_id, ENDPOINT_FUNNELS)
+        response = self.api_get_by_endpoint(site_id, ENDPOINT_FUNNELS, ttl=CACHE_TTL_FUNNELS)
         return response
 
-    def get_site_funnel(self, site_id: int, funnel_id: int) -> dict:
+    def get_site_funnel(self, site_id: int, funnel_id: int, revalidate: bool = False) -> dict:
         """
         Get site statistics.
 
         :param site_id: site id
+        :param funnel_id: funnel id
+        :param revalidate: True - do not use cached funnel without asking upstream (funnel is known to be changed)
         :return: site statistics
         """
         query_data = f"/{funnel_id}"
-        response = self.api_get_by_endpoint(site_id, ENDPOINT_FUNNELS, query_data)
+        response = self.api_get_by_endpoint(site_id, ENDPOINT_FUNNELS, query_data, ttl=CACHE_TTL_FUNNEL,
+                                            revalidate=revalidate)
         return response
 
-    def get_site_funnel_counters(self, site_id: int, funnel_id: int, from_date: float, to_date: float) -> dict:
+    def get_site_funnel_counters(self,
+                                 site_id: int,
+                                 funnel_id: int,
+                                 from_date: float,
+                                 to_date: float,
+                                 settled: bool = False) -> dict:
         """
-        Get site statistics.
+        Get site funnel counters.
 
         :param site_id: site id
-        :return: site statistics
+        :param funnel_id: funnel id
+        :param from_date: start date (epoch)
+        :param to_date: end date (epoch)
+        :param settled: whether all days in the window are settled, settled windows are cached forever
+        :return: funnel counters
         """
 
-        query_data = f"/{funnel_id}/counts?end_date={to_date}&start_date={from_date}"
-        funnel_counters = self.api_get_by_endpoint(site_id, ENDPOINT_FUNNELS, query_data)
+        query_data, ttl = self._get_counters_request(funnel_id, from_date, to_date, settled)
+
+        funnel_counters = self.api_get_by_endpoint(site_id, ENDPOINT_FUNNELS, query_data, ttl=ttl)
 
         return funnel_counters
 
@@ -159,10 +279,13 @@ class HotjarAPI:
         :return: resources info
         """
         if not user_id:
+            if not self.has_valid_session():
+                return None
+
             user_id = self._user_id
 
-        url = f"https://insights.hotjar.com/api/v1/users/{user_id}/resources"
-        response = self.api_get(url)
+        url = self._get_resources_url(user_id)
+        response = self.api_get(url, ttl=CACHE_TTL_RESOURCES, endpoint=METRICS_ENDPOINT_RESOURCES)
 
         return response
 
@@ -173,7 +296,7 @@ class HotjarAPI:
         :param site_id: site id
         :return: feedback widgets info
         """
-        response = self.api_get_by_endpoint(site_id, ENDPOINT_FEEDBACK)
+        response = self.api_get_by_endpoint(site_id, ENDPOINT_FEEDBACK, ttl=CACHE_TTL_FEEDBACK_WIDGETS)
         return response
 
     def get_feedbacks(
@@ -181,10 +304,12 @@ class HotjarAPI:
         site_id: int,
         widget_id: int,
         _filter: str,
-        limit: int = 100
+        limit: int = 100,
+        page_size: int = DEFAULT_FEEDBACK_PAGE_SIZE,
+        max_workers: int = DEFAULT_MAX_IN_FLIGHT
     ) -> list:
         """
-        Get feedback list.
+        Get feedback list, pages are requested concurrently and returned by their order (newest first).
 
         :param site_id: site id
         :param widget_id: feedback widget id
@@ -192,51 +317,79 @@ class HotjarAPI:
         get feedbacks received between 2019-01-01 and 2019-02-01:
         'created__ge__2019-01-01,created__le__2019-02-01'
         :param limit: feedbacks limit
+        :param page_size: feedbacks per request, as much as the API allows
+        :param max_workers: maximum pages to request at the same time
         :return: feedback info, list
         """
-        fields = [
-            "browser",
-            "content",
-            "created_datetime_string",
-            "created_epoch_time",
-            "country_code",
-            "country_name",
-            "device",
-            "id",
-            "image_url",
-            "index",
-            "os",
-            "response_url",
-            "short_visitor_uuid",
-            "thumbnail_url",
-            "window_size",
-        ]
-        amount = 100
-        result = []
-        offset = 0
+        feedbacks = self.iter_feedbacks(site_id, widget_id, _filter, limit, page_size, prefetch=max_workers)
+
+        result = list(feedbacks)
+
+        return result
+
+    def iter_feedbacks(
+        self,
+        site_id: int,
+        widget_id: int,
+        _filter: str,
+        limit: Optional[int] = None,
+        page_size: int = DEFAULT_FEEDBACK_PAGE_SIZE,
+        prefetch: int = 1,
+        by_page: bool = False
+    ) -> Iterator:
+        """
+        Iterate feedbacks (newest first) while holding only few pages in memory.
+
+        :param site_id: site id
+        :param widget_id: feedback widget id
+        :param _filter: filter, see get_feedbacks
+        :param limit: feedbacks limit, None for all feedbacks
+        :param page_size: feedbacks per request, as much as the API allows
+        :param prefetch: pages to request ahead while current page is consumed, 0 - no prefetch
+        :param by_page: True - yield list of feedbacks per page, False - yield single feedback
+        :return: generator of feedback info (or list of feedback info per page)
+        """
         count = self._get_feedbacks_count(
             _filter=_filter, site_id=site_id, widget_id=widget_id
         )
 
-        limit = count if count < limit else limit
+        pages = self._get_feedbacks_pages(count, limit, page_size)
+        deduplicator = FeedbacksDeduplicator()
 
-        for i in range(math.ceil(limit / 100)):
-            params = dict(
-                fields=",".join(fields),
-                sort="-id",
-                amount=amount,
-                offset={offset},
-                count=True,
-                filter={_filter},
-            )
+        for page in self._iter_feedbacks_pages(site_id, widget_id, _filter, pages, prefetch):
+            feedbacks = deduplicator.filter(page)
 
-            query_data = f"/{widget_id}/responses"
-            response = self.api_get_by_endpoint(site_id, ENDPOINT_FEEDBACK, query_data, params)
-            result += response["data"]
+            if by_page:
+                yield feedbacks
+            else:
+                yield from feedbacks
 
-            offset += amount
+    def _iter_feedbacks_pages(self, site_id: int, widget_id: int, _filter: str, pages: list, prefetch: int) -> Iterator:
+        if prefetch < 1:
+            for offset, amount in pages:
+                yield self._get_feedbacks_page(site_id, widget_id, _filter, offset, amount)
 
-        return result
+        else:
+            executor = ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="hotjar-feedback")
+            futures = deque()
+
+            try:
+                for offset, amount in pages:
+                    future = executor.submit(self._get_feedbacks_page, site_id, widget_id, _filter, offset, amount)
+
+                    futures.append(future)
+
+                    if len(futures) > prefetch:
+                        yield futures.popleft().result()
+
+                while len(futures) > 0:
+                    yield futures.popleft().result()
+
+            finally:
+                for future in futures:
+                    future.cancel()
+
+                executor.shutdown(wait=False)
 
     def get_sentiments(self, site_id: int, widget_id: int, _filter: str) -> dict:
         """
@@ -254,62 +407,66 @@ class HotjarAPI:
 
         return response
 
-    def _login(self, email: str, password: str) -> None:
+    def _login(self, session: requests.Session) -> None:
         """
-        Success response:
-        {
-            "access_key": "78e5aca7107e4ebaa77db80a0d8511a0",
-            "success": true,
-            "user_id": 9296871
-        }
+        Login and store authorization info
 
-        :param email: user email
-        :param password: user password
-        :return: authorization info, dict
+        :param session: session to log in
         """
-        payload = {
-            "action": "login",
-            "email": email,
-            "password": password,
-            "remember": True,
-        }
+        login_url, data = self._get_login_request()
 
-        session: requests.Session = self._session
+        response = session.post(login_url, data=data, timeout=REQUEST_TIMEOUT)
 
-        response = session.post(LOGIN_URL, data=json.dumps(payload))
+        result = response.json() if response.status_code == 200 else None
 
-        authorization_error = not response.status_code == 200
+        if not self._set_authorization(result):
+            raise AuthorizationError(response.text)
 
-        if not authorization_error:
-            result = response.json()
+    def _set_cookie(self, session: requests.Session, cookie: dict):
+        session.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"])
 
-            self._user_id = result.get("user_id")
-            self._access_key = result.get("access_key")
+    def _get_cookies(self, session: requests.Session) -> list:
+        cookies = [{
+            "name": cookie.name,
+            "value": cookie.value,
+            "domain": cookie.domain,
+            "path": cookie.path
+        } for cookie in session.cookies]
 
-            authorization_error = self._access_key is None
+        return cookies
 
-        if authorization_error:
-            raise AuthorizationError(response.text)
+    def _get_feedbacks_page(self, site_id: int, widget_id: int, _filter: str, offset: int, amount: int) -> list:
+        """
+        Get single page of feedbacks, failed page is retried (request policy) without affecting other pages,
+        page that still fails raises HotjarError, so an export never misses pages silently
+
+        :param site_id: site id
+        :param widget_id: feedback widget id
+        :param _filter: filter
+        :param offset: offset of the first feedback in the page
+        :param amount: feedbacks in page
+        :return: feedback info, list
+        """
+        query_data = f"/{widget_id}/responses"
+        params = self._get_feedbacks_page_params(_filter, offset, amount)
+
+        # Retries are performed by the request policy
+        response = self.api_get_by_endpoint(site_id, ENDPOINT_FEEDBACK, query_data, params)
+
+        return self._get_feedbacks_page_data(response, widget_id, offset, amount)
 
     def _get_feedbacks_count(self, site_id: int, widget_id: int, _filter: str) -> int:
         """
-        Feedbacks count pre-request
+        Feedbacks count pre-request, failed request raises HotjarError, so an export is never empty silently
 
         :param site_id: site id
         :param widget_id: feedback widget id
-        :param limit: feedbacks limit
         :param _filter: filter
-        :return: feedback info, list
+        :return: feedbacks count
         """
         query_data = f"/{widget_id}/responses"
-        params = {
-            "fields": "id",
-            "amount": 0,
-            "offset": 0,
-            "count": "true",
-            "filter": {_filter}
-        }
+        params = self._get_feedbacks_count_params(_filter)
 
         response = self.api_get_by_endpoint(site_id, ENDPOINT_FEEDBACK, query_data, params)
 
-        return response["count"]
+        return self._get_feedbacks_count_data(response, widget_id)
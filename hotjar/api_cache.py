@@ -0,0 +1,220 @@
+import json
+import time
+import threading
+
+from os import path
+from collections import OrderedDict
+from typing import Optional
+
+from helpers.atomic_file import write_atomic
+from helpers.docker_logger import get_logger
+
+from .const import *
+
+_LOGGER = get_logger(__name__)
+
+
+class ApiCacheEntry:
+    __slots__ = ["body", "expires", "etag", "last_modified"]
+
+    def __init__(self, body: str, expires: Optional[float], etag: Optional[str], last_modified: Optional[str]):
+        self.body = body
+        self.expires = expires
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.expires is None or self.expires > time.time()
+
+    @property
+    def validators(self) -> dict:
+        """
+        Headers of conditional request, empty when upstream provided no validators
+        """
+        headers = {}
+
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+
+        return headers
+
+    def to_list(self) -> list:
+        return [self.body, self.expires, self.etag, self.last_modified]
+
+
+class ApiCache:
+    """
+    LRU cache of API responses by url and parameters, shared by sync and async API clients.
+
+    Each entry has its own TTL (CACHE_TTL_PERMANENT - never expires),
+    expired entry with ETag / Last-Modified is revalidated with conditional request,
+    bodies are stored as received and parsed per hit, so callers never share objects.
+
+    Permanent entries (settled counters) are kept in memory only, their days are already in the storage,
+    so persisting them would only grow the file rewritten on each save.
+    """
+    def __init__(self, max_entries: int = DEFAULT_API_CACHE_SIZE, file: Optional[str] = None):
+        """
+        :param max_entries: maximum entries, least recently used entries are evicted
+        :param file: file to persist the cache into, None - memory only
+        """
+        self._max_entries = max_entries
+        self._file = file
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._dirty = False
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "revalidated": 0,
+            "stored": 0,
+            "evicted": 0,
+        }
+
+        self.load()
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            result = dict(self._stats)
+            result["entries"] = len(self._entries)
+
+        return result
+
+    @staticmethod
+    def get_key(url: str, params: Optional[dict] = None) -> str:
+        if not params:
+            return url
+
+        return f"{url} {json.dumps(sorted(params.items()), default=str)}"
+
+    def get(self, key: str, revalidate: bool = False) -> Optional[ApiCacheEntry]:
+        """
+        Get entry, expired entries are returned as well for revalidation
+
+        :param key: cache key
+        :param revalidate: entry is going to be revalidated even when it is fresh (counted as miss)
+        :return: cache entry, None when not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+                if entry.is_fresh and not revalidate:
+                    self._stats["hits"] += 1
+
+                    return entry
+
+            self._stats["misses"] += 1
+
+        return entry
+
+    def set(self, key: str, body: str, ttl: float, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """
+        Store response
+
+        :param key: cache key
+        :param body: response body
+        :param ttl: seconds to keep the entry fresh, CACHE_TTL_PERMANENT - forever
+        :param etag: ETag header of the response
+        :param last_modified: Last-Modified header of the response
+        """
+        entry = ApiCacheEntry(body, self.get_expires(ttl), etag, last_modified)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            self._stats["stored"] += 1
+
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+                self._stats["evicted"] += 1
+
+            # Permanent entries are not persisted, storing them does not require a save
+            if entry.expires is not None:
+                self._dirty = True
+
+    def refresh(self, key: str, ttl: float) -> Optional[str]:
+        """
+        Upstream confirmed the entry is not modified (304), keep it fresh for another TTL
+
+        :param key: cache key
+        :param ttl: seconds to keep the entry fresh
+        :return: body of the entry, None when it was evicted meanwhile
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            entry.expires = self.get_expires(ttl)
+
+            self._stats["revalidated"] += 1
+            self._dirty = True
+
+        return entry.body
+
+    @staticmethod
+    def get_expires(ttl: float) -> Optional[float]:
+        return None if ttl == CACHE_TTL_PERMANENT else time.time() + ttl
+
+    def load(self):
+        if self._file is None or not path.exists(self._file):
+            return
+
+        try:
+            with open(self._file) as cache_file:
+                data = json.load(cache_file)
+
+            for key, item in data.items():
+                entry = ApiCacheEntry(*item)
+
+                # Expired entries without validators are useless, permanent entries are saved by older versions only
+                if entry.expires is None:
+                    self._dirty = True
+
+                elif entry.is_fresh or len(entry.validators) > 0:
+                    self._entries[key] = entry
+
+            # Limit could be lowered since the entries were saved, least recently used are first
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+                self._dirty = True
+
+            _LOGGER.info(f"Loaded {len(self._entries)} API cache entries")
+
+        except Exception as ex:
+            _LOGGER.warning(f"Failed to load API cache, starting empty, Error: {ex}")
+
+            self._entries = OrderedDict()
+
+    def save(self):
+        """
+        Persist entries (if changed since last save), least recently used first so the order survives restart,
+        permanent entries are skipped
+        """
+        if self._file is None or not self._dirty:
+            return
+
+        with self._lock:
+            data = {key: entry.to_list() for key, entry in self._entries.items() if entry.expires is not None}
+
+            self._dirty = False
+
+        try:
+            write_atomic(self._file, json.dumps(data))
+
+        except Exception as ex:
+            _LOGGER.warning(f"Failed to save API cache, Error: {ex}")
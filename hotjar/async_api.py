@@ -0,0 +1,434 @@
+import json
+import time
+import asyncio
+import aiohttp
+
+from typing import Optional, AsyncIterator
+from collections import deque
+from http.cookies import SimpleCookie
+
+from yarl import URL
+
+from helpers.docker_logger import get_logger
+
+from .const import *
+from .exceptions import AuthorizationError
+from .api_cache import ApiCache
+from .base_api import BaseHotjarAPI, FeedbacksDeduplicator
+from .metrics import API_REQUEST_DURATION, API_REQUESTS, LOGINS
+from .request_policy import RequestPolicy
+from .session_store import SessionStore
+
+_LOGGER = get_logger(__name__)
+
+
+class AsyncHotjarAPI(BaseHotjarAPI):
+    def __init__(self,
+                 email: str,
+                 password: str,
+                 limit: int = DEFAULT_MAX_IN_FLIGHT,
+                 limit_per_host: int = DEFAULT_MAX_IN_FLIGHT,
+                 policy: Optional[RequestPolicy] = None,
+                 session_store: Optional[SessionStore] = None,
+                 cache: Optional[ApiCache] = None,
+                 base_url: str = DEFAULT_BASE_URL):
+        super().__init__(email, password, policy, session_store, cache, base_url)
+
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._login_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def name(self) -> str:
+        return "async API"
+
+    async def initialize(self):
+        """
+        Creates the pooled session (if not created yet) and logs in,
+        concurrent callers wait for a single login operation
+        """
+        if self._login_lock is None:
+            self._login_lock = asyncio.Lock()
+
+        generation = self._login_generation
+
+        async with self._login_lock:
+            if self._logged_in or generation != self._login_generation:
+                return
+
+            try:
+                if self._session is None or self._session.closed:
+                    connector = aiohttp.TCPConnector(limit=self._limit,
+                                                     limit_per_host=self._limit_per_host,
+                                                     keepalive_timeout=ASYNC_KEEPALIVE_TIMEOUT)
+
+                    self._session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+
+                if self._restore_session(self._session):
+                    LOGINS.labels("restored").inc()
+
+                else:
+                    _LOGGER.debug("Initializing async API connection")
+
+                    self._session.cookie_jar.clear()
+
+                    await self._login()
+
+                    self._store_session(self._session)
+
+                    LOGINS.labels("success").inc()
+
+                self._logged_in = True
+            except Exception as ex:
+                _LOGGER.error(f"Failed to initialize async API connection for {self._email}, Error: {str(ex)}")
+
+                LOGINS.labels("failure").inc()
+
+            finally:
+                self._login_generation += 1
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+        self._session = None
+        self._logged_in = False
+
+    async def has_valid_session(self):
+        can_perform = self._logged_in
+
+        if not can_perform:
+            await self.initialize()
+
+            can_perform = self._logged_in
+
+        return can_perform
+
+    async def api_get_by_endpoint(self,
+                                  site_id: int,
+                                  endpoint: str,
+                                  query_data: str = "",
+                                  params: dict = None,
+                                  ttl: Optional[float] = None,
+                                  revalidate: bool = False):
+        url = self._get_endpoint_url(site_id, endpoint, query_data)
+
+        result = await self.api_get(url, params, ttl, revalidate, endpoint)
+
+        return result
+
+    async def api_get(self,
+                      url,
+                      params: dict = None,
+                      ttl: Optional[float] = None,
+                      revalidate: bool = False,
+                      endpoint: str = METRICS_ENDPOINT_OTHER):
+        """
+        Perform GET request according to the request policy and the response cache, see HotjarAPI.api_get
+        """
+        result = None
+        policy = self._policy
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        cache_key, cached_result, headers = self._get_cached(url, params, ttl, revalidate, endpoint)
+
+        if cached_result is not None:
+            return cached_result
+
+        for i in range(policy.max_attempts):
+            generation = None
+
+            if await self.has_valid_session():
+                generation = self._login_generation
+
+                await asyncio.sleep(policy.acquire())
+
+                try:
+                    status, response_headers, body = await self._get(url, params, headers, timeout, endpoint)
+                    cached_body = None
+
+                    if status == HTTP_STATUS_NOT_MODIFIED:
+                        cached_body = self._refresh_cached(cache_key, ttl)
+
+                        if cached_body is None:
+                            # Cached response was evicted during revalidation, handled as cache miss
+                            headers = None
+                            status, response_headers, body = await self._get(url, params, headers, timeout, endpoint)
+
+                    if cached_body is not None:
+                        result = json.loads(cached_body)
+
+                    elif status < 400:
+                        result = json.loads(body)
+
+                        self._store_response(cache_key, ttl, body, response_headers)
+
+                    if status < 400:
+                        self._on_request_success(i, url)
+
+                        break
+
+                    action, delay = policy.on_response(i, status, response_headers.get("Retry-After"))
+                    error = f"HTTP {status}"
+
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as ex:
+                    action, delay = policy.on_error(i)
+                    error = str(ex)
+
+            else:
+                action, delay = policy.on_login_failure(i)
+                error = "Not logged in"
+
+            if not self._on_request_failure(i, url, endpoint, action, delay, error, generation):
+                break
+
+            await asyncio.sleep(delay)
+
+        return result
+
+    async def _get(self, url, params: Optional[dict], headers: Optional[dict], timeout: aiohttp.ClientTimeout,
+                   endpoint: str) -> tuple:
+        """
+        Single GET request (attempt), measured per endpoint
+
+        :return: status, response headers and response text (None for error status)
+        """
+        started = time.perf_counter()
+        status = "error"
+
+        try:
+            async with self._session.get(url, params=params, headers=headers, timeout=timeout) as response:
+                body = await response.text() if response.status < 400 else None
+
+                status = str(response.status)
+
+                return response.status, response.headers, body
+
+        finally:
+            API_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+            API_REQUESTS.labels(endpoint, status).inc()
+
+    async def get_current_user_info(self) -> dict:
+        """
+        Get current user info.
+
+        :return: user info
+        """
+        response = await self.api_get(f"{self._base_url}{USER_INFO_PATH}", endpoint=METRICS_ENDPOINT_USER_INFO)
+        return response
+
+    async def get_site_funnels(self, site_id: int) -> dict:
+        """
+        Get site funnels.
+
+        :param site_id: site id
+        :return: site funnels
+        """
+        response = await self.api_get_by_endpoint(site_id, ENDPOINT_FUNNELS, ttl=CACHE_TTL_FUNNELS)
+        return response
+
+    async def get_site_funnel(self, site_id: int, funnel_id: int, revalidate: bool = False) -> dict:
+        """
+        Get site funnel.
+
+        :param site_id: site id
+        :param funnel_id: funnel id
+        :param revalidate: True - do not use cached funnel without asking upstream (funnel is known to be changed)
+        :return: funnel details
+        """
+        query_data = f"/{funnel_id}"
+        response = await self.api_get_by_endpoint(site_id, ENDPOINT_FUNNELS, query_data, ttl=CACHE_TTL_FUNNEL,
+                                                  revalidate=revalidate)
+        return response
+
+    async def get_site_funnel_counters(self,
+                                       site_id: int,
+                                       funnel_id: int,
+                                       from_date: float,
+                                       to_date: float,
+                                       settled: bool = False) -> dict:
+        """
+        Get site funnel counters.
+
+        :param site_id: site id
+        :param funnel_id: funnel id
+        :param from_date: start date (epoch)
+        :param to_date: end date (epoch)
+        :param settled: whether all days in the window are settled, settled windows are cached forever
+        :return: funnel counters
+        """
+        query_data, ttl = self._get_counters_request(funnel_id, from_date, to_date, settled)
+
+        funnel_counters = await self.api_get_by_endpoint(site_id, ENDPOINT_FUNNELS, query_data, ttl=ttl)
+
+        return funnel_counters
+
+    async def get_resources(self, user_id: Optional[int] = None) -> dict:
+        """
+        Get sites and organizations info.
+        If user_id is None, get currently logged user resources.
+
+        :return: resources info
+        """
+        if not user_id:
+            if not await self.has_valid_session():
+                return None
+
+            user_id = self._user_id
+
+        url = self._get_resources_url(user_id)
+        response = await self.api_get(url, ttl=CACHE_TTL_RESOURCES, endpoint=METRICS_ENDPOINT_RESOURCES)
+
+        return response
+
+    async def get_feedback_widgets(self, site_id: int) -> list:
+        """
+        Get all feedback widgets for specified site.
+
+        :param site_id: site id
+        :return: feedback widgets info
+        """
+        response = await self.api_get_by_endpoint(site_id, ENDPOINT_FEEDBACK, ttl=CACHE_TTL_FEEDBACK_WIDGETS)
+        return response
+
+    async def get_feedbacks(
+        self,
+        site_id: int,
+        widget_id: int,
+        _filter: str,
+        limit: int = 100,
+        page_size: int = DEFAULT_FEEDBACK_PAGE_SIZE,
+        max_workers: int = DEFAULT_MAX_IN_FLIGHT
+    ) -> list:
+        """
+        Get feedback list, pages are requested concurrently and returned by their order (newest first).
+
+        :param site_id: site id
+        :param widget_id: feedback widget id
+        :param _filter: filter
+        get feedbacks received between 2019-01-01 and 2019-02-01:
+        'created__ge__2019-01-01,created__le__2019-02-01'
+        :param limit: feedbacks limit
+        :param page_size: feedbacks per request, as much as the API allows
+        :param max_workers: maximum pages to request at the same time
+        :return: feedback info, list
+        """
+        result = [feedback async for feedback in self.iter_feedbacks(site_id,
+                                                                     widget_id,
+                                                                     _filter,
+                                                                     limit,
+                                                                     page_size,
+                                                                     prefetch=max_workers)]
+
+        return result
+
+    async def iter_feedbacks(
+        self,
+        site_id: int,
+        widget_id: int,
+        _filter: str,
+        limit: Optional[int] = None,
+        page_size: int = DEFAULT_FEEDBACK_PAGE_SIZE,
+        prefetch: int = 1,
+        by_page: bool = False
+    ) -> AsyncIterator:
+        """
+        Iterate feedbacks (newest first) while holding only few pages in memory, see HotjarAPI.iter_feedbacks
+        """
+        count = await self._get_feedbacks_count(
+            _filter=_filter, site_id=site_id, widget_id=widget_id
+        )
+
+        pages = self._get_feedbacks_pages(count, limit, page_size)
+        tasks = deque()
+        deduplicator = FeedbacksDeduplicator()
+
+        try:
+            for index, (offset, amount) in enumerate(pages):
+                page = self._get_feedbacks_page(site_id, widget_id, _filter, offset, amount)
+
+                tasks.append(asyncio.ensure_future(page))
+
+                while len(tasks) > prefetch or (index == len(pages) - 1 and len(tasks) > 0):
+                    feedbacks = deduplicator.filter(await tasks.popleft())
+
+                    if by_page:
+                        yield feedbacks
+                    else:
+                        for feedback in feedbacks:
+                            yield feedback
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_sentiments(self, site_id: int, widget_id: int, _filter: str) -> dict:
+        """
+        Get user sentiments info.
+
+        :param site_id: site id
+        :param widget_id: feedback widget id
+        :param _filter: filter
+        :return: sentiments info
+        """
+        query_data = f"/{widget_id}/responses/sentiment"
+        params = {"filter": _filter}
+
+        response = await self.api_get_by_endpoint(site_id, ENDPOINT_FEEDBACK, query_data, params)
+
+        return response
+
+    async def _login(self) -> None:
+        """
+        Login and store authorization info, see HotjarAPI._login
+        """
+        login_url, data = self._get_login_request()
+
+        async with self._session.post(login_url,
+                                      data=data,
+                                      timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
+            result = await response.json(content_type=None) if response.status == 200 else None
+
+            if not self._set_authorization(result):
+                raise AuthorizationError(await response.text())
+
+    def _set_cookie(self, session: aiohttp.ClientSession, cookie: dict):
+        morsels = SimpleCookie()
+        morsels[cookie["name"]] = cookie["value"]
+        morsels[cookie["name"]]["domain"] = cookie["domain"]
+        morsels[cookie["name"]]["path"] = cookie["path"]
+
+        session.cookie_jar.update_cookies(morsels, URL(f"https://{cookie['domain'].lstrip('.')}/"))
+
+    def _get_cookies(self, session: aiohttp.ClientSession) -> list:
+        cookies = [{
+            "name": morsel.key,
+            "value": morsel.value,
+            "domain": morsel["domain"],
+            "path": morsel["path"] or "/"
+        } for morsel in session.cookie_jar]
+
+        return cookies
+
+    async def _get_feedbacks_page(self, site_id: int, widget_id: int, _filter: str, offset: int, amount: int) -> list:
+        """
+        Get single page of feedbacks, see HotjarAPI._get_feedbacks_page
+        """
+        query_data = f"/{widget_id}/responses"
+        params = self._get_feedbacks_page_params(_filter, offset, amount)
+
+        response = await self.api_get_by_endpoint(site_id, ENDPOINT_FEEDBACK, query_data, params)
+
+        return self._get_feedbacks_page_data(response, widget_id, offset, amount)
+
+    async def _get_feedbacks_count(self, site_id: int, widget_id: int, _filter: str) -> int:
+        """
+        Feedbacks count pre-request, see HotjarAPI._get_feedbacks_count
+        """
+        query_data = f"/{widget_id}/responses"
+        params = self._get_feedbacks_count_params(_filter)
+
+        response = await self.api_get_by_endpoint(site_id, ENDPOINT_FEEDBACK, query_data, params)
+
+        return self._get_feedbacks_count_data(response, widget_id)
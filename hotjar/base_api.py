@@ -0,0 +1,332 @@
+import json
+
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from helpers.docker_logger import get_logger
+
+from .const import *
+from .exceptions import HotjarError
+from .api_cache import ApiCache
+from .metrics import API_RETRIES, API_FAILURES, API_CACHE_HITS
+from .request_policy import RequestPolicy
+from .session_store import SessionStore
+
+_LOGGER = get_logger(__name__)
+
+
+class BaseHotjarAPI(ABC):
+    """
+    Logic of sync and async API clients that performs no I/O:
+    response cache lookup and store, request policy decisions, feedback pages planning,
+    login payload and stored session (cookies) handling.
+
+    Clients perform the requests, logins and delays (blocking or awaited).
+    """
+    def __init__(self,
+                 email: str,
+                 password: str,
+                 policy: Optional[RequestPolicy] = None,
+                 session_store: Optional[SessionStore] = None,
+                 cache: Optional[ApiCache] = None,
+                 base_url: str = DEFAULT_BASE_URL):
+        self._email = email
+        self._password = password
+        self._policy = RequestPolicy() if policy is None else policy
+        self._session_store = session_store
+        self._cache = cache
+        self._base_url = base_url.rstrip("/")
+
+        self._user_id = None
+        self._access_key = None
+        self._login_generation = 0
+        self._session_restored = False
+
+        self._logged_in = False
+
+        self.headers = {
+            "Content-Type": "application/json",
+            "user-agent": HEADERS_USER_AGENT,
+        }
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """
+        Client name in logs (API / async API)
+        """
+
+    @property
+    def policy(self) -> RequestPolicy:
+        return self._policy
+
+    @property
+    def cache(self) -> Optional[ApiCache]:
+        return self._cache
+
+    def _get_endpoint_url(self, site_id: int, endpoint: str, query_data: str = "") -> str:
+        return f"{self._base_url}{QUERY_PATH}/{site_id}/{endpoint}{query_data}"
+
+    def _get_resources_url(self, user_id) -> str:
+        return f"{self._base_url}{RESOURCES_PATH.format(user_id=user_id)}"
+
+    @staticmethod
+    def _get_counters_request(funnel_id: int, from_date: float, to_date: float, settled: bool) -> tuple:
+        """
+        :return: query data and TTL of funnel counters request, settled windows are cached forever
+        """
+        query_data = f"/{funnel_id}/counts?end_date={to_date}&start_date={from_date}"
+        ttl = CACHE_TTL_PERMANENT if settled else None
+
+        return query_data, ttl
+
+    def _get_request_cache(self, ttl: Optional[float]) -> Optional[ApiCache]:
+        return self._cache if ttl is not None else None
+
+    def _get_cached(self, url: str, params: Optional[dict], ttl: Optional[float], revalidate: bool,
+                    endpoint: str) -> tuple:
+        """
+        Cache lookup of GET request
+
+        :param url: url
+        :param params: query string parameters
+        :param ttl: seconds to cache the response, None - not cached
+        :param revalidate: True - cached response is used only when upstream confirms it is not modified
+        :param endpoint: endpoint label of metrics
+        :return: cache key, cached response JSON (None - request is required) and validator headers of the request
+        """
+        cache = self._get_request_cache(ttl)
+
+        if cache is None:
+            return None, None, None
+
+        cache_key = cache.get_key(url, params)
+        cache_entry = cache.get(cache_key, revalidate)
+
+        if cache_entry is None:
+            return cache_key, None, None
+
+        if cache_entry.is_fresh and not revalidate:
+            API_CACHE_HITS.labels(endpoint).inc()
+
+            return cache_key, json.loads(cache_entry.body), None
+
+        return cache_key, None, cache_entry.validators
+
+    def _refresh_cached(self, cache_key: Optional[str], ttl: Optional[float]) -> Optional[str]:
+        """
+        Upstream confirmed the cached response is not modified (304)
+
+        :return: cached body, None when it was evicted during revalidation (handled as cache miss)
+        """
+        cache = self._get_request_cache(ttl)
+
+        return None if cache is None else cache.refresh(cache_key, ttl)
+
+    def _store_response(self, cache_key: Optional[str], ttl: Optional[float], body: str, response_headers):
+        cache = self._get_request_cache(ttl)
+
+        if cache is not None:
+            cache.set(cache_key, body, ttl, response_headers.get("ETag"), response_headers.get("Last-Modified"))
+
+    def _on_request_success(self, attempt: int, url: str):
+        self._policy.on_success()
+
+        if attempt > 0:
+            _LOGGER.info(f"{self.name} GET request performed on retry #{attempt + 1}, Url: {url}")
+
+    def _on_request_failure(self,
+                            attempt: int,
+                            url: str,
+                            endpoint: str,
+                            action: str,
+                            delay: float,
+                            error: str,
+                            generation: Optional[int]) -> bool:
+        """
+        Apply the decision of the request policy about failed attempt
+
+        :param attempt: attempt index
+        :param url: url
+        :param endpoint: endpoint label of metrics
+        :param action: action of the request policy
+        :param delay: seconds to wait before the next attempt
+        :param error: error description
+        :param generation: login generation the attempt was performed with, None - not logged in
+        :return: whether the request is retried after the delay
+        """
+        if action == REQUEST_ACTION_FAIL:
+            _LOGGER.error(f"Failed to perform {self.name} GET request #{attempt + 1}, Url: {url}, Error: {error}")
+
+            API_FAILURES.labels(endpoint).inc()
+
+            return False
+
+        API_RETRIES.labels(endpoint, action).inc()
+
+        _LOGGER.warning(f"Failed to perform {self.name} GET request #{attempt + 1}, Url: {url}, Error: {error}, "
+                        f"Retry in {delay:.1f}s")
+
+        # Only the first failure of the current login invalidates it, other callers reuse the new login
+        if action == REQUEST_ACTION_REAUTHENTICATE and generation == self._login_generation:
+            self._logged_in = False
+
+        return True
+
+    def _get_login_request(self) -> tuple:
+        """
+        :return: url and body of login request
+        """
+        payload = {
+            "action": "login",
+            "email": self._email,
+            "password": self._password,
+            "remember": True,
+        }
+
+        return f"{self._base_url}{LOGIN_PATH}", json.dumps(payload)
+
+    def _set_authorization(self, result: Optional[dict]) -> bool:
+        """
+        Success response:
+        {
+            "access_key": "78e5aca7107e4ebaa77db80a0d8511a0",
+            "success": true,
+            "user_id": 9296871
+        }
+
+        :param result: login response JSON, None when login was rejected
+        :return: whether the response authorized the session
+        """
+        if result is None:
+            return False
+
+        self._user_id = result.get("user_id")
+        self._access_key = result.get("access_key")
+
+        return self._access_key is not None
+
+    def _restore_session(self, session) -> bool:
+        """
+        Restore stored session, only once per process, later logins are performed against Hotjar
+
+        :param session: session to restore the cookies into
+        :return: whether the session was restored
+        """
+        if self._session_store is None or self._session_restored:
+            return False
+
+        self._session_restored = True
+
+        data = self._session_store.load(self._email)
+
+        if data is None:
+            return False
+
+        for cookie in data.get("cookies", []):
+            self._set_cookie(session, cookie)
+
+        self._user_id = data.get("user_id")
+        self._access_key = data.get("access_key")
+
+        _LOGGER.info(f"Restored stored session of {self._email}")
+
+        return True
+
+    def _store_session(self, session):
+        if self._session_store is None:
+            return
+
+        self._session_restored = True
+
+        self._session_store.save(self._email, self._user_id, self._access_key, self._get_cookies(session))
+
+    @abstractmethod
+    def _set_cookie(self, session, cookie: dict):
+        """
+        Set stored cookie into the session
+
+        :param session: session of the client
+        :param cookie: cookie name, value, domain and path
+        """
+
+    @abstractmethod
+    def _get_cookies(self, session) -> list:
+        """
+        :param session: session of the client
+        :return: cookies of the session to store, name, value, domain and path per cookie
+        """
+
+    @staticmethod
+    def _get_feedbacks_pages(count: int, limit: Optional[int], page_size: int) -> list:
+        """
+        :param count: feedbacks count
+        :param limit: feedbacks limit, None for all feedbacks
+        :param page_size: feedbacks per request
+        :return: offset and amount of each page (newest first)
+        """
+        limit = count if limit is None or count < limit else limit
+
+        return [(offset, min(page_size, limit - offset)) for offset in range(0, limit, page_size)]
+
+    @staticmethod
+    def _get_feedbacks_page_params(_filter: str, offset: int, amount: int) -> dict:
+        return {
+            "fields": ",".join(FEEDBACK_FIELDS),
+            "sort": "-id",
+            "amount": amount,
+            "offset": offset,
+            "count": "true",
+            "filter": _filter,
+        }
+
+    @staticmethod
+    def _get_feedbacks_count_params(_filter: str) -> dict:
+        return {
+            "fields": "id",
+            "amount": 0,
+            "offset": 0,
+            "count": "true",
+            "filter": _filter,
+        }
+
+    @staticmethod
+    def _get_feedbacks_page_data(response: Optional[dict], widget_id: int, offset: int, amount: int) -> list:
+        """
+        Page that still fails (after retries of the request policy) raises HotjarError,
+        so an export never misses pages silently
+        """
+        if response is None:
+            raise HotjarError(f"Failed to load feedbacks page, Widget: {widget_id}, Offset: {offset}, "
+                              f"Amount: {amount}")
+
+        return response.get("data", [])
+
+    @staticmethod
+    def _get_feedbacks_count_data(response: Optional[dict], widget_id: int) -> int:
+        """
+        Failed count raises HotjarError, so an export is never empty silently
+        """
+        if response is None:
+            raise HotjarError(f"Failed to load feedbacks count, Widget: {widget_id}")
+
+        return response["count"]
+
+
+class FeedbacksDeduplicator:
+    """
+    New feedbacks received during the export shift the pages, feedbacks of the previous page are skipped
+    """
+    def __init__(self):
+        self._previous_ids = set()
+
+    def filter(self, page: list) -> list:
+        """
+        :param page: feedbacks of the page
+        :return: feedbacks that were not in the previous page
+        """
+        feedbacks = [feedback for feedback in page if feedback.get(PROP_ID) not in self._previous_ids]
+
+        self._previous_ids = {feedback.get(PROP_ID) for feedback in page}
+
+        return feedbacks
@@ -1,4 +1,4 @@
-VERSION = "1.2"
+VERSION = "1.3"
 
 PROP_ID = "id"
 PROP_NAME = "name"
@@ -13,12 +13,127 @@ PROP_EPOCH = "epoch"
 PROP_COUNT = "count"
 PROP_CREATED_EPOCH_TIME = "created_epoch_time"
 PROP_VISIT_COUNTS_PER_STEP = "visit_counts_per_step"
+PROP_PENDING = "pending"
+PROP_FUNNEL_HASH = "funnel_hash"
+PROP_DETAILS_REFRESHED = "details_refreshed"
+
+DATE_CACHE_SIZE = 8192
 
 DEFAULT_ENVIRONMENT = "Production"
+DEFAULT_DATA_DIR = "/data/"
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_PARALLEL_SITES = 2
+DEFAULT_PARALLEL_FUNNELS = 4
+
+SCHEDULER_TICK = 60
+
+DEFAULT_SETTLE_DAYS = 0
+DEFAULT_FUNNELS_REFRESH_INTERVAL = 6 * 60 * 60
+FUNNEL_DETAILS_MAX_AGE = 24 * 60 * 60
+
+BACKFILL_DAILY = "daily"
+BACKFILL_RANGES = "ranges"
+DEFAULT_BACKFILL_STRATEGY = BACKFILL_DAILY
+BACKFILL_RANGE_DAYS = 32
+BACKFILL_RANGE_MIN_DAYS = 4
+BACKFILL_RANGE_MIN_EMPTY_RATIO = 0.5
+
+ASYNC_KEEPALIVE_TIMEOUT = 30
+
+REQUEST_TIMEOUT = 30
+DEFAULT_RATE_LIMIT = 5
+DEFAULT_MAX_RETRIES = 3
+RATE_LIMIT_BURST = 10
+RATE_LIMIT_MIN = 0.5
+RATE_LIMIT_DECREASE = 0.5
+RATE_LIMIT_RECOVERY = 0.05
+BACKOFF_BASE = 1
+BACKOFF_MAX = 60
+
+REQUEST_ACTION_RETRY = "retry"
+REQUEST_ACTION_REAUTHENTICATE = "reauthenticate"
+REQUEST_ACTION_FAIL = "fail"
+
+HTTP_STATUS_REAUTHENTICATE = [401, 403]
+HTTP_STATUS_TOO_MANY_REQUESTS = 429
+
+SESSION_FILE = "session.json"
+SESSION_MAX_AGE = 7 * 24 * 60 * 60
+
+DEFAULT_SITES_MEMORY_LIMIT = 0
+SITE_MEMORY_FUNNEL_BYTES = 2048
+SITE_MEMORY_STEP_BYTES = 2048
+SITE_MEMORY_COUNTER_BYTES = 20
 
-LOGIN_URL = "https://insights.hotjar.com/api/v2/users"
-USER_INFO_URL = "https://insights.hotjar.com/api/v2/users/me"
-QUERY_URL = "https://insights.hotjar.com/api/v1/sites"
+MODE_SYNC = "sync"
+MODE_WEB = "web"
+SNAPSHOT_FILE = "snapshot.json"
+SNAPSHOT_CHECK_INTERVAL = 5
+
+API_CACHE_FILE = "api_cache.json"
+DEFAULT_API_CACHE_SIZE = 10000
+CACHE_TTL_PERMANENT = -1
+CACHE_MIN_SETTLE_DAYS = 1
+CACHE_TTL_RESOURCES = 60 * 60
+CACHE_TTL_FUNNELS = 15 * 60
+CACHE_TTL_FUNNEL = 60 * 60
+CACHE_TTL_FEEDBACK_WIDGETS = 60 * 60
+HTTP_STATUS_NOT_MODIFIED = 304
+
+METRICS_API_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+METRICS_UPDATE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+METRICS_STORAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+METRICS_HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+METRICS_ENDPOINT_RESOURCES = "resources"
+METRICS_ENDPOINT_USER_INFO = "user_info"
+METRICS_ENDPOINT_OTHER = "other"
+
+GRANULARITY_DAY = "day"
+GRANULARITY_WEEK = "week"
+GRANULARITY_MONTH = "month"
+GRANULARITY_YEAR = "year"
+STATS_RATIO_DIGITS = 4
+
+STORAGE_JSON = "json"
+STORAGE_SQLITE = "sqlite"
+DEFAULT_STORAGE = STORAGE_SQLITE
+
+SNAPSHOT_FORMAT_JSON = "json"
+SNAPSHOT_FORMAT_JSON_GZIP = "json.gz"
+SNAPSHOT_FORMAT_BINARY = "binary"
+DEFAULT_SNAPSHOT_FORMAT = SNAPSHOT_FORMAT_JSON
+SNAPSHOT_EXTENSIONS = {
+    SNAPSHOT_FORMAT_JSON: "json",
+    SNAPSHOT_FORMAT_JSON_GZIP: "json.gz",
+    SNAPSHOT_FORMAT_BINARY: "bin",
+}
+SNAPSHOT_GZIP_MAGIC = b"\x1f\x8b"
+SNAPSHOT_BINARY_MAGIC = b"HJS1"
+SNAPSHOT_COMPRESSION_LEVEL = 1
+
+JOURNAL_MAX_ENTRIES = 48
+JOURNAL_FUNNELS = "funnels"
+JOURNAL_COUNTERS = "counters"
+
+SQLITE_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS funnels ("
+    "site_id INTEGER NOT NULL, funnel_id TEXT NOT NULL, data TEXT NOT NULL, "
+    "PRIMARY KEY (site_id, funnel_id))",
+    "CREATE TABLE IF NOT EXISTS steps ("
+    "site_id INTEGER NOT NULL, funnel_id TEXT NOT NULL, step_id TEXT NOT NULL, position INTEGER NOT NULL, "
+    "data TEXT NOT NULL, "
+    "PRIMARY KEY (site_id, funnel_id, step_id))",
+    "CREATE TABLE IF NOT EXISTS counters ("
+    "site_id INTEGER NOT NULL, funnel_id TEXT NOT NULL, step_id TEXT NOT NULL, date TEXT NOT NULL, "
+    "epoch INTEGER NOT NULL, count INTEGER NOT NULL, "
+    "PRIMARY KEY (site_id, funnel_id, step_id, date)) WITHOUT ROWID",
+]
+
+DEFAULT_BASE_URL = "https://insights.hotjar.com"
+LOGIN_PATH = "/api/v2/users"
+USER_INFO_PATH = "/api/v2/users/me"
+QUERY_PATH = "/api/v1/sites"
+RESOURCES_PATH = "/api/v1/users/{user_id}/resources"
 
 HEADERS_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Ubuntu " \
                      "Chromium/75.0.3770.90 Chrome/75.0.3770.90 Safari/537.36 "
@@ -28,3 +143,23 @@ ENDPOINT_FUNNELS = "funnels"
 ENDPOINT_STATISTICS = "statistics"
 ENDPOINT_FEEDBACK = "feedback"
 
+
+DEFAULT_FEEDBACK_PAGE_SIZE = 100
+
+FEEDBACK_FIELDS = [
+    "browser",
+    "content",
+    "created_datetime_string",
+    "created_epoch_time",
+    "country_code",
+    "country_name",
+    "device",
+    "id",
+    "image_url",
+    "index",
+    "os",
+    "response_url",
+    "short_visitor_uuid",
+    "thumbnail_url",
+    "window_size",
+]
@@ -0,0 +1,218 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableMapping
+from datetime import date
+from functools import lru_cache
+from typing import Optional
+
+from helpers.queryable_datetime import get_day_iso
+
+from .const import *
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def get_date_ordinal(date_iso: str) -> int:
+    return date.fromisoformat(date_iso).toordinal()
+
+
+class CounterSeries(MutableMapping):
+    """
+    Daily counters of a funnel step, stored as contiguous arrays sorted by day:
+    day (date ordinal), epoch (start of the day) and count.
+
+    Behaves as the dictionary of date (ISO format) and counter ({"epoch": ..., "count": ...})
+    it replaces, counter dictionaries are created on access only.
+    """
+    __slots__ = ["_days", "_epochs", "_counts"]
+
+    def __init__(self, counters: Optional[dict] = None):
+        self._days = array("i")
+        self._epochs = array("q")
+        self._counts = array("q")
+
+        if counters is not None:
+            for date_iso in sorted(counters.keys()):
+                counter = counters[date_iso]
+
+                self.set(date_iso, counter[PROP_EPOCH], counter[PROP_COUNT])
+
+    @staticmethod
+    def from_arrays(days: array, epochs: array, counts: array):
+        """
+        Counter series over existing arrays (sorted by day, same length), arrays are not copied
+        """
+        result = CounterSeries()
+        result._days = days
+        result._epochs = epochs
+        result._counts = counts
+
+        return result
+
+    @property
+    def days(self) -> array:
+        return self._days
+
+    @property
+    def epochs(self) -> array:
+        return self._epochs
+
+    @property
+    def counts(self) -> array:
+        return self._counts
+
+    def set(self, date_iso: str, epoch, count) -> bool:
+        """
+        Set counter of a day, new last day is appended, existing day is overwritten in place
+
+        :param date_iso: date (ISO format)
+        :param epoch: start of the day (epoch)
+        :param count: count
+        :return: whether the counter changed
+        """
+        day = get_date_ordinal(date_iso)
+        epoch = int(epoch)
+        count = int(count)
+
+        if len(self._days) == 0 or day > self._days[-1]:
+            self._days.append(day)
+            self._epochs.append(epoch)
+            self._counts.append(count)
+
+            return True
+
+        position = bisect_left(self._days, day)
+
+        if self._days[position] == day:
+            if self._counts[position] == count and self._epochs[position] == epoch:
+                return False
+
+            self._epochs[position] = epoch
+            self._counts[position] = count
+
+        else:
+            self._days.insert(position, day)
+            self._epochs.insert(position, epoch)
+            self._counts.insert(position, count)
+
+        return True
+
+    def get_count(self, date_iso: str) -> Optional[int]:
+        position = self._get_position(date_iso)
+
+        return None if position is None else self._counts[position]
+
+    def get_range(self, date_from: Optional[str] = None, date_to: Optional[str] = None) -> slice:
+        """
+        Positions of the days in range
+
+        :param date_from: first date (ISO format, inclusive), None - from the first day
+        :param date_to: last date (ISO format, inclusive), None - until the last day
+        :return: slice to apply on days, epochs and counts
+        """
+        first = 0 if date_from is None else bisect_left(self._days, get_date_ordinal(date_from))
+        last = len(self._days) if date_to is None else bisect_right(self._days, get_date_ordinal(date_to))
+
+        return slice(first, last)
+
+    def sum(self, date_from: Optional[str] = None, date_to: Optional[str] = None) -> int:
+        result = sum(self._counts[self.get_range(date_from, date_to)])
+
+        return result
+
+    def iter_counters(self):
+        """
+        Counters of all days without a lookup per day, from copies of the arrays
+        so days added by a concurrent update are not visited
+
+        :return: generator of (date iso, epoch, count)
+        """
+        for day, epoch, count in zip(self._days[:], self._epochs[:], self._counts[:]):
+            yield get_day_iso(day), epoch, count
+
+    def to_dict(self) -> dict:
+        result = {
+            get_day_iso(day): {
+                PROP_EPOCH: epoch,
+                PROP_COUNT: count
+            } for day, epoch, count in zip(self._days, self._epochs, self._counts)
+        }
+
+        return result
+
+    def _get_position(self, date_iso: str) -> Optional[int]:
+        day = get_date_ordinal(date_iso)
+        position = bisect_left(self._days, day)
+
+        if position < len(self._days) and self._days[position] == day:
+            return position
+
+        return None
+
+    def __getitem__(self, date_iso: str) -> dict:
+        position = self._get_position(date_iso)
+
+        if position is None:
+            raise KeyError(date_iso)
+
+        result = {
+            PROP_EPOCH: self._epochs[position],
+            PROP_COUNT: self._counts[position]
+        }
+
+        return result
+
+    def __setitem__(self, date_iso: str, counter: dict):
+        self.set(date_iso, counter[PROP_EPOCH], counter[PROP_COUNT])
+
+    def __delitem__(self, date_iso: str):
+        position = self._get_position(date_iso)
+
+        if position is None:
+            raise KeyError(date_iso)
+
+        del self._days[position]
+        del self._epochs[position]
+        del self._counts[position]
+
+    def __contains__(self, date_iso) -> bool:
+        return self._get_position(date_iso) is not None
+
+    def __iter__(self):
+        for day in self._days:
+            yield get_day_iso(day)
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    def __repr__(self):
+        return f"CounterSeries(days: {len(self._days)})"
+
+
+def load_counter_series(data: dict) -> dict:
+    """
+    Replace counter dictionaries of all funnel steps in site data with counter series
+
+    :param data: site data
+    :return: site data
+    """
+    for funnel_key in data:
+        steps = data[funnel_key].get(PROP_STEPS, {})
+
+        for step_key in steps:
+            step = steps[step_key]
+            counters = step.get(PROP_COUNTERS)
+
+            if not isinstance(counters, CounterSeries):
+                step[PROP_COUNTERS] = CounterSeries(counters)
+
+    return data
+
+
+def export_counter_series(value):
+    """
+    JSON default hook, exports counter series in the dictionary format
+    """
+    if isinstance(value, CounterSeries):
+        return value.to_dict()
+
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
@@ -0,0 +1,117 @@
+import json
+import time
+
+from os import path
+from typing import Optional
+
+from helpers.atomic_file import write_atomic
+from helpers.docker_logger import get_logger
+
+from .const import *
+
+_LOGGER = get_logger(__name__)
+
+
+class DataSnapshot:
+    """
+    Manifest of the data persisted by the sync process (generation, storage type and sites),
+    published atomically after every update cycle.
+
+    Web workers never sync with Hotjar, they reload the sites from the storage when the generation changes.
+    """
+    def __init__(self, data_dir: str):
+        self._file = f"{data_dir}{SNAPSHOT_FILE}"
+        self._generation = None
+        self._modified = None
+
+    @property
+    def file(self) -> str:
+        return self._file
+
+    @property
+    def generation(self) -> Optional[int]:
+        return self._generation
+
+    def publish(self, storage_name: str, sites: list) -> int:
+        """
+        Publish new generation of the persisted data
+
+        :param storage_name: storage type the data was saved with
+        :param sites: list of sites (id, name, created)
+        :return: published generation
+        """
+        if self._generation is None:
+            manifest = self.load()
+
+            # Generation keeps increasing across restarts of the sync process
+            self._generation = 0 if manifest is None else manifest.get("generation", 0)
+
+        generation = self._generation + 1
+
+        manifest = {
+            "version": VERSION,
+            "generation": generation,
+            "published": time.time(),
+            "storage": storage_name,
+            "sites": sites
+        }
+
+        write_atomic(self._file, json.dumps(manifest))
+
+        self._generation = generation
+
+        _LOGGER.debug(f"Published data generation {generation}, Sites: {len(sites)}")
+
+        return generation
+
+    def load(self) -> Optional[dict]:
+        """
+        Load the manifest
+
+        :return: manifest, None when not published yet (or published by another version)
+        """
+        if not path.exists(self._file):
+            return None
+
+        try:
+            with open(self._file) as snapshot_file:
+                manifest = json.load(snapshot_file)
+
+        except Exception as ex:
+            _LOGGER.warning(f"Failed to load data snapshot manifest, Error: {ex}")
+
+            return None
+
+        if manifest.get("version") != VERSION:
+            return None
+
+        return manifest
+
+    def get_changed(self) -> Optional[dict]:
+        """
+        Manifest of a generation that was not seen yet, file is parsed only when it was replaced
+
+        :return: manifest, None when the generation did not change
+        """
+        try:
+            modified = path.getmtime(self._file)
+
+        except OSError:
+            return None
+
+        if modified == self._modified:
+            return None
+
+        manifest = self.load()
+
+        if manifest is None:
+            return None
+
+        self._modified = modified
+
+        if manifest.get("generation") == self._generation:
+            return None
+
+        self._generation = manifest.get("generation")
+
+        return manifest
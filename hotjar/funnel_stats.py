@@ -0,0 +1,148 @@
+from bisect import bisect_left
+from datetime import date
+from typing import Optional
+
+from helpers.queryable_datetime import get_day_iso
+
+from .const import *
+from .counter_series import CounterSeries
+
+
+def get_period_functions(granularity: str) -> tuple:
+    """
+    Functions returning the ordinal of the first day of the period of a day ordinal,
+    and the ordinal of the first day of the next period
+    """
+    def get_week_start(day: int) -> int:
+        # Ordinal 1 (0001-01-01) is Monday
+        return day - (day - 1) % 7
+
+    def get_month_start(day: int) -> int:
+        value = date.fromordinal(day)
+
+        return day - value.day + 1
+
+    def get_next_month_start(day: int) -> int:
+        value = date.fromordinal(day)
+
+        return (date(value.year + 1, 1, 1) if value.month == 12 else date(value.year, value.month + 1, 1)).toordinal()
+
+    def get_year_start(day: int) -> int:
+        value = date.fromordinal(day)
+
+        return date(value.year, 1, 1).toordinal()
+
+    def get_next_year_start(day: int) -> int:
+        value = date.fromordinal(day)
+
+        return date(value.year + 1, 1, 1).toordinal()
+
+    functions = {
+        GRANULARITY_DAY: (lambda day: day, lambda day: day + 1),
+        GRANULARITY_WEEK: (get_week_start, lambda day: get_week_start(day) + 7),
+        GRANULARITY_MONTH: (get_month_start, get_next_month_start),
+        GRANULARITY_YEAR: (get_year_start, get_next_year_start),
+    }
+
+    result = functions.get(granularity)
+
+    if result is None:
+        raise ValueError(f"Invalid granularity: {granularity}, supported: {', '.join(functions.keys())}")
+
+    return result
+
+
+def get_ratio(value: int, base: int) -> Optional[float]:
+    return None if base == 0 else round(value / base, STATS_RATIO_DIGITS)
+
+
+def get_funnel_stats(funnel: dict,
+                     granularity: str = GRANULARITY_DAY,
+                     date_from: Optional[str] = None,
+                     date_to: Optional[str] = None) -> dict:
+    """
+    Funnel statistics: per step totals, step to step conversion and per period totals
+
+    :param funnel: funnel data
+    :param granularity: period of rollups - day, week, month or year
+    :param date_from: first date (ISO format, inclusive)
+    :param date_to: last date (ISO format, inclusive)
+    :return: funnel statistics
+    """
+    get_period, get_next_period = get_period_functions(granularity)
+
+    steps = funnel[PROP_STEPS]
+    step_keys = list(steps.keys())
+
+    steps_stats = []
+    periods = {}
+
+    for position, step_key in enumerate(step_keys):
+        step = steps[step_key]
+        counters: CounterSeries = step[PROP_COUNTERS]
+
+        selection = counters.get_range(date_from, date_to)
+        days = counters.days[selection]
+        counts = counters.counts[selection]
+
+        total = sum(counts)
+
+        steps_stats.append({
+            PROP_ID: step.get(PROP_ID),
+            PROP_NAME: step.get(PROP_NAME),
+            PROP_URL: step.get(PROP_URL),
+            "total": total,
+        })
+
+        if granularity == GRANULARITY_DAY:
+            for day, count in zip(days, counts):
+                period_counts = periods.setdefault(day, [0] * len(step_keys))
+                period_counts[position] += count
+
+            continue
+
+        # Days are sorted, each period with counters is a single slice found by binary search of its end
+        start = 0
+
+        while start < len(days):
+            period = get_period(days[start])
+            end = bisect_left(days, get_next_period(period), start)
+
+            period_counts = periods.setdefault(period, [0] * len(step_keys))
+            period_counts[position] += sum(counts[start:end])
+
+            start = end
+
+    first_total = steps_stats[0]["total"] if len(steps_stats) > 0 else 0
+    previous_total = first_total
+
+    for step_stats in steps_stats:
+        total = step_stats["total"]
+
+        step_stats["conversion_from_previous"] = get_ratio(total, previous_total)
+        step_stats["conversion_from_first"] = get_ratio(total, first_total)
+
+        previous_total = total
+
+    periods_stats = []
+
+    for period in sorted(periods.keys()):
+        period_counts = periods[period]
+
+        periods_stats.append({
+            "period": get_day_iso(period),
+            "counts": period_counts,
+            "conversion": get_ratio(period_counts[-1], period_counts[0]),
+        })
+
+    result = {
+        PROP_ID: funnel.get(PROP_ID),
+        PROP_NAME: funnel.get(PROP_NAME),
+        "granularity": granularity,
+        "from": date_from,
+        "to": date_to,
+        PROP_STEPS: steps_stats,
+        "periods": periods_stats,
+    }
+
+    return result
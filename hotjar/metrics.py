@@ -0,0 +1,75 @@
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+from .const import *
+
+API_REQUEST_DURATION = Histogram("hotjar_api_request_duration_seconds",
+                                 "Duration of single request (attempt) to Hotjar API",
+                                 ["endpoint"],
+                                 buckets=METRICS_API_BUCKETS)
+
+API_REQUESTS = Counter("hotjar_api_requests_total",
+                       "Requests (attempts) to Hotjar API by response status, error - no response",
+                       ["endpoint", "status"])
+
+API_RETRIES = Counter("hotjar_api_retries_total",
+                      "Retried requests to Hotjar API by action (retry - back off, reauthenticate - login again)",
+                      ["endpoint", "action"])
+
+API_FAILURES = Counter("hotjar_api_failures_total",
+                       "Requests to Hotjar API that failed after all attempts",
+                       ["endpoint"])
+
+API_CACHE_HITS = Counter("hotjar_api_cache_hits_total",
+                         "Requests to Hotjar API served from the response cache without a request",
+                         ["endpoint"])
+
+LOGINS = Counter("hotjar_logins_total",
+                 "Logins to Hotjar by result (success, failure, restored - stored session reused)",
+                 ["result"])
+
+CYCLE_DURATION = Histogram("hotjar_cycle_duration_seconds",
+                           "Duration of update cycle",
+                           buckets=METRICS_UPDATE_BUCKETS)
+
+CYCLE_LAST_DURATION = Gauge("hotjar_cycle_last_duration_seconds", "Duration of the last update cycle")
+
+CYCLE_OVERRUNS = Counter("hotjar_cycle_overruns_total", "Update cycles that took longer than the update interval")
+
+UPDATE_INTERVAL = Gauge("hotjar_update_interval_seconds", "Update interval (HOTJAR_INTERVAL)")
+
+SITE_UPDATE_DURATION = Histogram("hotjar_site_update_duration_seconds",
+                                 "Duration of site update",
+                                 ["site"],
+                                 buckets=METRICS_UPDATE_BUCKETS)
+
+SITE_UPDATE_FAILURES = Counter("hotjar_site_update_failures_total", "Site updates that failed", ["site"])
+
+DAYS_LOADED = Counter("hotjar_days_loaded_total", "Funnel days loaded from Hotjar API", ["site"])
+
+FUNNEL_UPDATE_DURATION = Histogram("hotjar_funnel_update_duration_seconds",
+                                   "Duration of loading counters of single funnel",
+                                   ["site"],
+                                   buckets=METRICS_UPDATE_BUCKETS)
+
+COUNTERS_CHANGED = Counter("hotjar_counters_changed_total", "Funnel step counters created or changed", ["site"])
+
+STORAGE_SAVE_DURATION = Histogram("hotjar_storage_save_duration_seconds",
+                                  "Duration of saving site data",
+                                  ["storage"],
+                                  buckets=METRICS_STORAGE_BUCKETS)
+
+STORAGE_SIZE = Gauge("hotjar_storage_size_bytes", "Size of persisted data files", ["storage"])
+
+HTTP_REQUEST_DURATION = Histogram("hotjar_http_request_duration_seconds",
+                                  "Duration of serving HTTP request (until the response is created)",
+                                  ["path", "status"],
+                                  buckets=METRICS_HTTP_BUCKETS)
+
+
+def get_metrics() -> tuple:
+    """
+    Metrics in Prometheus text format
+
+    :return: body and content type
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
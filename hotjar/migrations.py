@@ -0,0 +1,123 @@
+"""
+Upgrades site data stored by previous versions to the current version,
+so a version change does not require to load all funnel counters from Hotjar again.
+
+Every migration upgrades the data of the versions before it, versions without a migration
+stored compatible data and it is used as is, migrations drop only the data that is not compatible,
+which is loaded again by the next update.
+"""
+from helpers.docker_logger import get_logger
+from helpers.queryable_datetime import get_day_iso, get_day_ordinal
+
+from .const import *
+from .counter_series import get_date_ordinal
+
+_LOGGER = get_logger(__name__)
+
+
+def get_version_key(version: str) -> tuple:
+    """
+    Comparable version, 1.10 is after 1.9
+    """
+    return tuple(int(part) for part in version.split("."))
+
+
+class Migration:
+    def __init__(self, version: str, description: str, migrate):
+        """
+        :param version: version the migration upgrades to
+        :param description: what is upgraded
+        :param migrate: function upgrading site data in place
+        """
+        self.version = version
+        self.description = description
+        self.migrate = migrate
+
+    def __repr__(self):
+        return f"Migration {self.version}: {self.description}"
+
+
+def add_missing_days(data: dict):
+    """
+    Funnels without id or steps are dropped (loaded again with their definition),
+    invalid counters are dropped and days that are missing in any of the funnel's steps before the last update
+    (steps added to existing funnels were not stored) are set as pending ranges to load again
+    """
+    for funnel_key in list(data.keys()):
+        funnel_data = data[funnel_key]
+
+        if not isinstance(funnel_data, dict) or PROP_ID not in funnel_data or PROP_STEPS not in funnel_data:
+            _LOGGER.warning(f"Dropping invalid funnel {funnel_key}")
+
+            del data[funnel_key]
+            continue
+
+        steps = funnel_data[PROP_STEPS]
+        last_update = funnel_data.get(PROP_LAST_UPDATE)
+
+        for step_key in steps:
+            counters = steps[step_key].setdefault(PROP_COUNTERS, {})
+
+            if isinstance(counters, dict):
+                for date_iso in list(counters.keys()):
+                    counter = counters[date_iso]
+
+                    if not isinstance(counter, dict) or PROP_EPOCH not in counter or PROP_COUNT not in counter:
+                        del counters[date_iso]
+
+        all_days = [get_date_ordinal(date_iso) for step_key in steps for date_iso in steps[step_key][PROP_COUNTERS]]
+
+        if last_update is None or len(all_days) == 0:
+            continue
+
+        # Last update day and the days after it are loaded by the next update anyway
+        first_day = min(all_days)
+        last_day = get_day_ordinal(last_update) - 1
+
+        missing_days = set()
+
+        for step_key in steps:
+            step_days = set(get_date_ordinal(date_iso) for date_iso in steps[step_key][PROP_COUNTERS])
+
+            missing_days.update(day for day in range(first_day, last_day + 1) if day not in step_days)
+
+        pending = funnel_data.get(PROP_PENDING, [])
+
+        for day in sorted(missing_days):
+            if len(pending) > 0 and get_date_ordinal(pending[-1][1]) == day - 1:
+                pending[-1][1] = get_day_iso(day)
+
+            else:
+                pending.append([get_day_iso(day), get_day_iso(day)])
+
+        if len(pending) > 0:
+            funnel_data[PROP_PENDING] = pending
+
+            _LOGGER.info(f"Funnel {funnel_key} has {len(missing_days)} missing day(s) to load again")
+
+
+MIGRATIONS = [
+    Migration("1.3", "Missing days of steps added to existing funnels are loaded again", add_missing_days),
+]
+
+
+def migrate_site_data(data: dict, from_version: str, to_version: str = VERSION) -> dict:
+    """
+    Upgrade site data by the migrations after its version
+
+    :param data: site data stored by from_version
+    :param from_version: version that stored the data
+    :param to_version: version to upgrade to
+    :return: upgraded site data
+    """
+    from_key = get_version_key(from_version)
+    to_key = get_version_key(to_version)
+
+    migrations = [migration for migration in MIGRATIONS if from_key < get_version_key(migration.version) <= to_key]
+
+    for migration in sorted(migrations, key=lambda item: get_version_key(item.version)):
+        _LOGGER.info(f"Upgrading site data from version {from_version}, {migration}")
+
+        migration.migrate(data)
+
+    return data
@@ -0,0 +1,336 @@
+import json
+import base64
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from itertools import islice
+from typing import Callable, Optional
+
+from helpers.queryable_datetime import get_day_iso, get_epoch_datetime
+
+from .const import *
+from .counter_series import CounterSeries, get_date_ordinal
+
+
+def create_flat_record(site_id: str, site_name: str, funnel_id: str, funnel: dict, step_id: str, step: dict,
+                       date_iso: str) -> dict:
+    counter = step[PROP_COUNTERS][date_iso]
+
+    return create_day_record(site_id, site_name, funnel_id, funnel, step_id, step, date_iso, counter.get(PROP_EPOCH),
+                             counter.get(PROP_COUNT))
+
+
+def create_day_record(site_id: str, site_name: str, funnel_id: str, funnel: dict, step_id: str, step: dict,
+                      date_iso: str, epoch, count) -> dict:
+    """
+    Flat record of a step counter, date is shared per epoch (memoized) instead of converted per record
+    """
+    record = {
+        "site_id": site_id,
+        "site_name": site_name,
+        "funnel_id": funnel_id,
+        "funnel_name": funnel.get(PROP_NAME),
+        "funnel_created": funnel.get(PROP_CREATED),
+        "funnel_step_id": step_id,
+        "funnel_step_name": step.get(PROP_NAME),
+        "funnel_step_url": step.get(PROP_URL),
+        "date": get_epoch_datetime(epoch),
+        "date_iso": date_iso,
+        "date_epoch": int(epoch),
+        "count": int(count)
+    }
+
+    return record
+
+
+class RecordQuery:
+    def __init__(self,
+                 site_ids: Optional[set] = None,
+                 funnel_ids: Optional[set] = None,
+                 step_ids: Optional[set] = None,
+                 date_from: Optional[str] = None,
+                 date_to: Optional[str] = None,
+                 fields: Optional[list] = None,
+                 limit: Optional[int] = None,
+                 cursor: Optional[str] = None):
+        self.site_ids = site_ids
+        self.funnel_ids = funnel_ids
+        self.step_ids = step_ids
+        self.date_from = date_from
+        self.date_to = date_to
+        self.fields = fields
+        self.limit = limit
+        self.cursor = cursor
+
+    @staticmethod
+    def encode_cursor(key: tuple, date_iso: str) -> str:
+        data = json.dumps([*key, date_iso]).encode("utf-8")
+
+        return base64.urlsafe_b64encode(data).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        """
+        :return: key of (site id, funnel id, step id) and date iso of the last record in previous page
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+
+        except Exception:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+        if not isinstance(values, list) or len(values) != 4 or not all(isinstance(value, str) for value in values):
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+        site_id, funnel_id, step_id, date_iso = values
+
+        RecordQuery.validate_date(date_iso, "cursor")
+
+        return (site_id, funnel_id, step_id), date_iso
+
+    @staticmethod
+    def validate_date(value: Optional[str], name: str):
+        """
+        Raise ValueError when the value is not a date in ISO format (YYYY-MM-DD)
+        """
+        if value is None:
+            return
+
+        try:
+            date.fromisoformat(value)
+
+        except ValueError:
+            raise ValueError(f"Invalid {name} date: {value}, expected format: YYYY-MM-DD")
+
+    def validate(self):
+        """
+        Raise ValueError when dates or cursor are invalid
+        """
+        self.validate_date(self.date_from, "from")
+        self.validate_date(self.date_to, "to")
+
+        if self.cursor is not None:
+            self.decode_cursor(self.cursor)
+
+    def project(self, record: dict) -> dict:
+        if self.fields is None:
+            return record
+
+        result = {field: record[field] for field in self.fields if field in record}
+
+        return result
+
+
+class RecordIndexEntry:
+    __slots__ = ["key", "site_name", "days"]
+
+    def __init__(self, key: tuple, site_name: str, days: array):
+        self.key = key
+        self.site_name = site_name
+        self.days = days
+
+
+class RecordIndex:
+    """
+    Index of step counters by (site, funnel, step) with sorted days,
+    narrow queries visit only the matching steps and use binary search for the date range.
+
+    Only keys and days (date ordinals) are indexed, funnels and steps of a page are taken from the site data
+    when the records are built, so sites that are not queried can be unloaded
+    """
+    def __init__(self, sites, get_site_data: Callable[[str], dict]):
+        """
+        :param sites: iterable of (site id, site name, funnels data), data of a site is not kept
+        :param get_site_data: function returning funnels data of a site by its key
+        """
+        entries = []
+
+        for site_id, site_name, funnels in sites:
+            site_key = str(site_id)
+
+            for funnel_key in list(funnels.keys()):
+                funnel = funnels[funnel_key]
+                steps = funnel.get(PROP_STEPS, {})
+
+                for step_key in list(steps.keys()):
+                    counters = steps[step_key].get(PROP_COUNTERS, {})
+
+                    if isinstance(counters, CounterSeries):
+                        days = array("i", counters.days)
+                    else:
+                        days = array("i", sorted(get_date_ordinal(date_iso) for date_iso in counters.keys()))
+
+                    entries.append(RecordIndexEntry((site_key, funnel_key, step_key), site_name, days))
+
+        entries.sort(key=lambda item: item.key)
+
+        self._get_site_data = get_site_data
+        self._entries = entries
+        self._keys = [entry.key for entry in entries]
+        self._by_site = {}
+        self._by_funnel = {}
+
+        for position, entry in enumerate(entries):
+            site_key, funnel_key, step_key = entry.key
+
+            self._by_site.setdefault(site_key, []).append(position)
+            self._by_funnel.setdefault(funnel_key, []).append(position)
+
+    def query(self, query: RecordQuery):
+        """
+        Matching records in (site, funnel, step, date) order
+
+        :param query: record query
+        :return: generator of (RecordIndexEntry, date iso)
+        """
+        positions = self._get_positions(query)
+        after_key = None
+        after_date = None
+
+        if query.cursor is not None:
+            after_key, after_date = query.decode_cursor(query.cursor)
+
+            start = bisect_left(self._keys, after_key)
+            positions = [position for position in positions if position >= start]
+
+        for position in positions:
+            entry = self._entries[position]
+            site_key, funnel_key, step_key = entry.key
+
+            if query.step_ids is not None and step_key not in query.step_ids:
+                continue
+
+            days = entry.days
+
+            first = 0 if query.date_from is None else bisect_left(days, get_date_ordinal(query.date_from))
+            last = len(days) if query.date_to is None else bisect_right(days, get_date_ordinal(query.date_to))
+
+            if entry.key == after_key:
+                first = max(first, bisect_right(days, get_date_ordinal(after_date)))
+
+            for i in range(first, last):
+                yield entry, get_day_iso(days[i])
+
+    def get_page(self, query: RecordQuery):
+        """
+        Page of matching records
+
+        :param query: record query
+        :return: list of (RecordIndexEntry, date iso) and cursor of the next page (None when it is the last page)
+        """
+        matches = self.query(query)
+
+        if query.limit is None:
+            return list(matches), None
+
+        page = list(islice(matches, query.limit + 1))
+        next_cursor = None
+
+        if len(page) > query.limit:
+            page = page[:query.limit]
+
+            entry, date_iso = page[-1]
+            next_cursor = query.encode_cursor(entry.key, date_iso)
+
+        return page, next_cursor
+
+    def get_flat_records(self, query: RecordQuery, page: list) -> list:
+        result = []
+        sites = {}
+
+        for entry, date_iso in page:
+            site_key, funnel_key, step_key = entry.key
+            funnel, step = self._get_funnel_step(sites, entry)
+
+            record = create_flat_record(site_key, entry.site_name, funnel_key, funnel, step_key, step, date_iso)
+
+            result.append(query.project(record))
+
+        return result
+
+    def get_nested_records(self, page: list) -> dict:
+        """
+        Records in the structure of /json, only sites, funnels and steps with matching counters are included
+        """
+        result = {}
+        sites = {}
+
+        for entry, date_iso in page:
+            site_key, funnel_key, step_key = entry.key
+            entry_funnel, entry_step = self._get_funnel_step(sites, entry)
+
+            site = result.get(site_key)
+
+            if site is None:
+                site = {
+                    "id": int(site_key) if site_key.isdigit() else site_key,
+                    "name": entry.site_name,
+                    "funnels": {}
+                }
+
+                result[site_key] = site
+
+            funnels = site["funnels"]
+            funnel = funnels.get(funnel_key)
+
+            if funnel is None:
+                funnel = {key: entry_funnel[key] for key in entry_funnel if key != PROP_STEPS}
+                funnel[PROP_STEPS] = {}
+
+                funnels[funnel_key] = funnel
+
+            steps = funnel[PROP_STEPS]
+            step = steps.get(step_key)
+
+            if step is None:
+                step = {key: entry_step[key] for key in entry_step if key != PROP_COUNTERS}
+                step[PROP_COUNTERS] = {}
+
+                steps[step_key] = step
+
+            step[PROP_COUNTERS][date_iso] = entry_step[PROP_COUNTERS][date_iso]
+
+        return result
+
+    def _get_funnel_step(self, sites: dict, entry: RecordIndexEntry) -> tuple:
+        """
+        Funnel and step of an entry, data of every site in the page is requested once
+
+        :param sites: data of the sites already requested for the page, by site key
+        :param entry: index entry
+        :return: funnel data and step data
+        """
+        site_key, funnel_key, step_key = entry.key
+
+        funnels = sites.get(site_key)
+
+        if funnels is None:
+            funnels = self._get_site_data(site_key)
+            sites[site_key] = funnels
+
+        funnel = funnels[funnel_key]
+
+        return funnel, funnel[PROP_STEPS][step_key]
+
+    def _get_positions(self, query: RecordQuery) -> list:
+        if query.site_ids is None and query.funnel_ids is None:
+            return range(len(self._entries))
+
+        positions = None
+
+        if query.site_ids is not None:
+            positions = set()
+
+            for site_key in query.site_ids:
+                positions.update(self._by_site.get(site_key, []))
+
+        if query.funnel_ids is not None:
+            funnel_positions = set()
+
+            for funnel_key in query.funnel_ids:
+                funnel_positions.update(self._by_funnel.get(funnel_key, []))
+
+            positions = funnel_positions if positions is None else positions & funnel_positions
+
+        return sorted(positions)
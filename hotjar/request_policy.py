@@ -0,0 +1,258 @@
+import time
+import random
+import threading
+
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from .const import *
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After header value in seconds
+
+    :param value: header value, delay in seconds or HTTP date
+    :return: seconds to wait, None when header is missing or invalid
+    """
+    if value is None:
+        return None
+
+    value = value.strip()
+
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at is None:
+        return None
+
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all threads and coroutines,
+    acquiring a token reserves the next free slot and returns the time to wait for it,
+    so the caller sleeps with time.sleep or asyncio.sleep without holding the lock.
+
+    Rate is adaptive - halved on throttling, recovers gradually on successful requests.
+    """
+    def __init__(self, rate: float, burst: int = RATE_LIMIT_BURST):
+        """
+        :param rate: maximum requests per second, 0 - unlimited
+        :param burst: requests that can be performed at once after idle time
+        """
+        self._max_rate = rate
+        self._min_rate = min(rate, RATE_LIMIT_MIN)
+        self._rate = rate
+        self._burst = burst
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def acquire(self) -> float:
+        """
+        Take a token
+
+        :return: seconds to wait before performing the request
+        """
+        if self._max_rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+
+            self._tokens = min(float(self._burst), self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+
+            # Negative tokens are requests already waiting for their slot
+            delay = 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+
+            return max(delay, self._blocked_until - now)
+
+    def throttle(self, delay: float):
+        """
+        Upstream throttled a request, all callers wait for the delay and continue at lower rate
+
+        :param delay: seconds to block all requests
+        """
+        if self._max_rate <= 0:
+            return
+
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            self._rate = max(self._min_rate, self._rate * RATE_LIMIT_DECREASE)
+
+    def recover(self):
+        if self._rate < self._max_rate:
+            with self._lock:
+                self._rate = min(self._max_rate, self._rate + self._max_rate * RATE_LIMIT_RECOVERY)
+
+
+class RequestPolicy:
+    """
+    Decides how each attempt of a request is handled:
+    401 / 403 - session is invalid, login again and retry,
+    429 / 5xx - back off (Retry-After when available) and retry with the same session,
+    network error - back off and retry,
+    login failure - back off and login again,
+    other status - fail without retry.
+
+    Shared by sync and async API clients, waiting is done by the caller.
+    """
+    def __init__(self,
+                 rate: float = DEFAULT_RATE_LIMIT,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX):
+        self._bucket = TokenBucket(rate)
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "throttled": 0,
+            "server_errors": 0,
+            "network_errors": 0,
+            "login_failures": 0,
+            "reauthentications": 0,
+            "rate_limit_wait": 0.0,
+            "backoff_wait": 0.0,
+        }
+
+    @property
+    def max_attempts(self) -> int:
+        return self._max_retries + 1
+
+    @property
+    def stats(self) -> dict:
+        with self._stats_lock:
+            result = dict(self._stats)
+
+        result["rate_limit_wait"] = round(result["rate_limit_wait"], 3)
+        result["backoff_wait"] = round(result["backoff_wait"], 3)
+        result["rate"] = self._bucket.rate
+
+        return result
+
+    def acquire(self) -> float:
+        """
+        Rate limit slot of the next attempt
+
+        :return: seconds to wait before performing the attempt
+        """
+        delay = self._bucket.acquire()
+
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["rate_limit_wait"] += delay
+
+        return delay
+
+    def get_backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Exponential backoff with full jitter, never shorter than Retry-After
+
+        :param attempt: attempt number (0 - first attempt)
+        :param retry_after: delay requested by upstream
+        :return: seconds to wait before the next attempt
+        """
+        delay = random.uniform(0, min(self._backoff_max, self._backoff_base * 2 ** attempt))
+
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self._backoff_max))
+
+        return delay
+
+    def on_success(self):
+        self._bucket.recover()
+
+        self._count("succeeded")
+
+    def on_response(self, attempt: int, status: int, retry_after: Optional[str] = None) -> tuple:
+        """
+        Decision for a failed response
+
+        :param attempt: attempt number (0 - first attempt)
+        :param status: HTTP status code
+        :param retry_after: Retry-After header value
+        :return: action (REQUEST_ACTION_*) and seconds to wait before the next attempt
+        """
+        if status in HTTP_STATUS_REAUTHENTICATE:
+            self._count("reauthentications")
+
+            return self._retry(attempt, REQUEST_ACTION_REAUTHENTICATE, 0.0)
+
+        if status == HTTP_STATUS_TOO_MANY_REQUESTS or status >= 500:
+            retry_after_seconds = parse_retry_after(retry_after)
+            delay = self.get_backoff(attempt, retry_after_seconds)
+
+            if status == HTTP_STATUS_TOO_MANY_REQUESTS:
+                self._count("throttled")
+
+                self._bucket.throttle(delay)
+
+            else:
+                self._count("server_errors")
+
+            return self._retry(attempt, REQUEST_ACTION_RETRY, delay)
+
+        self._count("failed")
+
+        return REQUEST_ACTION_FAIL, 0.0
+
+    def on_error(self, attempt: int) -> tuple:
+        """
+        Decision for a network error (connection, timeout or invalid response)
+
+        :param attempt: attempt number (0 - first attempt)
+        :return: action (REQUEST_ACTION_*) and seconds to wait before the next attempt
+        """
+        self._count("network_errors")
+
+        return self._retry(attempt, REQUEST_ACTION_RETRY, self.get_backoff(attempt))
+
+    def on_login_failure(self, attempt: int) -> tuple:
+        """
+        Decision for an attempt that was not performed since login failed
+
+        :param attempt: attempt number (0 - first attempt)
+        :return: action (REQUEST_ACTION_*) and seconds to wait before the next attempt
+        """
+        self._count("login_failures")
+
+        return self._retry(attempt, REQUEST_ACTION_REAUTHENTICATE, self.get_backoff(attempt))
+
+    def _retry(self, attempt: int, action: str, delay: float) -> tuple:
+        if attempt + 1 >= self.max_attempts:
+            self._count("failed")
+
+            return REQUEST_ACTION_FAIL, 0.0
+
+        with self._stats_lock:
+            self._stats["retries"] += 1
+            self._stats["backoff_wait"] += delay
+
+        return action, delay
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
@@ -0,0 +1,213 @@
+import time
+import asyncio
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.docker_logger import get_logger
+
+from .const import *
+from .metrics import CYCLE_DURATION, CYCLE_LAST_DURATION, CYCLE_OVERRUNS, UPDATE_INTERVAL, SITE_UPDATE_DURATION, \
+    SITE_UPDATE_FAILURES
+
+_LOGGER = get_logger(__name__)
+
+
+class SiteScheduler:
+    def __init__(self, interval: int, max_parallel: int = DEFAULT_PARALLEL_SITES):
+        self._interval = interval
+        self._max_parallel = max_parallel
+        self._tick = min(interval, SCHEDULER_TICK)
+
+        self._cycle_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self._next_due = {}
+        self._resources_next_due = 0
+        self._site_stats = {}
+        self._cycle_stats = {
+            "cycles": 0,
+            "skipped": 0,
+            "last_started": None,
+            "last_duration": None,
+            "last_sites": 0,
+        }
+
+        self._executor = None
+
+        UPDATE_INTERVAL.set(interval)
+
+        if max_parallel > 1:
+            self._executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="hotjar-site")
+
+    @property
+    def tick(self) -> int:
+        return self._tick
+
+    @property
+    def is_running(self) -> bool:
+        return self._cycle_lock.locked()
+
+    @property
+    def stats(self) -> dict:
+        with self._stats_lock:
+            result = {
+                "interval": self._interval,
+                "max_parallel": self._max_parallel,
+                "cycle": dict(self._cycle_stats),
+                "sites": {str(site_id): dict(self._site_stats[site_id]) for site_id in self._site_stats}
+            }
+
+        return result
+
+    def start_cycle(self) -> bool:
+        """
+        Marks a cycle as running
+
+        :return: False when previous cycle is still running
+        """
+        started = self._cycle_lock.acquire(blocking=False)
+
+        if not started:
+            with self._stats_lock:
+                self._cycle_stats["skipped"] += 1
+
+        return started
+
+    def end_cycle(self):
+        self._cycle_lock.release()
+
+    def is_due(self) -> bool:
+        """
+        Whether sites list should be refreshed or any of the known sites is due for update
+        """
+        now = time.time()
+
+        result = self._resources_next_due <= now or any(self._next_due[site_id] <= now for site_id in self._next_due)
+
+        return result
+
+    def get_due_sites(self, site_managers: list) -> list:
+        """
+        Get sites that are due for update, the longest waiting first
+
+        :param site_managers: list of site managers
+        :return: list of site managers
+        """
+        now = time.time()
+
+        self._resources_next_due = now + self._interval
+
+        due_sites = [site_manager for site_manager in site_managers
+                     if self._next_due.get(site_manager.site_id, 0) <= now]
+
+        due_sites.sort(key=lambda site_manager: self._next_due.get(site_manager.site_id, 0))
+
+        return due_sites
+
+    def run_cycle(self, site_managers: list, update):
+        """
+        Updates due sites, up to max parallel sites at once
+
+        :param site_managers: list of site managers
+        :param update: function that updates single site manager
+        """
+        started = time.time()
+        due_sites = self.get_due_sites(site_managers)
+
+        if self._executor is None:
+            for site_manager in due_sites:
+                self._update_site(site_manager, update)
+
+        else:
+            futures = [self._executor.submit(self._update_site, site_manager, update) for site_manager in due_sites]
+
+            for future in futures:
+                future.result()
+
+        self._set_cycle_stats(started, len(due_sites))
+
+    async def async_run_cycle(self, site_managers: list, update):
+        """
+        Updates due sites from the event loop, up to max parallel sites at once
+
+        :param site_managers: list of site managers
+        :param update: coroutine function that updates single site manager
+        """
+        started = time.time()
+        due_sites = self.get_due_sites(site_managers)
+        semaphore = asyncio.Semaphore(self._max_parallel)
+
+        async def update_site(site_manager):
+            async with semaphore:
+                site_started = self._set_site_started(site_manager)
+                error = None
+
+                try:
+                    await update(site_manager)
+                except Exception as ex:
+                    error = str(ex)
+
+                    _LOGGER.error(f"Failed to update site {site_manager.name} ({site_manager.site_id}), Error: {ex}")
+
+                self._set_site_completed(site_manager, site_started, error)
+
+        await asyncio.gather(*[update_site(site_manager) for site_manager in due_sites])
+
+        self._set_cycle_stats(started, len(due_sites))
+
+    def _update_site(self, site_manager, update):
+        site_started = self._set_site_started(site_manager)
+        error = None
+
+        try:
+            update(site_manager)
+        except Exception as ex:
+            error = str(ex)
+
+            _LOGGER.error(f"Failed to update site {site_manager.name} ({site_manager.site_id}), Error: {ex}")
+
+        self._set_site_completed(site_manager, site_started, error)
+
+    def _set_site_started(self, site_manager) -> float:
+        started = time.time()
+
+        # Next due is set relative to the start, each site keeps its own pace regardless of other sites
+        self._next_due[site_manager.site_id] = started + self._interval
+
+        return started
+
+    def _set_site_completed(self, site_manager, started: float, error):
+        finished = time.time()
+        site_key = str(site_manager.site_id)
+
+        SITE_UPDATE_DURATION.labels(site_key).observe(finished - started)
+
+        if error is not None:
+            SITE_UPDATE_FAILURES.labels(site_key).inc()
+
+        with self._stats_lock:
+            self._site_stats[site_manager.site_id] = {
+                "name": site_manager.name,
+                "last_started": started,
+                "last_duration": finished - started,
+                "next_due": self._next_due.get(site_manager.site_id),
+                "last_error": error,
+            }
+
+    def _set_cycle_stats(self, started: float, sites_count: int):
+        duration = time.time() - started
+
+        with self._stats_lock:
+            self._cycle_stats["cycles"] += 1
+            self._cycle_stats["last_started"] = started
+            self._cycle_stats["last_duration"] = duration
+            self._cycle_stats["last_sites"] = sites_count
+
+        CYCLE_DURATION.observe(duration)
+        CYCLE_LAST_DURATION.set(duration)
+
+        if duration > self._interval:
+            CYCLE_OVERRUNS.inc()
+
+            _LOGGER.warning(f"Update cycle took {duration:.1f}s, longer than interval of {self._interval}s")
@@ -0,0 +1,79 @@
+import json
+import time
+
+from os import path
+from typing import Optional
+
+from helpers.atomic_file import write_atomic
+from helpers.docker_logger import get_logger
+
+from .const import *
+
+_LOGGER = get_logger(__name__)
+
+
+class SessionStore:
+    """
+    Persists the authorization info and cookies of the logged in session,
+    so restarting the process reuses the session instead of logging in again.
+
+    File is written atomically and readable by the owner only (temp file permissions).
+    """
+    def __init__(self, data_dir: str):
+        self._file = f"{data_dir}{SESSION_FILE}"
+
+    @property
+    def file(self) -> str:
+        return self._file
+
+    def load(self, email: str) -> Optional[dict]:
+        """
+        Load session of the user
+
+        :param email: user email
+        :return: session data (user_id, access_key and cookies), None when not available
+        """
+        if not path.exists(self._file):
+            return None
+
+        try:
+            with open(self._file) as session_file:
+                data = json.load(session_file)
+
+        except Exception as ex:
+            _LOGGER.warning(f"Failed to load stored session, Error: {ex}")
+
+            return None
+
+        if data.get("email") != email:
+            return None
+
+        if time.time() - data.get("saved", 0) > SESSION_MAX_AGE:
+            _LOGGER.debug("Stored session expired")
+
+            return None
+
+        return data
+
+    def save(self, email: str, user_id, access_key: str, cookies: list):
+        """
+        Save session of the user
+
+        :param email: user email
+        :param user_id: user id
+        :param access_key: access key
+        :param cookies: list of cookies (name, value, domain, path)
+        """
+        data = {
+            "email": email,
+            "user_id": user_id,
+            "access_key": access_key,
+            "cookies": cookies,
+            "saved": time.time(),
+        }
+
+        try:
+            write_atomic(self._file, json.dumps(data))
+
+        except Exception as ex:
+            _LOGGER.warning(f"Failed to store session, Error: {ex}")
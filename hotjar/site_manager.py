@@ -1,68 +1,402 @@
 import json
+import time
+import asyncio
+import hashlib
+import threading
 
-from os import path
+from concurrent.futures import Executor, wait
+from typing import Callable, Optional
 
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 from helpers.docker_logger import get_logger
-from helpers.queryable_datetime import QueryableDateTime
+from helpers.queryable_datetime import DayRange
 
 from .api import HotjarAPI
+from .async_api import AsyncHotjarAPI
+from .storage import BaseStorage
+from .counter_series import CounterSeries, load_counter_series, get_date_ordinal
+from .metrics import DAYS_LOADED, COUNTERS_CHANGED, FUNNEL_UPDATE_DURATION, STORAGE_SAVE_DURATION, STORAGE_SIZE
 from .const import *
 
 _LOGGER = get_logger(__name__)
 
 
 class SiteManager:
-    def __init__(self, api: HotjarAPI, site_id: int, site_name: str, created, specific_funnels: list, environment):
+    def __init__(self, api: Optional[HotjarAPI], site_id: int, site_name: str, created, specific_funnels: list,
+                 storage: BaseStorage, executor: Optional[Executor] = None, settle_days: int = DEFAULT_SETTLE_DAYS,
+                 funnels_refresh_interval: int = DEFAULT_FUNNELS_REFRESH_INTERVAL,
+                 backfill_strategy: str = DEFAULT_BACKFILL_STRATEGY,
+                 on_data_access: Optional[Callable] = None, funnel_executor: Optional[Executor] = None):
+        """
+        Site data is loaded from the storage on first access (or update) and can be unloaded between updates
+
+        :param on_data_access: called with the site manager whenever its data is accessed (not by updates)
+        :param funnel_executor: pool updating funnels of the site concurrently (shared between sites),
+                                must not be the executor of the days requests
+        """
         self._api = api
+        self._on_data_access = on_data_access
+        self._backfill_strategy = backfill_strategy
+        self._executor = executor
+        self._funnel_executor = funnel_executor
+        self._settle_days = settle_days
+        self._funnels_refresh_interval = funnels_refresh_interval
+        self._funnels_refreshed = 0
         self._site_id = site_id
         self._site_name = site_name
         self._created = created
         self._specific_funnels = specific_funnels
-        self._file = f"/data/site_{self._site_id}_v{VERSION}.json"
+        self._storage = storage
         self._updates = []
-
-        if environment != DEFAULT_ENVIRONMENT:
-            self._file = self._file.replace("/data/", "")
+        self._changed_counters = set()
+        self._changes_lock = threading.Lock()
+        self._progress = None
 
         self._data = None
+        self._data_lock = threading.Lock()
+        self._updating = False
+        self._records = None
+        self._funnel_keys = None
+        self._memory_size = 0
 
-        self._load_data()
+    @property
+    def site_id(self):
+        return self._site_id
 
     @property
     def name(self):
         return self._site_name
 
     @property
-    def data(self):
-        return self._data
+    def created(self):
+        return self._created
+
+    @property
+    def data(self) -> dict:
+        """
+        Site data, loaded from the storage when it is not resident
+        """
+        data = self._get_data()
+
+        if self._on_data_access is not None:
+            self._on_data_access(self)
+
+        return data
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._data is not None
+
+    @property
+    def records(self) -> int:
+        """
+        Number of counters, kept when the data is unloaded
+        """
+        if self._records is None:
+            self._update_size(self.data)
+
+        return self._records
+
+    @property
+    def funnel_keys(self) -> list:
+        """
+        Keys of the funnels, kept when the data is unloaded
+        """
+        if self._funnel_keys is None:
+            self._update_size(self.data)
+
+        return self._funnel_keys
+
+    @property
+    def progress(self) -> Optional[dict]:
+        """
+        Progress of the last (or running) update: funnels, completed funnels,
+        funnels in progress (start time) and duration of every completed funnel, None before the first update
+        """
+        with self._changes_lock:
+            if self._progress is None:
+                return None
+
+            result = dict(self._progress)
+            result["running"] = dict(self._progress["running"])
+            result["durations"] = dict(self._progress["durations"])
+
+        return result
+
+    @property
+    def memory_size(self) -> int:
+        """
+        Estimated memory of the site data (bytes), 0 when not loaded
+        """
+        return self._memory_size if self._data is not None else 0
+
+    def unload(self) -> bool:
+        """
+        Drop site data from memory, it is reloaded from the storage on next access,
+        requests holding the data keep their reference
+
+        :return: whether it was unloaded, site is not unloaded while updating
+        """
+        with self._data_lock:
+            if self._updating:
+                return False
+
+            self._data = None
+
+        _LOGGER.debug(f"Site {self._site_name} ({self._site_id}) unloaded")
+
+        return True
+
+    def _get_data(self) -> dict:
+        data = self._data
+
+        if data is None:
+            with self._data_lock:
+                if self._data is None:
+                    self._load_data()
+
+                data = self._data
+
+        return data
+
+    def _start_update(self):
+        with self._data_lock:
+            if self._data is None:
+                self._load_data()
+
+            self._updating = True
+
+    def _end_update(self):
+        self._updating = False
+
+    def _update_size(self, data: dict):
+        records = 0
+        steps_count = 0
+
+        for funnel_key in list(data.keys()):
+            steps = data[funnel_key][PROP_STEPS]
+
+            steps_count += len(steps)
+
+            for step_key in list(steps.keys()):
+                records += len(steps[step_key][PROP_COUNTERS])
+
+        self._records = records
+        self._funnel_keys = list(data.keys())
+        self._memory_size = len(data) * SITE_MEMORY_FUNNEL_BYTES + steps_count * SITE_MEMORY_STEP_BYTES + \
+            records * SITE_MEMORY_COUNTER_BYTES
+
+    def export_data(self) -> dict:
+        """
+        Copy of site data where counters are dictionaries of date (ISO format) and counter
+        """
+        result = {}
+        data = self.data
+
+        for funnel_key in list(data.keys()):
+            funnel_data = data[funnel_key]
+            steps = funnel_data[PROP_STEPS]
+
+            funnel_export = {key: funnel_data[key] for key in funnel_data if key != PROP_STEPS}
+            funnel_export[PROP_STEPS] = {}
+
+            for step_key in list(steps.keys()):
+                step = steps[step_key]
+
+                step_export = {key: step[key] for key in step if key != PROP_COUNTERS}
+                step_export[PROP_COUNTERS] = step[PROP_COUNTERS].to_dict()
+
+                funnel_export[PROP_STEPS][step_key] = step_export
+
+            result[funnel_key] = funnel_export
+
+        return result
 
     def _load_data(self):
-        if path.exists(self._file):
-            with open(self._file) as json_file:
-                try:
-                    self._data = json.load(json_file)
+        try:
+            data = load_counter_series(self._storage.load(self._site_id))
 
-                except Exception as ex:
-                    _LOGGER.error(f"Failed to load previous state, starting from day 1, Error: {ex}")
-                    self._data = {}
+        except Exception as ex:
+            _LOGGER.error(f"Failed to load previous state, starting from day 1, Error: {ex}")
+            data = {}
 
-        else:
-            self._data = {}
+        self._update_size(data)
+
+        self._data = data
 
     def _save_data(self):
-        with open(self._file, "w") as outfile:
-            json.dump(self.data, outfile)
+        started = time.perf_counter()
+
+        self._storage.save(self._site_id, self._data, self._updates, self._changed_counters)
+
+        STORAGE_SAVE_DURATION.labels(self._storage.name).observe(time.perf_counter() - started)
+        STORAGE_SIZE.labels(self._storage.name).set(self._storage.get_size())
 
     def update(self):
         _LOGGER.info(f"Updating site: {self._site_name} ({self._site_id})")
 
-        all_funnels = self._api.get_site_funnels(self._site_id)
+        self._start_update()
+
+        try:
+            self._update()
+
+        finally:
+            self._end_update()
+
+    def _update(self):
+        if self.is_funnels_refresh_due():
+            all_funnels = self._api.get_site_funnels(self._site_id)
+
+            changed_funnels = self.get_changed_funnels(all_funnels)
+
+            all_funnel_details = self._map_funnels(
+                lambda funnel: self._api.get_site_funnel(self._site_id, funnel[0], revalidate=True), changed_funnels)
+
+            # Applied in the funnels list order, funnels order of the site data does not depend on response times
+            for (funnel_id, funnel_name, funnel_hash), funnel_details in zip(changed_funnels, all_funnel_details):
+                self.load_funnel_details(funnel_id, funnel_name, funnel_details, funnel_hash)
+
+        funnel_ids = self.get_funnel_ids()
+
+        self._start_progress(funnel_ids)
+
+        self._map_funnels(self._load_tracked_funnel_counters, funnel_ids)
+
+        self.complete_update()
+
+    def _map_funnels(self, function, items: list) -> list:
+        """
+        Call function for every item, concurrently when funnel executor is available,
+        waits for all items before an error is raised
+
+        :return: list of results, same order as items
+        """
+        if self._funnel_executor is None:
+            return [function(item) for item in items]
+
+        futures = [self._funnel_executor.submit(function, item) for item in items]
+
+        wait(futures)
+
+        return [future.result() for future in futures]
+
+    async def async_update(self, api: AsyncHotjarAPI):
+        """
+        Update site using the async API, funnels and their days are requested concurrently,
+        concurrency is limited by the API connection pool
+
+        :param api: async API
+        """
+        _LOGGER.info(f"Updating site: {self._site_name} ({self._site_id})")
+
+        self._start_update()
+
+        try:
+            await self._async_update(api)
+
+        finally:
+            self._end_update()
+
+    async def _async_update(self, api: AsyncHotjarAPI):
+        if self.is_funnels_refresh_due():
+            all_funnels = await api.get_site_funnels(self._site_id)
+
+            changed_funnels = self.get_changed_funnels(all_funnels)
+
+            all_funnel_details = await asyncio.gather(*[api.get_site_funnel(self._site_id, funnel_id, revalidate=True)
+                                                        for funnel_id, funnel_name, funnel_hash in changed_funnels])
+
+            for (funnel_id, funnel_name, funnel_hash), funnel_details in zip(changed_funnels, all_funnel_details):
+                self.load_funnel_details(funnel_id, funnel_name, funnel_details, funnel_hash)
+
+        funnel_ids = self.get_funnel_ids()
+
+        self._start_progress(funnel_ids)
+
+        await asyncio.gather(*[self._async_load_tracked_funnel_counters(api, funnel_id) for funnel_id in funnel_ids])
+
+        self.complete_update()
+
+    def _start_progress(self, funnel_ids: list):
+        with self._changes_lock:
+            self._progress = {
+                "started": time.time(),
+                "funnels": len(funnel_ids),
+                "completed": 0,
+                "running": {},
+                "durations": {}
+            }
+
+    def _load_tracked_funnel_counters(self, funnel_id):
+        started = self._set_funnel_started(funnel_id)
+
+        try:
+            self.load_funnel_counters(funnel_id)
+
+        finally:
+            self._set_funnel_completed(funnel_id, started)
+
+    async def _async_load_tracked_funnel_counters(self, api: AsyncHotjarAPI, funnel_id):
+        started = self._set_funnel_started(funnel_id)
+
+        try:
+            await self.async_load_funnel_counters(api, funnel_id)
+
+        finally:
+            self._set_funnel_completed(funnel_id, started)
+
+    def _set_funnel_started(self, funnel_id) -> float:
+        started = time.time()
+
+        with self._changes_lock:
+            self._progress["running"][str(funnel_id)] = started
+
+        return started
+
+    def _set_funnel_completed(self, funnel_id, started: float):
+        funnel_key = str(funnel_id)
+        duration = time.time() - started
+
+        FUNNEL_UPDATE_DURATION.labels(str(self._site_id)).observe(duration)
+
+        with self._changes_lock:
+            progress = self._progress
+
+            progress["running"].pop(funnel_key, None)
+            progress["durations"][funnel_key] = duration
+            progress["completed"] += 1
+
+            completed = progress["completed"]
+
+        funnel_name = self._data[funnel_key].get(PROP_NAME)
+
+        _LOGGER.info(f"Funnel {funnel_name} ({funnel_id}) counters loaded in {duration:.2f}s, "
+                     f"Site: {self._site_name} ({self._site_id}), Completed: {completed}/{progress['funnels']}")
+
+    def is_funnels_refresh_due(self) -> bool:
+        """
+        Funnels definitions are refreshed on their own interval, or when there are no funnels yet
+        """
+        is_due = len(self._data) == 0 or time.time() - self._funnels_refreshed >= self._funnels_refresh_interval
+
+        return is_due
+
+    def get_changed_funnels(self, all_funnels: Optional[list]) -> list:
+        """
+        Relevant funnels which their definition in the funnels list changed since their details were loaded
+
+        :param all_funnels: funnels list from API
+        :return: list of (funnel id, funnel name, funnel hash)
+        """
+        result = []
 
         if all_funnels is None:
             _LOGGER.error("Could not load funnels from API")
+
         else:
+            self._funnels_refreshed = time.time()
+
             for funnel in all_funnels:
                 funnel_name = funnel.get(PROP_NAME)
                 funnel_id = funnel.get(PROP_ID)
@@ -72,31 +406,52 @@ class SiteManager:
                     _LOGGER.debug(f"Skipping funnel: {funnel_name} ({funnel_id})")
                     continue
 
+                funnel_hash = hashlib.sha1(json.dumps(funnel, sort_keys=True).encode("utf-8")).hexdigest()
+                funnel_data = self._data.get(funnel_key)
+
+                # Steps can change without a change in the funnels list, details are reloaded once in a while anyway
+                if funnel_data is not None and funnel_data.get(PROP_FUNNEL_HASH) == funnel_hash and \
+                        self._funnels_refreshed - funnel_data.get(PROP_DETAILS_REFRESHED, 0) < FUNNEL_DETAILS_MAX_AGE:
+                    _LOGGER.debug(f"Funnel not changed: {funnel_name} ({funnel_id})")
+                    continue
+
                 _LOGGER.debug(f"Processing funnel: {funnel_name} ({funnel_id})")
 
-                funnel_details = self._api.get_site_funnel(self._site_id, funnel_id)
+                result.append((funnel_id, funnel_name, funnel_hash))
 
-                if funnel_details is None:
-                    _LOGGER.error(f"Could not load funnel {funnel_name} ({funnel_id}) from API")
-                else:
-                    self.load_funnel(funnel_id, funnel_details)
+        return result
 
-            for funnel_key in self._data:
-                funnel = self._data[funnel_key]
-                funnel_id = funnel.get(PROP_ID)
+    def get_funnel_ids(self) -> list:
+        return [self._data[funnel_key].get(PROP_ID) for funnel_key in self._data]
 
-                self.load_funnel_counters(funnel_id)
+    def load_funnel_details(self, funnel_id, funnel_name, funnel_details, funnel_hash: Optional[str] = None):
+        if funnel_details is None:
+            _LOGGER.error(f"Could not load funnel {funnel_name} ({funnel_id}) from API")
+        else:
+            self.load_funnel(funnel_id, funnel_details)
 
-            changes_count = len(self._updates)
+            funnel_data = self._data.get(str(funnel_id))
 
-            self._updates = []
+            # Stored with the funnel metadata, unchanged funnels are not reloaded after restart
+            if funnel_data is not None and funnel_hash is not None:
+                funnel_data[PROP_FUNNEL_HASH] = funnel_hash
+                funnel_data[PROP_DETAILS_REFRESHED] = self._funnels_refreshed
 
-            if changes_count > 0:
-                _LOGGER.info(f"Site {self._site_name} ({self._site_id}) is updated")
+                self._add_update(funnel_id)
 
-                self._save_data()
-            else:
-                _LOGGER.info(f"Site {self._site_name} ({self._site_id}) was up to date")
+    def complete_update(self):
+        changes_count = len(self._updates)
+
+        if changes_count > 0:
+            _LOGGER.info(f"Site {self._site_name} ({self._site_id}) is updated")
+
+            self._save_data()
+            self._update_size(self._data)
+
+            self._updates = []
+            self._changed_counters = set()
+        else:
+            _LOGGER.info(f"Site {self._site_name} ({self._site_id}) was up to date")
 
     @staticmethod
     def get_date_iso(epoch):
@@ -118,15 +473,16 @@ class SiteManager:
             created_date_iso = self.get_date_iso(created_date)
 
             latest_steps = funnel_details.get(PROP_STEPS)
-            steps = {}
 
-            if funnel_key not in self._data:
+            funnel_data = self._data.get(funnel_key)
+
+            if funnel_data is None:
                 funnel_data = {
                     PROP_NAME: funnel_name,
                     PROP_ID: funnel_id,
                     PROP_CREATED: created_date,
                     PROP_CREATED_ISO: created_date_iso,
-                    PROP_STEPS: steps,
+                    PROP_STEPS: {},
                 }
 
                 _LOGGER.info(f"Funnel data created: {funnel_data}")
@@ -134,61 +490,382 @@ class SiteManager:
                 self._data[funnel_key] = funnel_data
                 updated = True
 
-            steps_updated = self.load_funnel_steps(steps, latest_steps)
+            elif funnel_data.get(PROP_NAME) != funnel_name:
+                _LOGGER.info(f"Funnel {funnel_id} renamed: {funnel_data.get(PROP_NAME)} -> {funnel_name}")
+
+                funnel_data[PROP_NAME] = funnel_name
+                updated = True
+
+            steps_updated = self.load_funnel_steps(funnel_data[PROP_STEPS], latest_steps)
 
             updated = updated or steps_updated
 
-        if updated and funnel_id not in self._updates:
-            self._updates.append(funnel_id)
+        if updated:
+            self._add_update(funnel_id)
 
     def load_funnel_counters(self, funnel_id):
-        changed = False
+        funnel_data, all_dates = self.get_funnel_counters_dates(funnel_id)
+
+        if funnel_data is not None:
+            all_counters = self.get_funnel_counters(funnel_id, all_dates)
+
+            self.load_funnel_counters_results(funnel_data, all_dates, all_counters)
+
+            for pending_range, pending_dates in self.get_pending_dates(funnel_data):
+                all_counters = self.get_funnel_counters(funnel_id, pending_dates)
+
+                self.load_pending_counters_results(funnel_data, pending_range, pending_dates, all_counters)
+
+    async def async_load_funnel_counters(self, api: AsyncHotjarAPI, funnel_id):
+        funnel_data, all_dates = self.get_funnel_counters_dates(funnel_id)
+
+        if funnel_data is not None:
+            all_counters = await self.async_get_funnel_counters(api, funnel_id, all_dates)
+
+            self.load_funnel_counters_results(funnel_data, all_dates, all_counters)
+
+            for pending_range, pending_dates in self.get_pending_dates(funnel_data):
+                all_counters = await self.async_get_funnel_counters(api, funnel_id, pending_dates)
+
+                self.load_pending_counters_results(funnel_data, pending_range, pending_dates, all_counters)
+
+    def get_funnel_counters_dates(self, funnel_id):
+        """
+        Get the days to load counters for
+
+        :param funnel_id: funnel id
+        :return: funnel data and DayRange of the days
+        """
+        all_dates = DayRange(0, -1)
 
         funnel_data = self.get_funnel_data(funnel_id)
         if funnel_data is not None:
             funnel_name = funnel_data.get(PROP_NAME)
             last_update = funnel_data.get(PROP_LAST_UPDATE, self._created)
 
-            steps = funnel_data[PROP_STEPS]
+            all_dates = DayRange.since(last_update)
 
-            last_update_query = QueryableDateTime(last_update)
-            all_dates = last_update_query.get_all_since()
+            _LOGGER.info(f"Processing funnel: {funnel_name} ({funnel_id}), {len(all_dates)} day(s) of counters")
 
-            for item in all_dates:
-                date_query: QueryableDateTime = item
-                date_iso = date_query.date.date().isoformat()
+        return funnel_data, all_dates
 
-                funnel_data[PROP_LAST_UPDATE] = date_query.from_time
-                funnel_data[PROP_LAST_UPDATE_ISO] = date_iso
+    @staticmethod
+    def get_pending_dates(funnel_data: dict) -> list:
+        """
+        Ranges of days before the last update to load again (set by migration of data of a previous version)
+
+        :param funnel_data: funnel data
+        :return: list of (pending range, DayRange of its days)
+        """
+        result = []
+
+        for pending_range in list(funnel_data.get(PROP_PENDING, [])):
+            date_from, date_to = pending_range
+
+            result.append((pending_range, DayRange(get_date_ordinal(date_from), get_date_ordinal(date_to))))
+
+        return result
+
+    def get_open_from(self, min_settle_days: int = 0) -> int:
+        """
+        Start of the first day that is still open for changes, older days are settled and not requested again
+
+        :param min_settle_days: minimum days a day is open after it ends
+        """
+        open_date = date.today() - timedelta(days=max(self._settle_days, min_settle_days))
+        open_from = datetime(open_date.year, open_date.month, open_date.day)
+
+        return int(open_from.timestamp())
+
+    def is_cache_settled(self, to_time: int) -> bool:
+        """
+        Whether a window can be cached forever, even without settle days the last day may still change after midnight
+        """
+        return to_time < self.get_open_from(CACHE_MIN_SETTLE_DAYS)
 
-                _LOGGER.info(f"Processing funnel: {funnel_name} ({funnel_id}), counter from: {date_iso}")
+    def load_funnel_counters_results(self, funnel_data: dict, all_dates: DayRange, all_counters: list):
+        funnel_id = funnel_data.get(PROP_ID)
+        funnel_hash = funnel_data.get(PROP_FUNNEL_HASH)
+        last_update = funnel_data.get(PROP_LAST_UPDATE)
 
-                funnel_counters = self._api.get_site_funnel_counters(self._site_id,
-                                                                     funnel_id,
-                                                                     date_query.from_time,
-                                                                     date_query.to_time)
+        changed_counters = self.merge_funnel_counters(funnel_data, all_dates, all_counters, self.get_open_from())
+
+        self.add_changed_counters(funnel_id, all_counters, changed_counters)
+        self._refresh_outdated_funnel(funnel_data, funnel_hash)
+
+        # Last update is funnel metadata, it is saved even when no counter changed
+        if funnel_data.get(PROP_LAST_UPDATE) != last_update:
+            self._add_update(funnel_id)
+
+    def load_pending_counters_results(self, funnel_data: dict, pending_range: list, all_dates: DayRange,
+                                      all_counters: list):
+        """
+        Merge counters of pending range, last update does not move,
+        range is done when all of its days were loaded, otherwise it is loaded again on next update
+        """
+        funnel_id = funnel_data.get(PROP_ID)
+        funnel_hash = funnel_data.get(PROP_FUNNEL_HASH)
+
+        changed_counters = self.merge_funnel_counters(funnel_data, all_dates, all_counters, None)
+
+        self.add_changed_counters(funnel_id, all_counters, changed_counters)
+        self._refresh_outdated_funnel(funnel_data, funnel_hash)
+
+        if all(counters is not None for counters in all_counters):
+            pending = funnel_data[PROP_PENDING]
+            pending.remove(pending_range)
+
+            if len(pending) == 0:
+                del funnel_data[PROP_PENDING]
+
+            _LOGGER.info(f"Funnel {funnel_data.get(PROP_NAME)} ({funnel_id}) loaded pending days "
+                         f"{pending_range[0]} - {pending_range[1]}")
+
+            self._add_update(funnel_id)
+
+    def _refresh_outdated_funnel(self, funnel_data: dict, funnel_hash: Optional[str]):
+        """
+        Funnel hash was cleared by the merge (counters of unknown steps), funnels are refreshed on next update
+        and the cleared hash is saved, so the details are loaded again even after restart
+        """
+        if funnel_hash is not None and PROP_FUNNEL_HASH not in funnel_data:
+            self._funnels_refreshed = 0
+
+            self._add_update(funnel_data.get(PROP_ID))
+
+    def add_changed_counters(self, funnel_id, all_counters: list, changed_counters: list):
+        funnel_key = str(funnel_id)
+        site_key = str(self._site_id)
+
+        DAYS_LOADED.labels(site_key).inc(len([counters for counters in all_counters if counters is not None]))
+        COUNTERS_CHANGED.labels(site_key).inc(len(changed_counters))
+
+        with self._changes_lock:
+            for step_key, date_iso in changed_counters:
+                self._changed_counters.add((funnel_key, step_key, date_iso))
+
+        if len(changed_counters) > 0:
+            self._add_update(funnel_id)
+
+    def _add_update(self, funnel_id):
+        """
+        Funnel was created or changed, funnels are updated concurrently
+        """
+        with self._changes_lock:
+            if funnel_id not in self._updates:
+                self._updates.append(funnel_id)
+
+    def get_funnel_counters(self, funnel_id, all_dates: DayRange) -> list:
+        """
+        Get funnel counters per day, when executor is available, requests are performed concurrently
+
+        :param funnel_id: funnel id
+        :param all_dates: DayRange of the days
+        :return: list of funnel counters (None for failed days), same order as all_dates
+        """
+        result = [None] * len(all_dates)
+        ranges = self.get_initial_ranges(all_dates)
+        step_keys = list(self.get_funnel_data(funnel_id)[PROP_STEPS].keys())
+
+        while len(ranges) > 0:
+            requests = [(funnel_id, all_dates.get_from_time(first), all_dates.get_to_time(last - 1))
+                        for first, last in ranges]
+
+            if self._executor is None:
+                responses = [self._get_funnel_counters_for_range(*request) for request in requests]
+
+            else:
+                futures = [self._executor.submit(self._get_funnel_counters_for_range, *request) for request in requests]
+
+                responses = [future.result() for future in futures]
+
+            ranges = self.load_ranges_results(ranges, responses, result, step_keys)
+
+        return result
+
+    async def async_get_funnel_counters(self, api: AsyncHotjarAPI, funnel_id, all_dates: DayRange) -> list:
+        """
+        Get funnel counters per day using the async API, see get_funnel_counters
+        """
+        result = [None] * len(all_dates)
+        ranges = self.get_initial_ranges(all_dates)
+        step_keys = list(self.get_funnel_data(funnel_id)[PROP_STEPS].keys())
+
+        while len(ranges) > 0:
+            requests = [(funnel_id, all_dates.get_from_time(first), all_dates.get_to_time(last - 1))
+                        for first, last in ranges]
+
+            responses = await asyncio.gather(*[self._async_get_funnel_counters_for_range(api, *request)
+                                               for request in requests])
+
+            ranges = self.load_ranges_results(ranges, responses, result, step_keys)
+
+        return result
+
+    def get_initial_ranges(self, all_dates: DayRange) -> list:
+        """
+        Ranges of days to request first, single days unless backfill of many days can be requested by ranges
+
+        :param all_dates: DayRange of the days
+        :return: list of (first, last) positions of days, last is exclusive
+        """
+        days = len(all_dates)
+
+        if self._backfill_strategy == BACKFILL_DAILY or days <= BACKFILL_RANGE_MIN_DAYS:
+            ranges = [(position, position + 1) for position in range(days)]
+
+        else:
+            ranges = [(position, min(position + BACKFILL_RANGE_DAYS, days))
+                      for position in range(0, days, BACKFILL_RANGE_DAYS)]
+
+        return ranges
+
+    @staticmethod
+    def load_ranges_results(ranges: list, responses: list, result: list, step_keys: list) -> list:
+        """
+        Set counters of days from ranges responses.
+        Range without visits at all sets zero counters to all of its days,
+        range with visits is split in half while enough ranges turn out empty,
+        otherwise (or when the range is small) it is split to single days.
+        Range response without counters of exactly the funnel's steps is treated as failed
+
+        :param ranges: list of (first, last) positions of days, last is exclusive
+        :param responses: funnel counters per range (None for failed ranges)
+        :param result: funnel counters per day to update
+        :param step_keys: keys of the funnel's steps
+        :return: ranges to request next
+        """
+        next_ranges = []
+        ranges_with_visits = []
+        empty_ranges = 0
+
+        for (first, last), response in zip(ranges, responses):
+            if last - first == 1:
+                result[first] = response
+
+            elif response is None:
+                # Failed range leaves its days as failed, they will be requested again on next update
+                continue
+
+            else:
+                visit_counts_per_step = response.get(PROP_VISIT_COUNTS_PER_STEP) or {}
+
+                if len(visit_counts_per_step) == 0 or set(visit_counts_per_step.keys()) != set(step_keys):
+                    _LOGGER.warning(f"Invalid counters of range {first}-{last}, steps: {list(visit_counts_per_step)}")
+
+                    continue
+
+                if all(visit_counts_per_step[key] == 0 for key in visit_counts_per_step):
+                    empty_ranges += 1
+
+                    for position in range(first, last):
+                        result[position] = {
+                            PROP_VISIT_COUNTS_PER_STEP: {key: 0 for key in visit_counts_per_step}
+                        }
 
-                if funnel_counters is None:
-                    _LOGGER.error(f"Could not load funnel {funnel_name} ({funnel_id}) counters for {date_iso} from API")
                 else:
-                    visit_counts_per_step = funnel_counters.get(PROP_VISIT_COUNTS_PER_STEP, {})
+                    ranges_with_visits.append((first, last))
+
+        # Splitting pays off only when halves are likely to be empty, dense funnels are requested per day
+        requested_ranges = empty_ranges + len(ranges_with_visits)
+        split_ranges = requested_ranges > 0 and empty_ranges / requested_ranges >= BACKFILL_RANGE_MIN_EMPTY_RATIO
+
+        for first, last in ranges_with_visits:
+            days = last - first
+
+            if split_ranges and days > BACKFILL_RANGE_MIN_DAYS:
+                middle = first + days // 2
+
+                next_ranges += [(first, middle), (middle, last)]
+
+            else:
+                next_ranges += [(position, position + 1) for position in range(first, last)]
 
-                    for key in visit_counts_per_step:
-                        step: dict = steps[key]
-                        counters = step[PROP_COUNTERS]
+        return next_ranges
 
-                        count = visit_counts_per_step[key]
+    def _get_funnel_counters_for_range(self, funnel_id, from_time: int, to_time: int):
+        funnel_counters = None
 
-                        if date_iso not in counters or counters[date_iso][PROP_COUNT] != count:
-                            counters[date_iso] = {
-                                PROP_EPOCH: date_query.from_time,
-                                PROP_COUNT: count
-                            }
+        try:
+            funnel_counters = self._api.get_site_funnel_counters(self._site_id, funnel_id, from_time, to_time,
+                                                                 settled=self.is_cache_settled(to_time))
+        except Exception as ex:
+            _LOGGER.error(f"Failed to load funnel {funnel_id} counters for {from_time}-{to_time}, Error: {ex}")
 
-                            changed = True
+        return funnel_counters
 
-        if changed and funnel_id not in self._updates:
-            self._updates.append(funnel_id)
+    async def _async_get_funnel_counters_for_range(self, api: AsyncHotjarAPI, funnel_id, from_time: int, to_time: int):
+        funnel_counters = None
+
+        try:
+            funnel_counters = await api.get_site_funnel_counters(self._site_id, funnel_id, from_time, to_time,
+                                                                 settled=self.is_cache_settled(to_time))
+        except Exception as ex:
+            _LOGGER.error(f"Failed to load funnel {funnel_id} counters for {from_time}-{to_time}, Error: {ex}")
+
+        return funnel_counters
+
+    @staticmethod
+    def merge_funnel_counters(funnel_data: dict, all_dates: DayRange, all_counters: list,
+                              open_from: Optional[int]) -> list:
+        """
+        Merge funnel counters into funnel's steps by date order,
+        last update moves forward only while all previous days were loaded successfully,
+        up to the first day that is still open for changes.
+        Day with counters of steps that are not in the funnel's details (details are outdated) is treated as failed
+        and the funnel hash is cleared, so the details are loaded again and the day is requested again
+
+        :param funnel_data: funnel data
+        :param all_dates: DayRange of the days
+        :param all_counters: list of funnel counters (None for failed days), same order as all_dates,
+        days treated as failed are set to None
+        :param open_from: start of the first day that is still open for changes (epoch), None - last update is kept
+        :return: changed counters, list of (step key, date iso)
+        """
+        changed = []
+        has_failures = False
+
+        funnel_id = funnel_data.get(PROP_ID)
+        funnel_name = funnel_data.get(PROP_NAME)
+        steps = funnel_data[PROP_STEPS]
+
+        for position, funnel_counters in enumerate(all_counters):
+            date_iso = all_dates.get_date_iso(position)
+            from_time = all_dates.get_from_time(position)
+
+            if funnel_counters is None:
+                _LOGGER.error(f"Could not load funnel {funnel_name} ({funnel_id}) counters for {date_iso} from API")
+
+                has_failures = True
+                continue
+
+            visit_counts_per_step = funnel_counters.get(PROP_VISIT_COUNTS_PER_STEP, {})
+            unknown_steps = [key for key in visit_counts_per_step if key not in steps]
+
+            if len(unknown_steps) > 0:
+                _LOGGER.warning(f"Funnel {funnel_name} ({funnel_id}) counters for {date_iso} "
+                                f"have unknown steps: {unknown_steps}, funnel details will be loaded again")
+
+                funnel_data.pop(PROP_FUNNEL_HASH, None)
+                all_counters[position] = None
+
+                has_failures = True
+                continue
+
+            if not has_failures and open_from is not None and from_time <= open_from:
+                funnel_data[PROP_LAST_UPDATE] = from_time
+                funnel_data[PROP_LAST_UPDATE_ISO] = date_iso
+
+            for key in visit_counts_per_step:
+                step: dict = steps[key]
+                counters: CounterSeries = step[PROP_COUNTERS]
+
+                count = visit_counts_per_step[key]
+
+                if counters.set(date_iso, from_time, count):
+                    changed.append((key, date_iso))
+
+        return changed
 
     @staticmethod
     def load_funnel_steps(steps, external_funnel_steps):
@@ -210,14 +887,21 @@ class SiteManager:
                     PROP_ID: step_id,
                     PROP_NAME: step_name,
                     PROP_URL: step_url,
-                    PROP_COUNTERS: {}
+                    PROP_COUNTERS: CounterSeries()
                 }
 
-                if step_key not in steps or steps[step_key] != step:
-                    steps[step_key] = step
+                steps[step_key] = step
+
+                _LOGGER.info(f"Funnel's step created: {step}")
+
+                changed = True
+
+            elif step.get(PROP_NAME) != step_name or step.get(PROP_URL) != step_url:
+                step[PROP_NAME] = step_name
+                step[PROP_URL] = step_url
 
-                    _LOGGER.info(f"Funnel's step changed: {step}")
+                _LOGGER.info(f"Funnel's step changed: {step}")
 
-                    changed = True
+                changed = True
 
         return changed
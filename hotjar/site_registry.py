@@ -0,0 +1,127 @@
+import threading
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from helpers.docker_logger import get_logger
+
+from .site_manager import SiteManager
+from .const import *
+
+_LOGGER = get_logger(__name__)
+
+
+class SiteRegistry(MutableMapping):
+    """
+    Site managers by site id, data of a site is loaded on first access and stays resident within the memory limit,
+    least recently accessed sites are unloaded first and reloaded from the storage on next access.
+
+    Sites that were not resident before an update are unloaded after it,
+    so update cycles do not push out the sites that are queried.
+    """
+    def __init__(self, memory_limit: int = DEFAULT_SITES_MEMORY_LIMIT):
+        """
+        :param memory_limit: estimated memory of resident sites data (bytes), 0 - unlimited
+        """
+        self._memory_limit = memory_limit
+
+        self._lock = threading.Lock()
+        self._site_managers = {}
+        self._resident = OrderedDict()
+
+        self._stats = {
+            "loads": 0,
+            "evictions": 0,
+        }
+
+    @property
+    def memory_limit(self) -> int:
+        return self._memory_limit
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            result = dict(self._stats)
+            result["sites"] = len(self._site_managers)
+            result["resident"] = len(self._resident)
+            result["memory"] = sum(self._resident.values())
+            result["memory_limit"] = self._memory_limit
+
+        return result
+
+    def touch(self, site_manager: SiteManager):
+        """
+        Site data was accessed, mark it as most recently used and unload least recently used sites over the limit
+
+        :param site_manager: site manager
+        """
+        site_id = site_manager.site_id
+
+        with self._lock:
+            if site_id not in self._resident:
+                self._stats["loads"] += 1
+
+            self._resident[site_id] = site_manager.memory_size
+            self._resident.move_to_end(site_id)
+
+            self._evict(site_id)
+
+    def complete_update(self, site_manager: SiteManager):
+        """
+        Site update ended, site that is not resident is unloaded when memory is limited
+
+        :param site_manager: site manager
+        """
+        site_id = site_manager.site_id
+
+        with self._lock:
+            if site_id in self._resident or self._memory_limit <= 0:
+                self._resident[site_id] = site_manager.memory_size
+
+                self._evict(site_id)
+
+            else:
+                site_manager.unload()
+
+    def _evict(self, keep_site_id):
+        if self._memory_limit <= 0:
+            return
+
+        memory = sum(self._resident.values())
+
+        for site_id in list(self._resident.keys()):
+            if memory <= self._memory_limit:
+                break
+
+            site_manager = self._site_managers.get(site_id)
+
+            if site_id == keep_site_id or site_manager is None or not site_manager.unload():
+                continue
+
+            memory -= self._resident.pop(site_id)
+
+            self._stats["evictions"] += 1
+
+            _LOGGER.debug(f"Site {site_manager.name} ({site_id}) evicted, Resident memory: {memory}")
+
+    def __getitem__(self, site_id) -> SiteManager:
+        return self._site_managers[site_id]
+
+    def __setitem__(self, site_id, site_manager: SiteManager):
+        with self._lock:
+            self._site_managers[site_id] = site_manager
+
+    def __delitem__(self, site_id):
+        with self._lock:
+            del self._site_managers[site_id]
+
+            self._resident.pop(site_id, None)
+
+    def __iter__(self):
+        return iter(list(self._site_managers.keys()))
+
+    def __len__(self) -> int:
+        return len(self._site_managers)
+
+    def __repr__(self):
+        return f"SiteRegistry(sites: {len(self._site_managers)}, resident: {len(self._resident)})"
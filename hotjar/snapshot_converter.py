@@ -0,0 +1,122 @@
+"""
+Converts site snapshots of JSON storage (including their journals) into another snapshot format,
+should not run while the sync process is running
+
+Usage (from the repository root):
+    python -m hotjar.snapshot_converter --data-dir /data/ --format binary
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+from helpers.atomic_file import write_atomic
+from helpers.docker_logger import get_logger
+
+from .const import *
+from .counter_series import export_counter_series
+from .snapshot_format import dump_snapshot, load_snapshot
+from .storage import JsonStorage
+
+_LOGGER = get_logger(__name__)
+
+
+def get_site_ids(data_dir: str) -> list:
+    """
+    Sites with snapshot or journal files of the current version in the data directory
+    """
+    extensions = "|".join(re.escape(extension) for extension in list(SNAPSHOT_EXTENSIONS.values()) + ["journal"])
+    pattern = re.compile(f"^site_(.+)_v{re.escape(VERSION)}\\.({extensions})$")
+
+    site_ids = set()
+
+    for file in os.listdir(data_dir or "."):
+        match = pattern.match(file)
+
+        if match is not None:
+            site_ids.add(match.group(1))
+
+    return sorted(site_ids)
+
+
+def verify_snapshot(site_id, data: dict, content: bytes):
+    """
+    Snapshot content must be loaded as the same site data, raises ValueError otherwise
+    """
+    expected = json.dumps(data, default=export_counter_series, sort_keys=True)
+    actual = json.dumps(load_snapshot(content), default=export_counter_series, sort_keys=True)
+
+    if actual != expected:
+        raise ValueError(f"Snapshot of site {site_id} does not match the converted data")
+
+
+def convert_snapshots(data_dir: str, snapshot_format: str) -> list:
+    """
+    Rewrite the snapshot of every site in the format, journals are replayed and removed,
+    previous snapshot and journal are removed only after the written snapshot is verified
+
+    :param data_dir: data directory
+    :param snapshot_format: json, json.gz or binary
+    :return: list of (site id, bytes before, bytes after, seconds)
+    """
+    storage = JsonStorage(data_dir, snapshot_format=snapshot_format)
+    result = []
+
+    for site_id in get_site_ids(data_dir):
+        files = storage.get_snapshot_files(site_id) + [storage.get_journal_file(site_id)]
+        size_before = sum(os.path.getsize(file) for file in files if os.path.exists(file))
+
+        started = time.perf_counter()
+
+        data = storage.load(site_id)
+        content = dump_snapshot(data, snapshot_format)
+        snapshot_file = storage.get_snapshot_file(site_id, snapshot_format)
+        is_new_file = not os.path.exists(snapshot_file)
+
+        # Snapshot of the same format is replaced in place, only by verified content
+        verify_snapshot(site_id, data, content)
+
+        write_atomic(snapshot_file, content)
+
+        try:
+            with open(snapshot_file, "rb") as file:
+                verify_snapshot(site_id, data, file.read())
+
+        except Exception:
+            # Most recent snapshot is loaded, unverified snapshot of new format must not hide the previous one
+            if is_new_file:
+                os.remove(snapshot_file)
+
+            raise
+
+        storage.remove_replaced_files(site_id, snapshot_file)
+
+        duration = time.perf_counter() - started
+
+        size_after = os.path.getsize(snapshot_file)
+
+        _LOGGER.info(f"Site {site_id} converted to {snapshot_format}, Size: {size_before} -> {size_after} bytes")
+
+        result.append((site_id, size_before, size_after, duration))
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converts site snapshots of JSON storage into another format")
+
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--format", default=SNAPSHOT_FORMAT_BINARY, choices=list(SNAPSHOT_EXTENSIONS.keys()))
+
+    arguments = parser.parse_args()
+
+    data_dir = os.path.join(arguments.data_dir, "")
+
+    for site_id, size_before, size_after, duration in convert_snapshots(data_dir, arguments.format):
+        print(f"site {site_id}: {size_before} -> {size_after} bytes ({duration:.3f}s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import sys
+import json
+import gzip
+import zlib
+import struct
+
+from array import array
+
+from .const import *
+from .counter_series import CounterSeries, export_counter_series
+
+SNAPSHOT_ARRAY_TYPES = ["i", "q", "q"]
+
+
+def dump_snapshot(data: dict, snapshot_format: str) -> bytes:
+    """
+    Serialize site data
+
+    :param data: site data, dictionary of funnel id and funnel data
+    :param snapshot_format: json, json.gz or binary
+    :return: content of the snapshot file
+    """
+    if snapshot_format == SNAPSHOT_FORMAT_BINARY:
+        return dump_binary_snapshot(data)
+
+    content = json.dumps(data, default=export_counter_series).encode("utf-8")
+
+    if snapshot_format == SNAPSHOT_FORMAT_JSON_GZIP:
+        content = gzip.compress(content, compresslevel=SNAPSHOT_COMPRESSION_LEVEL)
+
+    elif snapshot_format != SNAPSHOT_FORMAT_JSON:
+        raise ValueError(f"Invalid snapshot format: {snapshot_format}, "
+                         f"supported: {', '.join(SNAPSHOT_EXTENSIONS.keys())}")
+
+    return content
+
+
+def load_snapshot(content: bytes) -> dict:
+    """
+    Deserialize site data, format is detected from the content
+
+    :param content: content of the snapshot file
+    :return: site data, counters of binary snapshot are counter series, otherwise dictionaries
+    """
+    snapshot_format = detect_snapshot_format(content)
+
+    if snapshot_format == SNAPSHOT_FORMAT_BINARY:
+        return load_binary_snapshot(content)
+
+    if snapshot_format == SNAPSHOT_FORMAT_JSON_GZIP:
+        content = gzip.decompress(content)
+
+    return json.loads(content)
+
+
+def detect_snapshot_format(content: bytes) -> str:
+    if content.startswith(SNAPSHOT_BINARY_MAGIC):
+        return SNAPSHOT_FORMAT_BINARY
+
+    if content.startswith(SNAPSHOT_GZIP_MAGIC):
+        return SNAPSHOT_FORMAT_JSON_GZIP
+
+    return SNAPSHOT_FORMAT_JSON
+
+
+def dump_binary_snapshot(data: dict) -> bytes:
+    """
+    Binary snapshot: magic and compressed payload of header length, JSON header (funnels and steps,
+    counters replaced by their number of days) and the raw days, epochs and counts arrays of every step in order
+    """
+    funnels = {}
+    chunks = []
+
+    for funnel_key in data:
+        funnel_data = data[funnel_key]
+        steps = funnel_data[PROP_STEPS]
+        steps_meta = {}
+
+        for step_key in steps:
+            step = steps[step_key]
+            counters = step[PROP_COUNTERS]
+
+            if not isinstance(counters, CounterSeries):
+                counters = CounterSeries(counters)
+
+            steps_meta[step_key] = {key: len(counters) if key == PROP_COUNTERS else step[key] for key in step}
+
+            chunks += [counters.days.tobytes(), counters.epochs.tobytes(), counters.counts.tobytes()]
+
+        funnels[funnel_key] = {key: steps_meta if key == PROP_STEPS else funnel_data[key] for key in funnel_data}
+
+    header = {
+        "byteorder": sys.byteorder,
+        "itemsizes": [array(typecode).itemsize for typecode in SNAPSHOT_ARRAY_TYPES],
+        "funnels": funnels
+    }
+
+    header_content = json.dumps(header).encode("utf-8")
+    payload = b"".join([struct.pack("<I", len(header_content)), header_content, *chunks])
+
+    return SNAPSHOT_BINARY_MAGIC + zlib.compress(payload, SNAPSHOT_COMPRESSION_LEVEL)
+
+
+def load_binary_snapshot(content: bytes) -> dict:
+    payload = memoryview(zlib.decompress(memoryview(content)[len(SNAPSHOT_BINARY_MAGIC):]))
+
+    header_length = struct.unpack_from("<I", payload)[0]
+    header = json.loads(bytes(payload[4:4 + header_length]))
+
+    itemsizes = [array(typecode).itemsize for typecode in SNAPSHOT_ARRAY_TYPES]
+
+    if header.get("itemsizes") != itemsizes:
+        raise ValueError(f"Snapshot was written with array item sizes {header.get('itemsizes')}, "
+                         f"supported: {itemsizes}")
+
+    swap = header.get("byteorder") != sys.byteorder
+    offset = 4 + header_length
+    data = header["funnels"]
+
+    for funnel_key in data:
+        steps = data[funnel_key][PROP_STEPS]
+
+        for step_key in steps:
+            step = steps[step_key]
+            days_count = step[PROP_COUNTERS]
+            arrays = []
+
+            for typecode, itemsize in zip(SNAPSHOT_ARRAY_TYPES, itemsizes):
+                size = days_count * itemsize
+
+                values = array(typecode)
+                values.frombytes(payload[offset:offset + size])
+
+                if swap:
+                    values.byteswap()
+
+                arrays.append(values)
+                offset += size
+
+            step[PROP_COUNTERS] = CounterSeries.from_arrays(*arrays)
+
+    return data
@@ -0,0 +1,542 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+
+from abc import ABC, abstractmethod
+from os import path
+from typing import Optional
+
+from helpers.atomic_file import write_atomic, append_durable
+from helpers.docker_logger import get_logger
+
+from .const import *
+from .counter_series import CounterSeries
+from .migrations import get_version_key, migrate_site_data
+from .snapshot_format import dump_snapshot, load_snapshot
+
+_LOGGER = get_logger(__name__)
+
+
+class BaseStorage(ABC):
+    def __init__(self, data_dir: str, read_only: bool = False, snapshot_format: str = DEFAULT_SNAPSHOT_FORMAT):
+        """
+        :param data_dir: directory of the data files
+        :param read_only: data is only loaded (web workers), files written by the sync process are never changed
+        :param snapshot_format: format of written site snapshots (json, json.gz or binary), any format is loaded
+        """
+        if snapshot_format not in SNAPSHOT_EXTENSIONS:
+            raise ValueError(f"Invalid snapshot format: {snapshot_format}, "
+                             f"supported: {', '.join(SNAPSHOT_EXTENSIONS.keys())}")
+
+        self._data_dir = data_dir
+        self._read_only = read_only
+        self._snapshot_format = snapshot_format
+        self._previous_versions = None
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """
+        Storage type (json / sqlite)
+        """
+
+    @abstractmethod
+    def load(self, site_id) -> dict:
+        """
+        Load site data
+
+        :param site_id: site id
+        :return: site data, dictionary of funnel id and funnel data
+        """
+
+    @abstractmethod
+    def save(self, site_id, data: dict, funnel_ids: list, counters: set):
+        """
+        Save site data
+
+        :param site_id: site id
+        :param data: site data, dictionary of funnel id and funnel data
+        :param funnel_ids: ids of funnels that were created or changed
+        :param counters: changed counters, set of (funnel key, step key, date iso)
+        """
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def get_size(self) -> int:
+        """
+        Size of persisted data files (bytes)
+        """
+
+    def get_snapshot_file(self, site_id, snapshot_format: str = SNAPSHOT_FORMAT_JSON, version: str = VERSION) -> str:
+        return f"{self._data_dir}site_{site_id}_v{version}.{SNAPSHOT_EXTENSIONS[snapshot_format]}"
+
+    def get_journal_file(self, site_id, version: str = VERSION) -> str:
+        return f"{self._data_dir}site_{site_id}_v{version}.journal"
+
+    def get_snapshot_files(self, site_id, version: str = VERSION) -> list:
+        """
+        Existing snapshot files of the site (any format)
+        """
+        files = [self.get_snapshot_file(site_id, snapshot_format, version) for snapshot_format in SNAPSHOT_EXTENSIONS]
+
+        return [file for file in files if path.exists(file)]
+
+    def find_snapshot_file(self, site_id, version: str = VERSION) -> Optional[str]:
+        """
+        Snapshot file of the site, the most recently written one when the format was changed
+
+        :return: path of the file, None when the site has no snapshot
+        """
+        files = self.get_snapshot_files(site_id, version)
+
+        return max(files, key=path.getmtime) if len(files) > 0 else None
+
+    def load_snapshot_file(self, site_id, version: str = VERSION) -> dict:
+        data = {}
+        file = self.find_snapshot_file(site_id, version)
+
+        if file is not None:
+            with open(file, "rb") as snapshot_file:
+                try:
+                    data = load_snapshot(snapshot_file.read())
+
+                except Exception as ex:
+                    _LOGGER.error(f"Failed to load previous state, starting from day 1, Error: {ex}")
+
+        return data
+
+    def get_previous_versions(self) -> list:
+        """
+        Previous versions that left data files (site files or database) in the data directory
+
+        :return: list of versions, newest first
+        """
+        if self._previous_versions is None:
+            extensions = "|".join(re.escape(extension)
+                                  for extension in list(SNAPSHOT_EXTENSIONS.values()) + ["journal", "db"])
+            pattern = re.compile(f"^(?:site_.+|hotjar)_v(\\d+(?:\\.\\d+)*)\\.(?:{extensions})$")
+
+            current_key = get_version_key(VERSION)
+            versions = set()
+
+            for file in os.listdir(self._data_dir or "."):
+                match = pattern.match(file)
+
+                if match is not None and get_version_key(match.group(1)) < current_key:
+                    versions.add(match.group(1))
+
+            self._previous_versions = sorted(versions, key=get_version_key, reverse=True)
+
+        return self._previous_versions
+
+    def load_previous_version(self, site_id) -> dict:
+        """
+        Site data of the newest previous version that stored the site (site files, otherwise the database),
+        upgraded to the current version, files of previous versions are kept to allow a rollback
+
+        :param site_id: site id
+        :return: site data, empty when no previous version stored the site
+        """
+        for version in self.get_previous_versions():
+            try:
+                data = self.load_snapshot_file(site_id, version)
+
+                replay_journal(self.get_journal_file(site_id, version), data)
+
+                if len(data) == 0:
+                    data = load_sqlite_file(f"{self._data_dir}hotjar_v{version}.db", site_id)
+
+            except Exception as ex:
+                _LOGGER.warning(f"Failed to load site {site_id} of version {version}, Error: {ex}")
+                continue
+
+            if len(data) > 0:
+                _LOGGER.info(f"Migrating site {site_id} from version {version}")
+
+                return migrate_site_data(data, version)
+
+        return {}
+
+
+class JsonStorage(BaseStorage):
+    """
+    Stores the whole site data as single JSON file per site,
+    changes between snapshots are appended to a journal which is replayed on load,
+    snapshot is replaced atomically when the journal is compacted
+    """
+    def __init__(self, data_dir: str, read_only: bool = False, snapshot_format: str = DEFAULT_SNAPSHOT_FORMAT,
+                 journal_max_entries: int = JOURNAL_MAX_ENTRIES):
+        super().__init__(data_dir, read_only, snapshot_format)
+
+        self._journal_max_entries = journal_max_entries
+        self._journal_entries = {}
+
+    @property
+    def name(self) -> str:
+        return STORAGE_JSON
+
+    def load(self, site_id) -> dict:
+        data = self.load_snapshot_file(site_id)
+
+        if len(data) == 0 and not path.exists(self.get_journal_file(site_id)) and not self._read_only:
+            data = self.load_previous_version(site_id)
+
+            # Upgraded data is written once as the current version snapshot
+            if len(data) > 0:
+                self.compact(site_id, data)
+
+            self._journal_entries[site_id] = 0
+
+            return data
+
+        self._journal_entries[site_id] = self._replay_journal(site_id, data)
+
+        return data
+
+    def save(self, site_id, data: dict, funnel_ids: list, counters: set):
+        journal_entries = self._journal_entries.get(site_id, 0)
+        # Snapshot of another format is replaced on first save
+        has_snapshot = path.exists(self.get_snapshot_file(site_id, self._snapshot_format))
+
+        if not has_snapshot or journal_entries >= self._journal_max_entries:
+            self.compact(site_id, data)
+
+        else:
+            self._append_journal(site_id, data, funnel_ids, counters)
+
+            self._journal_entries[site_id] = journal_entries + 1
+
+    def get_size(self) -> int:
+        files = []
+
+        for site_id in self._journal_entries:
+            files += self.get_snapshot_files(site_id) + [self.get_journal_file(site_id)]
+
+        result = sum(path.getsize(file) for file in files if path.exists(file))
+
+        return result
+
+    def compact(self, site_id, data: dict):
+        """
+        Write full snapshot and drop the journal
+
+        :param site_id: site id
+        :param data: site data
+        """
+        snapshot_file = self.get_snapshot_file(site_id, self._snapshot_format)
+
+        write_atomic(snapshot_file, dump_snapshot(data, self._snapshot_format))
+
+        self.remove_replaced_files(site_id, snapshot_file)
+
+        _LOGGER.debug(f"Site {site_id} snapshot saved")
+
+    def remove_replaced_files(self, site_id, snapshot_file: str):
+        """
+        Remove snapshots of other formats and the journal, their data is in the snapshot file
+
+        :param site_id: site id
+        :param snapshot_file: snapshot file that replaced them
+        """
+        for file in self.get_snapshot_files(site_id):
+            if file != snapshot_file:
+                os.remove(file)
+
+        journal_file = self.get_journal_file(site_id)
+
+        if path.exists(journal_file):
+            os.remove(journal_file)
+
+        self._journal_entries[site_id] = 0
+
+    def _append_journal(self, site_id, data: dict, funnel_ids: list, counters: set):
+        funnels = {}
+
+        for funnel_id in funnel_ids:
+            funnel_key = str(funnel_id)
+            funnel_data = data[funnel_key]
+            steps = funnel_data[PROP_STEPS]
+
+            funnel_meta = {key: funnel_data[key] for key in funnel_data if key != PROP_STEPS}
+            funnel_meta[PROP_STEPS] = {step_key: {key: steps[step_key][key]
+                                                  for key in steps[step_key] if key != PROP_COUNTERS}
+                                       for step_key in steps}
+
+            funnels[funnel_key] = funnel_meta
+
+        counters_data = []
+
+        for funnel_key, step_key, date_iso in counters:
+            counter = data[funnel_key][PROP_STEPS][step_key][PROP_COUNTERS][date_iso]
+
+            counters_data.append([funnel_key, step_key, date_iso, counter[PROP_EPOCH], counter[PROP_COUNT]])
+
+        entry = {
+            JOURNAL_FUNNELS: funnels,
+            JOURNAL_COUNTERS: counters_data
+        }
+
+        append_durable(self.get_journal_file(site_id), json.dumps(entry))
+
+    def _replay_journal(self, site_id, data: dict) -> int:
+        entries, completed = replay_journal(self.get_journal_file(site_id), data)
+
+        if not completed:
+            # Last entry might be partial when the process stopped during the write,
+            # next save will compact the journal so new entries are not appended after it
+            _LOGGER.warning(f"Stopped replaying journal of site {site_id} at invalid entry #{entries + 1}")
+
+            entries = max(entries, self._journal_max_entries)
+
+        return entries
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Stores funnels, steps and daily counters as rows in SQLite database,
+    saving site data writes only created / changed rows in a single transaction
+    """
+    def __init__(self, data_dir: str, read_only: bool = False, snapshot_format: str = DEFAULT_SNAPSHOT_FORMAT):
+        super().__init__(data_dir, read_only, snapshot_format)
+
+        self._file = f"{self._data_dir}hotjar_v{VERSION}.db"
+        self._lock = threading.Lock()
+
+        if read_only:
+            self._connection = sqlite3.connect(f"file:{self._file}?mode=ro", uri=True, check_same_thread=False)
+
+            return
+
+        self._connection = sqlite3.connect(self._file, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+
+        with self._connection:
+            for statement in SQLITE_SCHEMA:
+                self._connection.execute(statement)
+
+    @property
+    def name(self) -> str:
+        return STORAGE_SQLITE
+
+    def load(self, site_id) -> dict:
+        with self._lock:
+            data = load_sqlite_site(self._connection, site_id)
+
+        if len(data) == 0 and not self._read_only:
+            data = self._import_site(site_id)
+
+        return data
+
+    def save(self, site_id, data: dict, funnel_ids: list, counters: set):
+        funnel_keys = [str(funnel_id) for funnel_id in funnel_ids]
+
+        funnels_rows = []
+        steps_rows = []
+        counters_rows = []
+
+        for funnel_key in funnel_keys:
+            funnel_data = data[funnel_key]
+            steps = funnel_data[PROP_STEPS]
+
+            funnel_meta = {key: funnel_data[key] for key in funnel_data if key != PROP_STEPS}
+            funnels_rows.append((site_id, funnel_key, json.dumps(funnel_meta)))
+
+            for position, step_key in enumerate(steps):
+                step = steps[step_key]
+                step_meta = {key: step[key] for key in step if key != PROP_COUNTERS}
+
+                steps_rows.append((site_id, funnel_key, step_key, position, json.dumps(step_meta)))
+
+        for funnel_key, step_key, date_iso in counters:
+            counter = data[funnel_key][PROP_STEPS][step_key][PROP_COUNTERS][date_iso]
+
+            counters_rows.append((site_id, funnel_key, step_key, date_iso, counter[PROP_EPOCH], counter[PROP_COUNT]))
+
+        with self._lock:
+            with self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO funnels (site_id, funnel_id, data) "
+                                             "VALUES (?, ?, ?)", funnels_rows)
+
+                self._connection.executemany("INSERT OR REPLACE INTO steps (site_id, funnel_id, step_id, position, data) "
+                                             "VALUES (?, ?, ?, ?, ?)", steps_rows)
+
+                self._connection.executemany("INSERT OR REPLACE INTO counters "
+                                             "(site_id, funnel_id, step_id, date, epoch, count) "
+                                             "VALUES (?, ?, ?, ?, ?, ?)", counters_rows)
+
+        _LOGGER.debug(f"Site {site_id} saved, Funnels: {len(funnels_rows)}, Counters: {len(counters_rows)}")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get_size(self) -> int:
+        files = [self._file, f"{self._file}-wal"]
+
+        result = sum(path.getsize(file) for file in files if path.exists(file))
+
+        return result
+
+    def _import_site(self, site_id) -> dict:
+        """
+        Import site from the JSON storage files, otherwise from a previous version
+        """
+        data = self.load_snapshot_file(site_id)
+
+        if len(data) > 0:
+            _LOGGER.info(f"Migrating site {site_id} from {self.find_snapshot_file(site_id)}")
+
+        else:
+            data = self.load_previous_version(site_id)
+
+        if len(data) > 0:
+            counters = set()
+
+            for funnel_key in data:
+                steps = data[funnel_key][PROP_STEPS]
+
+                for step_key in steps:
+                    for date_iso in steps[step_key][PROP_COUNTERS]:
+                        counters.add((funnel_key, step_key, date_iso))
+
+            self.save(site_id, data, list(data.keys()), counters)
+
+        return data
+
+
+def replay_journal(journal_file: str, data: dict) -> tuple:
+    """
+    Apply journal entries of JSON storage to site data
+
+    :param journal_file: path of the journal
+    :param data: site data loaded from the snapshot, updated in place
+    :return: number of replayed entries and whether all entries were valid
+    """
+    entries = 0
+
+    if not path.exists(journal_file):
+        return entries, True
+
+    with open(journal_file) as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                return entries, False
+
+            funnels = entry.get(JOURNAL_FUNNELS, {})
+
+            for funnel_key in funnels:
+                funnel_meta = funnels[funnel_key]
+                steps_meta = funnel_meta.pop(PROP_STEPS, {})
+
+                funnel_data = data.setdefault(funnel_key, {PROP_STEPS: {}})
+
+                # Entry has the whole funnel metadata, keys that were removed (pending ranges) are dropped
+                for key in [key for key in funnel_data if key != PROP_STEPS and key not in funnel_meta]:
+                    del funnel_data[key]
+
+                funnel_data.update(funnel_meta)
+
+                steps = funnel_data[PROP_STEPS]
+
+                for step_key in steps_meta:
+                    step = steps.setdefault(step_key, {PROP_COUNTERS: {}})
+                    step.update(steps_meta[step_key])
+
+            for funnel_key, step_key, date_iso, epoch, count in entry.get(JOURNAL_COUNTERS, []):
+                counters = data[funnel_key][PROP_STEPS][step_key][PROP_COUNTERS]
+
+                counters[date_iso] = {
+                    PROP_EPOCH: epoch,
+                    PROP_COUNT: count
+                }
+
+            entries += 1
+
+    _LOGGER.info(f"Replayed journal {journal_file}")
+
+    return entries, True
+
+
+def load_sqlite_site(connection: sqlite3.Connection, site_id) -> dict:
+    """
+    Load site data from SQLite storage database
+
+    :param connection: database connection, not used concurrently
+    :param site_id: site id
+    :return: site data, counters are counter series
+    """
+    data = {}
+
+    # Single read transaction, a save of another process between the queries is not seen partially
+    connection.execute("BEGIN")
+
+    try:
+        cursor = connection.execute("SELECT funnel_id, data FROM funnels WHERE site_id = ?", (site_id, ))
+
+        for funnel_key, funnel_json in cursor:
+            funnel_data = json.loads(funnel_json)
+            funnel_data[PROP_STEPS] = {}
+
+            data[funnel_key] = funnel_data
+
+        cursor = connection.execute("SELECT funnel_id, step_id, data FROM steps "
+                                    "WHERE site_id = ? ORDER BY funnel_id, position", (site_id, ))
+
+        for funnel_key, step_key, step_json in cursor:
+            step = json.loads(step_json)
+            step[PROP_COUNTERS] = CounterSeries()
+
+            data[funnel_key][PROP_STEPS][step_key] = step
+
+        cursor = connection.execute("SELECT funnel_id, step_id, date, epoch, count FROM counters "
+                                    "WHERE site_id = ? ORDER BY funnel_id, step_id, date", (site_id, ))
+
+        for funnel_key, step_key, date_iso, epoch, count in cursor:
+            counters: CounterSeries = data[funnel_key][PROP_STEPS][step_key][PROP_COUNTERS]
+
+            counters.set(date_iso, epoch, count)
+
+    finally:
+        connection.execute("COMMIT")
+
+    return data
+
+
+def load_sqlite_file(file: str, site_id) -> dict:
+    """
+    Load site data from SQLite storage database file (read only), empty when there is no such file
+    """
+    if not path.exists(file):
+        return {}
+
+    connection = sqlite3.connect(f"file:{file}?mode=ro", uri=True)
+
+    try:
+        return load_sqlite_site(connection, site_id)
+
+    finally:
+        connection.close()
+
+
+def create_storage(storage_type: str, data_dir: str, read_only: bool = False,
+                   snapshot_format: str = DEFAULT_SNAPSHOT_FORMAT) -> BaseStorage:
+    storage_types = {
+        STORAGE_JSON: JsonStorage,
+        STORAGE_SQLITE: SQLiteStorage,
+    }
+
+    storage_class = storage_types.get(storage_type)
+
+    if storage_class is None:
+        raise ValueError(f"Invalid storage type: {storage_type}, supported: {', '.join(storage_types.keys())}")
+
+    storage = storage_class(data_dir, read_only, snapshot_format)
+
+    return storage
@@ -1,18 +1,44 @@
 import os
+import time
 import asyncio
 import threading
 
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 import flask
 from flask import jsonify, abort, request
 
 from helpers.docker_logger import get_logger
-from helpers.queryable_datetime import QueryableDateTime
+from helpers.response_cache import ResponseCache
 from hotjar.api import HotjarAPI, VERSION
+from hotjar.async_api import AsyncHotjarAPI
+from hotjar.request_policy import RequestPolicy
+from hotjar.session_store import SessionStore
+from hotjar.api_cache import ApiCache
 from hotjar.site_manager import SiteManager
-from hotjar.const import DEFAULT_ENVIRONMENT
+from hotjar.site_registry import SiteRegistry
+from hotjar.scheduler import SiteScheduler
+from hotjar.storage import create_storage
+from hotjar.data_snapshot import DataSnapshot
+from hotjar.record_index import RecordIndex, RecordQuery, create_day_record
+from hotjar.funnel_stats import get_funnel_stats, get_period_functions
+from hotjar.metrics import HTTP_REQUEST_DURATION, get_metrics
+from hotjar.const import DEFAULT_ENVIRONMENT, DEFAULT_DATA_DIR, DEFAULT_MAX_IN_FLIGHT, DEFAULT_PARALLEL_SITES, \
+    DEFAULT_PARALLEL_FUNNELS, DEFAULT_STORAGE, DEFAULT_SETTLE_DAYS, DEFAULT_FUNNELS_REFRESH_INTERVAL, \
+    DEFAULT_BACKFILL_STRATEGY, DEFAULT_RATE_LIMIT, DEFAULT_MAX_RETRIES, DEFAULT_API_CACHE_SIZE, API_CACHE_FILE, \
+    DEFAULT_BASE_URL, GRANULARITY_DAY, MODE_SYNC, MODE_WEB, SNAPSHOT_CHECK_INTERVAL, DEFAULT_SITES_MEMORY_LIMIT, \
+    DEFAULT_SNAPSHOT_FORMAT
 
 SECONDS = 60
 
+STREAM_JSON = "json"
+STREAM_NDJSON = "ndjson"
+STREAM_BATCH_SIZE = 500
+MIMETYPE_NDJSON = "application/x-ndjson"
+
+QUERY_PARAMETERS = ["site_id", "funnel_id", "step_id", "from", "to", "fields", "limit", "cursor"]
+
 _LOGGER = get_logger(__name__)
 
 
@@ -25,112 +51,549 @@ class WebService:
         self._interval = None
         self._specific_funnels = None
         self._api_key = None
-
-        self._is_updating = False
+        self._max_in_flight = None
+        self._executor = None
+        self._funnel_executor = None
+        self._settle_days = None
+        self._funnels_refresh_interval = None
+        self._backfill_strategy = None
+        self._use_async = False
+        self._async_api = None
+        self._request_policy = None
+        self._api_cache = None
+        self._mode = MODE_SYNC
+        self._data_dir = None
+        self._snapshot = None
+        self._snapshot_checked = 0
+        self._snapshot_lock = threading.Lock()
+
+        self._scheduler = None
+        self._storage = None
         self._api = None
         self._web_service = None
-        self._site_managers = {}
-        self._loop = asyncio.get_event_loop()
+        self._sites_memory_limit = DEFAULT_SITES_MEMORY_LIMIT
+        self._site_managers = SiteRegistry()
+        self._response_cache = ResponseCache()
+        self._record_index = None
+        self._record_index_lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
         self._environment = DEFAULT_ENVIRONMENT
         self._web_server = web_server
 
-    def initialize(self):
+    @property
+    def web_server(self) -> flask.Flask:
+        return self._web_server
+
+    @property
+    def api(self) -> HotjarAPI:
+        return self._api
+
+    def initialize(self, mode: str = MODE_SYNC):
+        """
+        :param mode: sync - updates data from Hotjar and publishes it, web - serves data published by sync process
+        """
+        if mode not in [MODE_SYNC, MODE_WEB]:
+            raise ValueError(f"Invalid mode: {mode}, supported: {MODE_SYNC}, {MODE_WEB}")
+
+        self._mode = mode
         self._environment = os.getenv("ENVIRONMENT", DEFAULT_ENVIRONMENT)
-        self._username = os.getenv("HOTJAR_USERNAME")
-        self._password = os.getenv("HOTJAR_PASSWORD")
-        self._interval = int(os.getenv("HOTJAR_INTERVAL", 30)) * SECONDS
         self._api_key = os.getenv("API_KEY")
+        self._data_dir = DEFAULT_DATA_DIR if self._environment == DEFAULT_ENVIRONMENT else ""
+        self._snapshot = DataSnapshot(self._data_dir)
+        self._sites_memory_limit = int(os.getenv("HOTJAR_SITES_MEMORY_LIMIT", DEFAULT_SITES_MEMORY_LIMIT)) * 1024 * 1024
+        self._site_managers = SiteRegistry(self._sites_memory_limit)
 
-        specific_funnels = os.getenv("HOTJAR_FUNNELS", "")
+        if mode == MODE_SYNC:
+            self._initialize_sync()
+        else:
+            self.refresh_snapshot()
 
-        if len(specific_funnels) > 0:
-            self._specific_funnels = specific_funnels.split(",")
+        @self._web_server.before_request
+        def start_request_timer():
+            flask.g.request_started = time.perf_counter()
 
-        self._api = HotjarAPI(self._username, self._password)
-        self._api.initialize()
+            if self._mode == MODE_WEB:
+                self.refresh_snapshot()
 
-        @self._web_server.route('/', methods=['GET'])
-        def api_home():
-            self.verify_api_key()
+        @self._web_server.after_request
+        def observe_request(response):
+            started = flask.g.get("request_started")
 
-            flat_records = self.flatten()
-            flat_records_count = len(flat_records)
+            # Only known routes, by their rule to keep the labels bounded
+            if started is not None and request.url_rule is not None:
+                HTTP_REQUEST_DURATION.labels(request.url_rule.rule, str(response.status_code)).observe(
+                    time.perf_counter() - started)
 
-            site_records = self.aggregate()
-            site_records_count = len(site_records.keys())
+            return response
 
-            data = {
-                "version": VERSION,
-                "sites": site_records_count,
-                "records": flat_records_count
-            }
+        @self._web_server.route('/', methods=['GET'])
+        def api_home():
+            self.verify_api_key()
 
-            return jsonify(data)
+            return self.get_cached_response("home", self.get_summary)
 
         @self._web_server.route('/json', methods=['GET'])
         def api_json():
             self.verify_api_key()
 
-            data = self.aggregate()
+            query = self.get_record_query()
 
-            return jsonify(data)
+            if query is not None:
+                # Fields are fields of flat records, /json keeps the structure of sites, funnels and steps
+                if query.fields is not None:
+                    abort(400, "fields is supported by /flat only")
+
+                return self.get_query_response(query, lambda page: self.get_record_index().get_nested_records(page))
+
+            return self.get_cached_response("json", self.aggregate)
 
         @self._web_server.route('/flat', methods=['GET'])
         def api_flat():
             self.verify_api_key()
 
-            data = self.flatten()
+            query = self.get_record_query()
+
+            if query is not None:
+                return self.get_query_response(query,
+                                               lambda page: self.get_record_index().get_flat_records(query, page))
+
+            stream = request.args.get("stream")
+
+            if stream is None and request.accept_mimetypes.best == MIMETYPE_NDJSON:
+                stream = STREAM_NDJSON
+
+            if stream == STREAM_NDJSON:
+                records = self.iter_ndjson(self.iter_flat_records())
+
+                return flask.Response(flask.stream_with_context(records), mimetype=MIMETYPE_NDJSON)
+
+            if stream == STREAM_JSON:
+                records = self.iter_json_array(self.iter_flat_records())
+
+                return flask.Response(flask.stream_with_context(records), mimetype="application/json")
+
+            return self.get_cached_response("flat", self.flatten)
+
+        @self._web_server.route('/funnels/<funnel_id>/stats', methods=['GET'])
+        def api_funnel_stats(funnel_id):
+            self.verify_api_key()
+
+            site_id = request.args.get("site_id")
+            granularity = request.args.get("granularity", GRANULARITY_DAY)
+            date_from = request.args.get("from")
+            date_to = request.args.get("to")
+
+            try:
+                get_period_functions(granularity)
+
+                RecordQuery.validate_date(date_from, "from")
+                RecordQuery.validate_date(date_to, "to")
+
+            except ValueError as ex:
+                abort(400, str(ex))
+
+            site_manager = self.find_funnel_site(funnel_id, site_id)
+
+            if site_manager is None:
+                abort(404, f"Funnel {funnel_id} not found")
+
+            def get_data():
+                return self.get_funnel_stats(site_manager, funnel_id, granularity, date_from, date_to)
+
+            # Only whole range stats are cached, cached responses are bounded by funnels and granularities
+            if date_from is None and date_to is None:
+                return self.get_cached_response(f"stats:{site_manager.site_id}:{funnel_id}:{granularity}", get_data)
+
+            return self.get_response(get_data())
+
+        @self._web_server.route('/metrics', methods=['GET'])
+        def api_metrics():
+            self.verify_api_key()
+
+            body, content_type = get_metrics()
+
+            return flask.Response(body, content_type=content_type)
+
+        @self._web_server.route('/status', methods=['GET'])
+        def api_status():
+            self.verify_api_key()
+
+            if self._mode == MODE_WEB:
+                data = {
+                    "mode": self._mode,
+                    "generation": self._snapshot.generation,
+                    "registry": self._site_managers.stats
+                }
+
+                return jsonify(data)
+
+            data = self._scheduler.stats
+            data["mode"] = self._mode
+            data["generation"] = self._snapshot.generation
+            data["registry"] = self._site_managers.stats
+            data["requests"] = self._request_policy.stats
+            data["api_cache"] = None if self._api_cache is None else self._api_cache.stats
+            data["progress"] = {str(site_id): self._site_managers[site_id].progress for site_id in self._site_managers}
 
             return jsonify(data)
 
-        _LOGGER.info("First load might take few minutes")
+    def _initialize_sync(self):
+        self._username = os.getenv("HOTJAR_USERNAME")
+        self._password = os.getenv("HOTJAR_PASSWORD")
+        self._interval = int(os.getenv("HOTJAR_INTERVAL", 30)) * SECONDS
+        self._max_in_flight = int(os.getenv("HOTJAR_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT))
+        self._use_async = os.getenv("HOTJAR_ASYNC", "false").lower() == "true"
+        parallel_sites = int(os.getenv("HOTJAR_PARALLEL_SITES", DEFAULT_PARALLEL_SITES))
+        parallel_funnels = int(os.getenv("HOTJAR_PARALLEL_FUNNELS", DEFAULT_PARALLEL_FUNNELS))
+        self._settle_days = int(os.getenv("HOTJAR_SETTLE_DAYS", DEFAULT_SETTLE_DAYS))
+        self._funnels_refresh_interval = int(os.getenv("HOTJAR_FUNNELS_REFRESH_INTERVAL",
+                                                       DEFAULT_FUNNELS_REFRESH_INTERVAL / SECONDS)) * SECONDS
+        self._backfill_strategy = os.getenv("HOTJAR_BACKFILL_STRATEGY", DEFAULT_BACKFILL_STRATEGY)
+
+        self._scheduler = SiteScheduler(self._interval, parallel_sites)
+
+        if self._max_in_flight > 1 and not self._use_async:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_in_flight, thread_name_prefix="hotjar-api")
+
+        # Funnels of all sites share the pool, their days requests are limited by the API executor
+        if parallel_funnels > 1 and not self._use_async:
+            self._funnel_executor = ThreadPoolExecutor(max_workers=parallel_funnels,
+                                                       thread_name_prefix="hotjar-funnel")
+
+        specific_funnels = os.getenv("HOTJAR_FUNNELS", "")
+        data_dir = self._data_dir
+
+        self._storage = create_storage(os.getenv("HOTJAR_STORAGE", DEFAULT_STORAGE), data_dir,
+                                       snapshot_format=os.getenv("HOTJAR_SNAPSHOT_FORMAT", DEFAULT_SNAPSHOT_FORMAT))
+
+        if len(specific_funnels) > 0:
+            self._specific_funnels = specific_funnels.split(",")
+
+        rate_limit = float(os.getenv("HOTJAR_RATE_LIMIT", DEFAULT_RATE_LIMIT))
+        max_retries = int(os.getenv("HOTJAR_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+
+        self._request_policy = RequestPolicy(rate_limit, max_retries)
+
+        session_store = None
+
+        if os.getenv("HOTJAR_PERSIST_SESSION", "true").lower() == "true":
+            session_store = SessionStore(data_dir)
+
+        api_cache_size = int(os.getenv("HOTJAR_API_CACHE_SIZE", DEFAULT_API_CACHE_SIZE))
+
+        if api_cache_size > 0:
+            persist_api_cache = os.getenv("HOTJAR_API_CACHE_PERSIST", "true").lower() == "true"
+            api_cache_file = f"{data_dir}{API_CACHE_FILE}" if persist_api_cache else None
+
+            self._api_cache = ApiCache(api_cache_size, api_cache_file)
 
-        threading.Timer(0.1, self.update_data_once).start()
+        base_url = os.getenv("HOTJAR_BASE_URL", DEFAULT_BASE_URL)
+
+        self._api = HotjarAPI(self._username, self._password, self._request_policy, session_store, self._api_cache,
+                              base_url)
+
+        if self._use_async:
+            self._async_api = AsyncHotjarAPI(self._username, self._password, self._max_in_flight, self._max_in_flight,
+                                             self._request_policy, session_store, self._api_cache, base_url)
+        else:
+            self._api.initialize()
+
+    def start(self):
+        """
+        Start the update loop (sync mode only)
+        """
+        if self._mode == MODE_SYNC:
+            _LOGGER.info("First load might take few minutes")
+
+            threading.Timer(0.1, self.update_data_once).start()
+
+    def run(self):
+        """
+        Run with Flask development server, in sync mode the update loop runs in the same process
+        """
+        self.start()
 
         self._web_server.run(host='0.0.0.0')
 
+    def close(self):
+        if self._async_api is not None:
+            self._loop.run_until_complete(self._async_api.close())
+
+        if self._storage is not None:
+            self._storage.close()
+
     def verify_api_key(self):
         if self._api_key is not None and self._api_key != request.args.get("APIKEY"):
             abort(403, "Invalid credentials")
 
-    def update_data_once(self):
-        if self._is_updating:
-            _LOGGER.warning(f"Skipping update data")
+    def get_cached_response(self, key: str, get_data):
+        """
+        Response from cache (built once per data generation), 304 when client has the same version
+
+        :param key: cache key
+        :param get_data: function returning the data of the response
+        :return: response
+        """
+        cached_response = self._response_cache.get(key, lambda: flask.json.dumps(get_data(), separators=(",", ":")))
+
+        response = flask.Response(cached_response.body, mimetype="application/json")
+        response.set_etag(cached_response.etag)
+        response.headers["X-Data-Generation"] = str(cached_response.generation)
+
+        return response.make_conditional(request)
+
+    @staticmethod
+    def get_record_query():
+        """
+        Record query from request's query string parameters
 
+        :return: record query, None when request has no query parameters
+        """
+        args = request.args
+
+        if not any(key in args for key in QUERY_PARAMETERS):
+            return None
+
+        def get_set(key):
+            value = args.get(key)
+
+            return None if value is None else set(value.split(","))
 
         try:
-            self._is_updating = True
+            limit = args.get("limit")
+            limit = None if limit is None else int(limit)
+
+            if limit is not None and limit < 1:
+                raise ValueError(f"Invalid limit: {limit}")
+
+            fields = args.get("fields")
+
+            query = RecordQuery(site_ids=get_set("site_id"),
+                                funnel_ids=get_set("funnel_id"),
+                                step_ids=get_set("step_id"),
+                                date_from=args.get("from"),
+                                date_to=args.get("to"),
+                                fields=None if fields is None else fields.split(","),
+                                limit=limit,
+                                cursor=args.get("cursor"))
+
+            query.validate()
+
+        except ValueError as ex:
+            abort(400, str(ex))
+
+        return query
+
+    def get_record_index(self) -> RecordIndex:
+        """
+        Index of records, built once per data generation
+        """
+        generation = self._response_cache.generation
+        record_index = self._record_index
+
+        if record_index is None or record_index[0] != generation:
+            with self._record_index_lock:
+                record_index = self._record_index
 
-            _LOGGER.info("Updating data")
+                if record_index is None or record_index[0] != generation:
+                    site_managers = self._site_managers
+                    site_ids = {str(site_id): site_id for site_id in list(site_managers.keys())}
 
-            resources = self._api.get_resources()
+                    # Sites are loaded one by one, the index does not keep their data
+                    sites = ((site_id, site_managers[site_id].name, site_managers[site_id].data)
+                             for site_id in site_ids.values())
 
-            sites = resources.get("sites", [])
+                    record_index = (generation, RecordIndex(sites,
+                                                            lambda site_key: site_managers[site_ids[site_key]].data))
 
-            for site in sites:
-                site_name = site.get("name")
-                site_id = site.get("id")
-                created = site.get("created")
+                    self._record_index = record_index
 
-                site_manager = self._site_managers.get(site_id)
+        return record_index[1]
 
-                if site_manager is None:
-                    site_manager = SiteManager(self._api, site_id, site_name, created, self._specific_funnels,
-                                               self._environment)
+    def get_query_response(self, query: RecordQuery, get_data):
+        """
+        Response of a page of records matching the query
 
-                    self._site_managers[site_id] = site_manager
+        :param query: record query
+        :param get_data: function returning the data of the response from a page of records
+        :return: response
+        """
+        page, next_cursor = self.get_record_index().get_page(query)
 
-                if site_id is not None:
-                    _LOGGER.debug(f"Site: {site_name} ({site_id})")
+        response = self.get_response(get_data(page))
 
-                    site_manager.update()
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+        return response
+
+    @staticmethod
+    def get_response(data):
+        """
+        Response that is not cached, ETag is calculated from the body, 304 when client has the same version
+
+        :param data: data of the response
+        :return: response
+        """
+        response = flask.Response(flask.json.dumps(data, separators=(",", ":")), mimetype="application/json")
+
+        response.add_etag()
+
+        return response.make_conditional(request)
+
+    def update_data_once(self):
+        try:
+            self.run_update_cycle()
+
+        finally:
+            threading.Timer(self._scheduler.tick, self.update_data_once).start()
+
+    def run_update_cycle(self):
+        """
+        Single update cycle of the due sites, skipped when previous cycle is still running
+        """
+        if not self._scheduler.start_cycle():
+            _LOGGER.warning(f"Skipping update data, previous update is still running")
+
+            return
+
+        try:
+            if self._scheduler.is_due():
+                _LOGGER.info("Updating data")
+
+                if self._async_api is None:
+                    self._update_sites()
+                else:
+                    self._loop.run_until_complete(self._async_update_sites())
+
+                self._response_cache.invalidate()
+                self.publish_snapshot()
+
+                if self._api_cache is not None:
+                    self._api_cache.save()
         except Exception as ex:
             _LOGGER.error(f"Failed to update data, Error: {ex}")
 
         finally:
-            threading.Timer(self._interval, self.update_data_once).start()
+            self._scheduler.end_cycle()
+
+    def publish_snapshot(self):
+        """
+        Publish the sites saved by this update cycle, web workers reload them from the storage
+        """
+        sites = [{
+            "id": site_manager.site_id,
+            "name": site_manager.name,
+            "created": site_manager.created
+        } for site_manager in list(self._site_managers.values())]
+
+        self._snapshot.publish(self._storage.name, sites)
+
+    def refresh_snapshot(self):
+        """
+        Reload sites when sync process published new generation, checked at most every SNAPSHOT_CHECK_INTERVAL,
+        requests are served from the previous generation while a single request reloads it
+        """
+        now = time.monotonic()
+
+        if now - self._snapshot_checked < SNAPSHOT_CHECK_INTERVAL:
+            return
+
+        if not self._snapshot_lock.acquire(blocking=False):
+            return
+
+        try:
+            self._snapshot_checked = now
+
+            manifest = self._snapshot.get_changed()
+
+            if manifest is not None:
+                self._load_snapshot(manifest)
+
+        except Exception as ex:
+            _LOGGER.error(f"Failed to load published data, Error: {ex}")
+
+        finally:
+            self._snapshot_lock.release()
+
+    def _load_snapshot(self, manifest: dict):
+        storage_name = manifest.get("storage")
+
+        if self._storage is None or self._storage.name != storage_name:
+            if self._storage is not None:
+                self._storage.close()
+
+            self._storage = create_storage(storage_name, self._data_dir, read_only=True)
+
+        site_managers = SiteRegistry(self._sites_memory_limit)
+
+        for site in manifest.get("sites", []):
+            site_id = site.get("id")
+
+            site_managers[site_id] = SiteManager(None, site_id, site.get("name"), site.get("created"), None,
+                                                 self._storage, on_data_access=site_managers.touch)
+
+        # Replaced as a whole, requests in progress keep the previous generation
+        self._site_managers = site_managers
+
+        self._response_cache.invalidate(manifest.get("generation"))
+
+        _LOGGER.info(f"Loaded data generation {manifest.get('generation')}, Sites: {len(site_managers)}")
+
+    def _update_sites(self):
+        resources = self._api.get_resources()
+
+        site_managers = self._get_site_managers(resources)
+
+        def update(site_manager: SiteManager):
+            try:
+                site_manager.update()
+
+            finally:
+                self._site_managers.complete_update(site_manager)
+
+        self._scheduler.run_cycle(site_managers, update)
+
+    async def _async_update_sites(self):
+        resources = await self._async_api.get_resources()
+
+        site_managers = self._get_site_managers(resources)
+
+        async def update(site_manager: SiteManager):
+            try:
+                await site_manager.async_update(self._async_api)
 
-            self._is_updating = False
+            finally:
+                self._site_managers.complete_update(site_manager)
+
+        await self._scheduler.async_run_cycle(site_managers, update)
+
+    def _get_site_managers(self, resources) -> list:
+        result = []
+
+        sites = resources.get("sites", [])
+
+        for site in sites:
+            site_name = site.get("name")
+            site_id = site.get("id")
+            created = site.get("created")
+
+            site_manager = self._site_managers.get(site_id)
+
+            if site_manager is None:
+                site_manager = SiteManager(self._api, site_id, site_name, created, self._specific_funnels,
+                                           self._storage, self._executor, self._settle_days,
+                                           self._funnels_refresh_interval, self._backfill_strategy,
+                                           self._site_managers.touch, self._funnel_executor)
+
+                self._site_managers[site_id] = site_manager
+
+            if site_id is not None:
+                _LOGGER.debug(f"Site: {site_name} ({site_id})")
+
+                result.append(site_manager)
+
+        return result
 
     def aggregate(self):
         result = {}
@@ -141,62 +604,150 @@ class WebService:
             result[str(site_id)] = {
                 "id": site_id,
                 "name": site_manager.name,
-                "funnels": site_manager.data
+                "funnels": site_manager.export_data()
             }
 
         return result
 
+    def find_funnel_site(self, funnel_id: str, site_id: Optional[str]) -> Optional[SiteManager]:
+        """
+        Site of the funnel, sites without the funnel are not loaded
+
+        :param funnel_id: funnel id
+        :param site_id: site id, None - any site
+        :return: site manager, None when the funnel was not found
+        """
+        for site_key in list(self._site_managers.keys()):
+            if site_id is not None and str(site_key) != site_id:
+                continue
+
+            site_manager: SiteManager = self._site_managers[site_key]
+
+            if funnel_id in site_manager.funnel_keys:
+                return site_manager
+
+        return None
+
+    @staticmethod
+    def get_funnel_stats(site_manager: SiteManager, funnel_id: str, granularity: str, date_from, date_to) -> dict:
+        result = get_funnel_stats(site_manager.data[funnel_id], granularity, date_from, date_to)
+
+        result["site_id"] = site_manager.site_id
+        result["site_name"] = site_manager.name
+
+        return result
+
+    def get_summary(self):
+        sites_count = 0
+        records_count = 0
+
+        for site_id in list(self._site_managers.keys()):
+            site_manager: SiteManager = self._site_managers[site_id]
+
+            sites_count += 1
+            records_count += site_manager.records
+
+        data = {
+            "version": VERSION,
+            "sites": sites_count,
+            "records": records_count
+        }
+
+        return data
+
     def flatten(self):
-        data = self.aggregate()
-        result = []
+        result = list(self.iter_flat_records())
 
-        for site_id in data:
-            site_details = data[site_id]
-            site_name = site_details.get("name")
-            funnels = site_details.get("funnels", {})
+        return result
 
-            for funnel_id in funnels:
+    def iter_flat_records(self):
+        """
+        Generator of flat records, walks site managers data directly without building intermediate lists
+        """
+        for site_key in list(self._site_managers.keys()):
+            site_manager: SiteManager = self._site_managers[site_key]
+            site_id = str(site_key)
+            site_name = site_manager.name
+            funnels = site_manager.data
+
+            for funnel_id in list(funnels.keys()):
                 funnel_details = funnels[funnel_id]
-                funnel_name = funnel_details.get("name")
-                funnel_created = funnel_details.get("created")
                 funnel_steps = funnel_details.get("steps")
 
-                for funnel_step_id in funnel_steps:
+                for funnel_step_id in list(funnel_steps.keys()):
                     funnel_step = funnel_steps[funnel_step_id]
-                    funnel_step_name = funnel_step.get("name")
-                    funnel_step_url = funnel_step.get("url")
                     funnel_step_counters = funnel_step.get("counters")
 
-                    for date in funnel_step_counters:
-                        funnel_step_counter_data = funnel_step_counters[date]
-
-                        count = int(funnel_step_counter_data.get("count"))
-                        query_date = QueryableDateTime(funnel_step_counter_data.get("epoch"))
-
-                        funnel_step_data = {
-                            "site_id": site_id,
-                            "site_name": site_name,
-                            "funnel_id": funnel_id,
-                            "funnel_name": funnel_name,
-                            "funnel_created": funnel_created,
-                            "funnel_step_id": funnel_step_id,
-                            "funnel_step_name": funnel_step_name,
-                            "funnel_step_url": funnel_step_url,
-                            "date": query_date.date,
-                            "date_iso": date,
-                            "date_epoch": query_date.from_time,
-                            "count": count
-                        }
-
-                        result.append(funnel_step_data)
+                    for date_iso, epoch, count in funnel_step_counters.iter_counters():
+                        yield create_day_record(site_id, site_name, funnel_id, funnel_details, funnel_step_id,
+                                                funnel_step, date_iso, epoch, count)
+
+    @staticmethod
+    def iter_json_array(records):
+        """
+        Chunks of JSON array, records are serialized in batches
+        """
+        separator = "["
+        batch = []
+
+        for record in records:
+            batch.append(flask.json.dumps(record, separators=(",", ":")))
+
+            if len(batch) == STREAM_BATCH_SIZE:
+                yield f"{separator}{','.join(batch)}"
+
+                separator = ","
+                batch = []
+
+        if len(batch) > 0:
+            yield f"{separator}{','.join(batch)}"
+
+            separator = ","
+
+        yield "[]" if separator == "[" else "]"
+
+    @staticmethod
+    def iter_ndjson(records):
+        """
+        Chunks of newline delimited JSON, records are serialized in batches
+        """
+        batch = []
+
+        for record in records:
+            batch.append(f"{flask.json.dumps(record, separators=(',', ':'))}\n")
+
+            if len(batch) == STREAM_BATCH_SIZE:
+                yield "".join(batch)
+
+                batch = []
+
+        if len(batch) > 0:
+            yield "".join(batch)
+
+
+def create_web_service(mode: str = MODE_SYNC) -> WebService:
+    web_server = flask.Flask(__name__)
+    web_server.config["DEBUG"] = False
+
+    web_service = WebService(web_server)
+    web_service.initialize(mode)
+
+    return web_service
 
-        return result
 
+def create_app(mode: str = MODE_WEB) -> flask.Flask:
+    """
+    App factory for WSGI servers (e.g. gunicorn -w 4 'index:create_app()'),
+    workers serve the data published by the sync process (python index.py) and never sync with Hotjar
 
-_web_server = flask.Flask(__name__)
-_web_server.config["DEBUG"] = False
+    :param mode: web (default) or sync, sync mode must run in a single worker
+    """
+    web_service = create_web_service(mode)
+    web_service.start()
 
-web = WebService(_web_server)
-web.initialize()
+    return web_service.web_server
 
 
+if __name__ == "__main__":
+    web = create_web_service(os.getenv("HOTJAR_MODE", MODE_SYNC))
+    web.run()
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from hotjar.api import HotjarAPI
+from hotjar.async_api import AsyncHotjarAPI
+from hotjar.base_api import BaseHotjarAPI
+from hotjar.const import *
+from hotjar.request_policy import RequestPolicy
+
+# Nothing listens on the port, login fails immediately
+UNAVAILABLE_URL = "http://127.0.0.1:9"
+
+
+def test_resources_are_not_requested_without_login():
+    requested = []
+
+    class Api(HotjarAPI):
+        def api_get(self, url, *args, **kwargs):
+            requested.append(url)
+
+    api = Api("user@example.com", "password", RequestPolicy(max_retries=0), base_url=UNAVAILABLE_URL)
+
+    assert api.get_resources() is None
+    assert requested == []
+
+
+def test_async_resources_are_not_requested_without_login():
+    requested = []
+
+    class Api(AsyncHotjarAPI):
+        async def api_get(self, url, *args, **kwargs):
+            requested.append(url)
+
+    async def get_resources():
+        api = Api("user@example.com", "password", policy=RequestPolicy(max_retries=0), base_url=UNAVAILABLE_URL)
+
+        try:
+            return await api.get_resources()
+
+        finally:
+            await api.close()
+
+    assert asyncio.run(get_resources()) is None
+    assert requested == []
+
+
+@pytest.mark.parametrize("count, limit, pages", [
+    (25, None, [(0, 10), (10, 10), (20, 5)]),
+    (25, 12, [(0, 10), (10, 2)]),
+    (5, 100, [(0, 5)]),
+    (0, 100, []),
+])
+def test_feedbacks_pages(count, limit, pages):
+    assert BaseHotjarAPI._get_feedbacks_pages(count, limit, 10) == pages
+
+
+def test_feedbacks_count_param_of_page_and_count_requests():
+    page_params = BaseHotjarAPI._get_feedbacks_page_params("", 0, 10)
+    count_params = BaseHotjarAPI._get_feedbacks_count_params("")
+
+    assert page_params["count"] == count_params["count"] == "true"
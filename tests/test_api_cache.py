@@ -0,0 +1,54 @@
+import json
+
+from hotjar.const import *
+from hotjar.api_cache import ApiCache
+
+
+def test_permanent_entries_are_not_persisted(tmp_path):
+    file = str(tmp_path / API_CACHE_FILE)
+
+    cache = ApiCache(10, file)
+    cache.set("counters", "[]", CACHE_TTL_PERMANENT)
+    cache.save()
+
+    assert cache.get("counters").body == "[]"
+    assert not (tmp_path / API_CACHE_FILE).exists()
+
+    cache.set("funnel", "{}", 60, etag='"1"')
+    cache.save()
+
+    with open(file) as cache_file:
+        assert list(json.load(cache_file)) == ["funnel"]
+
+    restored = ApiCache(10, file)
+
+    assert restored.get("counters") is None
+    assert restored.get("funnel").body == "{}"
+
+
+def test_permanent_entries_of_older_versions_are_dropped(tmp_path):
+    file = tmp_path / API_CACHE_FILE
+    file.write_text(json.dumps({
+        "counters": ["[]", None, None, None],
+        "funnel": ["{}", 0, '"1"', None],
+    }))
+
+    cache = ApiCache(10, str(file))
+
+    assert cache.get("counters") is None
+    assert cache.get("funnel").validators == {"If-None-Match": '"1"'}
+
+    cache.save()
+
+    assert list(json.loads(file.read_text())) == ["funnel"]
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ApiCache(2)
+    cache.set("a", "1", 60)
+    cache.set("b", "2", 60)
+    cache.get("a")
+    cache.set("c", "3", CACHE_TTL_PERMANENT)
+
+    assert cache.get("b") is None
+    assert cache.stats["evicted"] == 1
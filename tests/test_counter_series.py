@@ -0,0 +1,52 @@
+import json
+
+from hotjar.const import *
+from hotjar.counter_series import CounterSeries, export_counter_series
+
+
+def test_set_and_get():
+    counters = CounterSeries()
+
+    assert counters.set("2024-01-03", 300, 3)
+    assert counters.set("2024-01-01", 100, 1)
+    assert counters.set("2024-01-02", 200, 2)
+    assert not counters.set("2024-01-02", 200, 2)
+    assert counters.set("2024-01-02", 200, 5)
+
+    assert list(counters) == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert counters["2024-01-02"] == {PROP_EPOCH: 200, PROP_COUNT: 5}
+    assert counters.get_count("2024-01-04") is None
+    assert "2024-01-04" not in counters
+    assert counters.get("2024-01-04") is None
+
+
+def test_delete():
+    counters = CounterSeries({
+        "2024-01-01": {PROP_EPOCH: 100, PROP_COUNT: 1},
+        "2024-01-02": {PROP_EPOCH: 200, PROP_COUNT: 2}
+    })
+
+    del counters["2024-01-01"]
+
+    assert list(counters) == ["2024-01-02"]
+    assert len(counters) == 1
+
+
+def test_sum_of_range():
+    counters = CounterSeries()
+
+    for day in range(1, 11):
+        counters.set(f"2024-01-{day:02d}", day * 100, day)
+
+    assert counters.sum() == 55
+    assert counters.sum("2024-01-03", "2024-01-05") == 12
+    assert counters.sum("2024-02-01") == 0
+
+
+def test_export():
+    source = {"2024-01-02": {PROP_EPOCH: 200, PROP_COUNT: 2}, "2024-01-01": {PROP_EPOCH: 100, PROP_COUNT: 1}}
+    counters = CounterSeries(source)
+
+    assert counters.to_dict() == source
+    assert list(counters.iter_counters()) == [("2024-01-01", 100, 1), ("2024-01-02", 200, 2)]
+    assert json.loads(json.dumps({"counters": counters}, default=export_counter_series)) == {"counters": source}
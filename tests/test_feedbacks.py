@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from hotjar.api import HotjarAPI
+from hotjar.async_api import AsyncHotjarAPI
+from hotjar.const import *
+from hotjar.exceptions import HotjarError
+
+
+class FeedbacksResponses:
+    """
+    Responses of the feedbacks endpoint, newest feedback first, offsets of failed pages respond None
+    """
+    def __init__(self, count: int, failed_offsets: tuple = (), count_fails: bool = False, received: int = 0):
+        """
+        :param received: feedbacks received after the first page was requested (shift the next pages)
+        """
+        self.feedbacks = [{PROP_ID: feedback_id} for feedback_id in range(count, 0, -1)]
+        self.failed_offsets = failed_offsets
+        self.count_fails = count_fails
+        self.received = received
+
+    def get(self, params: dict):
+        if params["amount"] == 0:
+            return None if self.count_fails else {"count": len(self.feedbacks)}
+
+        offset = params["offset"]
+
+        if offset in self.failed_offsets:
+            return None
+
+        page = self.feedbacks[offset:offset + params["amount"]]
+
+        if self.received > 0:
+            first_id = self.feedbacks[0][PROP_ID]
+
+            self.feedbacks = [{PROP_ID: first_id + index} for index in range(self.received, 0, -1)] + self.feedbacks
+            self.received = 0
+
+        return {"data": page}
+
+
+class StubApi(HotjarAPI):
+    def __init__(self, responses: FeedbacksResponses):
+        super().__init__("user@example.com", "password")
+
+        self.responses = responses
+
+    def api_get_by_endpoint(self, site_id, endpoint, query_data="", params=None, ttl=None, revalidate=False):
+        return self.responses.get(params)
+
+
+class StubAsyncApi(AsyncHotjarAPI):
+    def __init__(self, responses: FeedbacksResponses):
+        super().__init__("user@example.com", "password")
+
+        self.responses = responses
+
+    async def api_get_by_endpoint(self, site_id, endpoint, query_data="", params=None, ttl=None, revalidate=False):
+        return self.responses.get(params)
+
+
+def get_feedbacks(responses: FeedbacksResponses, use_async: bool, **kwargs) -> list:
+    if use_async:
+        async def get_async_feedbacks():
+            return await StubAsyncApi(responses).get_feedbacks(1, 2, "", **kwargs)
+
+        return asyncio.run(get_async_feedbacks())
+
+    return StubApi(responses).get_feedbacks(1, 2, "", **kwargs)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_all_pages(use_async):
+    feedbacks = get_feedbacks(FeedbacksResponses(25), use_async, limit=100, page_size=10)
+
+    assert [feedback[PROP_ID] for feedback in feedbacks] == list(range(25, 0, -1))
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_failed_page_fails_export(use_async):
+    with pytest.raises(HotjarError):
+        get_feedbacks(FeedbacksResponses(25, failed_offsets=(10,)), use_async, limit=100, page_size=10)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_failed_count_fails_export(use_async):
+    with pytest.raises(HotjarError):
+        get_feedbacks(FeedbacksResponses(25, count_fails=True), use_async, limit=100, page_size=10)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_limit(use_async):
+    feedbacks = get_feedbacks(FeedbacksResponses(25), use_async, limit=12, page_size=10)
+
+    assert [feedback[PROP_ID] for feedback in feedbacks] == list(range(25, 13, -1))
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_shifted_pages_are_not_duplicated(use_async):
+    feedbacks = get_feedbacks(FeedbacksResponses(25, received=2), use_async, limit=100, page_size=10, max_workers=0)
+
+    feedback_ids = [feedback[PROP_ID] for feedback in feedbacks]
+
+    assert len(feedback_ids) == len(set(feedback_ids))
+
+
+def test_iter_feedbacks_by_page():
+    pages = list(StubApi(FeedbacksResponses(25)).iter_feedbacks(1, 2, "", page_size=10, prefetch=2, by_page=True))
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+
+
+def test_async_iter_feedbacks_by_page():
+    async def get_pages():
+        api = StubAsyncApi(FeedbacksResponses(25))
+
+        return [page async for page in api.iter_feedbacks(1, 2, "", page_size=10, prefetch=2, by_page=True)]
+
+    assert [len(page) for page in asyncio.run(get_pages())] == [10, 10, 5]
@@ -0,0 +1,69 @@
+from datetime import date, datetime
+
+from hotjar.const import *
+from hotjar.migrations import add_missing_days, get_version_key, migrate_site_data
+
+
+def get_counters(days: list) -> dict:
+    return {f"2024-01-{day:02d}": {PROP_EPOCH: day, PROP_COUNT: day} for day in days}
+
+
+def get_funnel(steps: dict, last_update: str = "2024-01-10") -> dict:
+    funnel = {
+        PROP_ID: 1,
+        PROP_LAST_UPDATE: datetime.combine(date.fromisoformat(last_update), datetime.min.time()).timestamp(),
+        PROP_STEPS: {step_key: {PROP_COUNTERS: get_counters(days)} for step_key, days in steps.items()}
+    }
+
+    return funnel
+
+
+def test_version_key():
+    assert get_version_key("1.10") > get_version_key("1.9")
+
+
+def test_complete_steps_have_no_pending_ranges():
+    data = {"1": get_funnel({"1": range(1, 10), "2": range(1, 10)})}
+
+    add_missing_days(data)
+
+    assert PROP_PENDING not in data["1"]
+
+
+def test_missing_days_are_pending_ranges():
+    data = {"1": get_funnel({"1": range(1, 10), "2": [1, 4, 5, 9]})}
+
+    add_missing_days(data)
+
+    assert data["1"][PROP_PENDING] == [["2024-01-02", "2024-01-03"], ["2024-01-06", "2024-01-08"]]
+
+
+def test_days_from_last_update_are_not_pending():
+    data = {"1": get_funnel({"1": range(1, 10), "2": [1]}, last_update="2024-01-05")}
+
+    add_missing_days(data)
+
+    assert data["1"][PROP_PENDING] == [["2024-01-02", "2024-01-04"]]
+
+
+def test_invalid_funnels_and_counters_are_dropped():
+    data = {
+        "1": get_funnel({"1": [1, 2]}),
+        "2": {PROP_ID: 2},
+        "3": "invalid"
+    }
+
+    data["1"][PROP_STEPS]["1"][PROP_COUNTERS]["2024-01-03"] = {PROP_COUNT: 1}
+
+    add_missing_days(data)
+
+    assert list(data.keys()) == ["1"]
+    assert list(data["1"][PROP_STEPS]["1"][PROP_COUNTERS].keys()) == ["2024-01-01", "2024-01-02"]
+
+
+def test_migrate_skips_migrations_of_current_version():
+    data = {"1": get_funnel({"1": range(1, 10), "2": [1]})}
+
+    migrate_site_data(data, VERSION)
+
+    assert PROP_PENDING not in data["1"]
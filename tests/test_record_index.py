@@ -0,0 +1,98 @@
+import pytest
+
+from hotjar.const import *
+from hotjar.counter_series import CounterSeries
+from hotjar.record_index import RecordIndex, RecordQuery
+
+
+def get_funnels(funnel_keys: list, step_keys: list, days: list) -> dict:
+    counters = {f"2024-01-{day:02d}": {PROP_EPOCH: day, PROP_COUNT: day} for day in days}
+
+    funnels = {
+        funnel_key: {
+            PROP_ID: int(funnel_key),
+            PROP_NAME: f"Funnel {funnel_key}",
+            PROP_STEPS: {
+                step_key: {PROP_NAME: f"Step {step_key}", PROP_COUNTERS: CounterSeries(counters)}
+                for step_key in step_keys
+            }
+        } for funnel_key in funnel_keys
+    }
+
+    return funnels
+
+
+@pytest.fixture
+def sites() -> dict:
+    sites = {
+        "1": get_funnels(["10", "11"], ["100", "101"], [1, 2, 3]),
+        "2": get_funnels(["20"], ["200"], [2, 4])
+    }
+
+    return sites
+
+
+@pytest.fixture
+def record_index(sites) -> RecordIndex:
+    return RecordIndex([(site_key, f"Site {site_key}", sites[site_key]) for site_key in sites], sites.get)
+
+
+def get_records(record_index: RecordIndex, query: RecordQuery) -> list:
+    return [(*entry.key, date_iso) for entry, date_iso in record_index.query(query)]
+
+
+def test_query_order(record_index):
+    records = get_records(record_index, RecordQuery())
+
+    assert len(records) == 14
+    assert records == sorted(records)
+
+
+def test_query_filters(record_index):
+    query = RecordQuery(site_ids={"1"}, step_ids={"101"}, date_from="2024-01-02", date_to="2024-01-02")
+
+    assert get_records(record_index, query) == [("1", "10", "101", "2024-01-02"), ("1", "11", "101", "2024-01-02")]
+
+
+def test_cursor_pagination(record_index):
+    expected = get_records(record_index, RecordQuery(date_from="2024-01-02"))
+    records = []
+    cursor = None
+
+    while True:
+        query = RecordQuery(date_from="2024-01-02", limit=3, cursor=cursor)
+        page, cursor = record_index.get_page(query)
+
+        assert len(page) <= 3
+
+        records += [(*entry.key, date_iso) for entry, date_iso in page]
+
+        if cursor is None:
+            break
+
+    assert records == expected
+
+
+def test_last_page_has_no_cursor(record_index):
+    page, cursor = record_index.get_page(RecordQuery(limit=14))
+
+    assert len(page) == 14
+    assert cursor is None
+
+
+def test_flat_records(record_index):
+    query = RecordQuery(site_ids={"2"}, date_from="2024-01-04", fields=["site_name", "count"])
+    page, cursor = record_index.get_page(query)
+
+    assert record_index.get_flat_records(query, page) == [{"site_name": "Site 2", "count": 4}]
+
+
+@pytest.mark.parametrize("cursor", ["invalid", RecordQuery.encode_cursor(("1", "10", "100"), "2024-13-01")])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        RecordQuery(cursor=cursor).validate()
+
+
+def test_invalid_date():
+    with pytest.raises(ValueError):
+        RecordQuery(date_from="01/02/2024").validate()
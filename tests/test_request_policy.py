@@ -0,0 +1,81 @@
+import time
+
+from email.utils import formatdate
+
+from hotjar.const import *
+from hotjar.request_policy import RequestPolicy, TokenBucket, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert 0 < parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+
+
+def test_bucket_burst_and_rate():
+    bucket = TokenBucket(10, burst=2)
+
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert 0.05 < bucket.acquire() <= 0.1
+
+
+def test_unlimited_bucket():
+    bucket = TokenBucket(0)
+
+    assert all(bucket.acquire() == 0 for _ in range(100))
+
+
+def test_bucket_throttle_and_recover():
+    bucket = TokenBucket(10)
+
+    bucket.throttle(2)
+
+    assert bucket.rate == 10 * RATE_LIMIT_DECREASE
+    assert 1.5 < bucket.acquire() <= 2
+
+    bucket.recover()
+
+    assert bucket.rate == 10 * RATE_LIMIT_DECREASE + 10 * RATE_LIMIT_RECOVERY
+
+
+def test_backoff_is_bounded():
+    policy = RequestPolicy(rate=0, backoff_base=1, backoff_max=8)
+
+    assert all(0 <= policy.get_backoff(attempt) <= min(8, 2 ** attempt) for attempt in range(10) for _ in range(20))
+    assert policy.get_backoff(0, retry_after=5) >= 5
+    assert policy.get_backoff(0, retry_after=100) <= 8
+
+
+def test_response_actions():
+    policy = RequestPolicy(rate=0, max_retries=2)
+
+    assert policy.on_response(0, 401)[0] == REQUEST_ACTION_REAUTHENTICATE
+    assert policy.on_response(0, 500)[0] == REQUEST_ACTION_RETRY
+    assert policy.on_response(0, 404) == (REQUEST_ACTION_FAIL, 0.0)
+    assert policy.on_error(0)[0] == REQUEST_ACTION_RETRY
+    assert policy.on_login_failure(0)[0] == REQUEST_ACTION_REAUTHENTICATE
+
+    stats = policy.stats
+
+    assert (stats["reauthentications"], stats["server_errors"], stats["network_errors"]) == (1, 1, 1)
+    assert (stats["login_failures"], stats["failed"], stats["retries"]) == (1, 1, 4)
+
+
+def test_throttled_response_respects_retry_after():
+    policy = RequestPolicy(rate=10, max_retries=2)
+
+    action, delay = policy.on_response(0, HTTP_STATUS_TOO_MANY_REQUESTS, "3")
+
+    assert action == REQUEST_ACTION_RETRY
+    assert delay >= 3
+    assert policy.stats["throttled"] == 1
+    assert policy.stats["rate"] == 10 * RATE_LIMIT_DECREASE
+
+
+def test_last_attempt_fails():
+    policy = RequestPolicy(rate=0, max_retries=2)
+
+    assert policy.on_error(1)[0] == REQUEST_ACTION_RETRY
+    assert policy.on_error(2) == (REQUEST_ACTION_FAIL, 0.0)
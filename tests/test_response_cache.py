@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+import index
+
+from hotjar.const import *
+from helpers.response_cache import ResponseCache
+
+
+def test_response_is_built_once_per_generation():
+    cache = ResponseCache()
+    builds = []
+
+    def serialize():
+        builds.append(cache.generation)
+
+        return "{}"
+
+    first = cache.get("key", serialize)
+
+    assert cache.get("key", serialize) is first
+    assert builds == [0]
+
+    cache.invalidate()
+
+    assert cache.get("key", serialize).generation == 1
+    assert builds == [0, 1]
+
+    cache.invalidate(5)
+
+    assert cache.get("key", serialize).generation == 5
+
+
+def test_concurrent_requests_of_key_wait_for_single_build():
+    cache = ResponseCache()
+    started = threading.Event()
+    release = threading.Event()
+    builds = []
+
+    def serialize():
+        builds.append(1)
+        started.set()
+        release.wait(5)
+
+        return "{}"
+
+    threads = [threading.Thread(target=cache.get, args=("key", serialize)) for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+
+    started.wait(5)
+    release.set()
+
+    for thread in threads:
+        thread.join(5)
+
+    assert len(builds) == 1
+
+
+def test_build_of_key_does_not_block_other_keys():
+    cache = ResponseCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def serialize_slow():
+        started.set()
+        release.wait(5)
+
+        return "[]"
+
+    thread = threading.Thread(target=cache.get, args=("slow", serialize_slow))
+    thread.start()
+
+    started.wait(5)
+
+    try:
+        assert cache.get("fast", lambda: "{}").body == b"{}"
+        assert thread.is_alive()
+
+    finally:
+        release.set()
+        thread.join(5)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("ENVIRONMENT", "test")
+
+    web_service = index.create_web_service(MODE_WEB)
+
+    return web_service.web_server.test_client()
+
+
+@pytest.mark.parametrize("path", ["/", "/json", "/flat"])
+def test_not_modified_response(client, path):
+    response = client.get(path)
+    etag = response.headers["ETag"]
+
+    assert response.status_code == 200
+
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(path, headers={"If-None-Match": '"other"'}).status_code == 200
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import pytest
+
+from hotjar.scheduler import SiteScheduler
+
+
+class StubSite:
+    def __init__(self, site_id: int):
+        self.site_id = site_id
+        self.name = f"Site {site_id}"
+
+
+def test_cycles_do_not_overlap():
+    scheduler = SiteScheduler(60)
+
+    assert scheduler.start_cycle()
+    assert scheduler.is_running
+    assert not scheduler.start_cycle()
+
+    scheduler.end_cycle()
+
+    assert scheduler.start_cycle()
+    assert scheduler.stats["cycle"]["skipped"] == 1
+
+    scheduler.end_cycle()
+
+
+@pytest.mark.parametrize("max_parallel", [1, 4])
+def test_sites_are_updated_once_per_interval(max_parallel):
+    scheduler = SiteScheduler(60, max_parallel)
+    sites = [StubSite(site_id) for site_id in range(3)]
+    updated = []
+    lock = threading.Lock()
+
+    def update(site):
+        with lock:
+            updated.append(site.site_id)
+
+    assert scheduler.is_due()
+
+    scheduler.run_cycle(sites, update)
+
+    assert sorted(updated) == [0, 1, 2]
+    assert not scheduler.is_due()
+
+    # New site is due right away, known sites wait for their interval
+    scheduler.run_cycle(sites + [StubSite(3)], update)
+
+    assert sorted(updated) == [0, 1, 2, 3]
+
+
+def test_site_failure_does_not_stop_cycle():
+    scheduler = SiteScheduler(60)
+    sites = [StubSite(site_id) for site_id in range(3)]
+    updated = []
+
+    def update(site):
+        if site.site_id == 1:
+            raise ValueError("Failed")
+
+        updated.append(site.site_id)
+
+    scheduler.run_cycle(sites, update)
+
+    stats = scheduler.stats
+
+    assert updated == [0, 2]
+    assert stats["sites"]["1"]["last_error"] == "Failed"
+    assert stats["sites"]["0"]["last_error"] is None
+    assert stats["cycle"]["last_sites"] == 3
+
+
+def test_longest_waiting_site_is_first():
+    scheduler = SiteScheduler(60)
+    sites = [StubSite(site_id) for site_id in range(3)]
+
+    scheduler.run_cycle(sites, lambda site: None)
+
+    scheduler._next_due[2] = 0
+    scheduler._next_due[0] = 1
+
+    assert [site.site_id for site in scheduler.get_due_sites(sites)] == [2, 0]
+
+
+def test_async_cycle_limits_parallel_sites():
+    scheduler = SiteScheduler(60, max_parallel=2)
+    sites = [StubSite(site_id) for site_id in range(5)]
+    running = []
+    max_running = []
+
+    async def update(site):
+        running.append(site.site_id)
+        max_running.append(len(running))
+
+        await asyncio.sleep(0.01)
+
+        running.remove(site.site_id)
+
+    asyncio.run(scheduler.async_run_cycle(sites, update))
+
+    assert len(max_running) == 5
+    assert max(max_running) == 2
@@ -0,0 +1,181 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from hotjar.const import *
+from hotjar.site_manager import SiteManager
+from hotjar.storage import JsonStorage
+
+STEP_KEYS = ["1", "2"]
+
+
+def get_response(*counts) -> dict:
+    return {PROP_VISIT_COUNTS_PER_STEP: dict(zip(STEP_KEYS, counts))}
+
+
+def test_single_days_are_set():
+    result = [None] * 2
+    responses = [get_response(5, 1), None]
+
+    next_ranges = SiteManager.load_ranges_results([(0, 1), (1, 2)], responses, result, STEP_KEYS)
+
+    assert next_ranges == []
+    assert result == responses
+
+
+def test_empty_range_sets_zero_counters():
+    result = [None] * 8
+
+    next_ranges = SiteManager.load_ranges_results([(0, 8)], [get_response(0, 0)], result, STEP_KEYS)
+
+    assert next_ranges == []
+    assert result == [get_response(0, 0)] * 8
+
+
+def test_ranges_with_visits_are_split_when_others_are_empty():
+    result = [None] * 16
+
+    next_ranges = SiteManager.load_ranges_results([(0, 8), (8, 16)], [get_response(0, 0), get_response(3, 1)],
+                                                  result, STEP_KEYS)
+
+    assert next_ranges == [(8, 12), (12, 16)]
+    assert result[:8] == [get_response(0, 0)] * 8
+    assert result[8:] == [None] * 8
+
+
+def test_dense_ranges_are_requested_per_day():
+    result = [None] * 16
+
+    next_ranges = SiteManager.load_ranges_results([(0, 8), (8, 16)], [get_response(1, 0), get_response(3, 1)],
+                                                  result, STEP_KEYS)
+
+    assert next_ranges == [(position, position + 1) for position in range(16)]
+
+
+def test_invalid_ranges_are_failed():
+    result = [None] * 16
+    responses = [{PROP_VISIT_COUNTS_PER_STEP: {}}, {PROP_VISIT_COUNTS_PER_STEP: {"1": 0}}]
+
+    next_ranges = SiteManager.load_ranges_results([(0, 8), (8, 16)], responses, result, STEP_KEYS)
+
+    assert next_ranges == []
+    assert result == [None] * 16
+
+
+def test_failed_range_is_not_requested_again():
+    result = [None] * 8
+
+    assert SiteManager.load_ranges_results([(0, 8)], [None], result, STEP_KEYS) == []
+    assert result == [None] * 8
+
+
+class StubApi:
+    """
+    Hotjar API of funnels created 5 days ago
+    """
+    def __init__(self, funnel_ids: tuple = (1, )):
+        self.funnel_ids = funnel_ids
+        self.created = get_day_start(date.today() - timedelta(days=5))
+        self.steps = [{PROP_ID: 10, PROP_NAME: "Step 10", PROP_URL: "/10"}]
+        self.counts = {"10": 1}
+        self.failed_days = set()
+
+    def get_site_funnels(self, site_id: int) -> list:
+        return [{PROP_ID: funnel_id, PROP_NAME: "Funnel", PROP_CREATED_EPOCH_TIME: self.created}
+                for funnel_id in self.funnel_ids]
+
+    def get_site_funnel(self, site_id: int, funnel_id: int, revalidate: bool = False) -> dict:
+        return {PROP_ID: funnel_id, PROP_NAME: "Funnel", PROP_CREATED_EPOCH_TIME: self.created, PROP_STEPS: self.steps}
+
+    def get_site_funnel_counters(self, site_id: int, funnel_id: int, from_date: float, to_date: float,
+                                 settled: bool = False) -> dict:
+        if from_date in self.failed_days:
+            return None
+
+        return {PROP_VISIT_COUNTS_PER_STEP: self.counts}
+
+
+def get_day_start(day: date) -> int:
+    return int(datetime.combine(day, datetime.min.time()).timestamp())
+
+
+def create_site_manager(api: StubApi, tmp_path, **kwargs) -> SiteManager:
+    return SiteManager(api, 1, "Site", api.created, None, JsonStorage(f"{tmp_path}/"), **kwargs)
+
+
+@pytest.mark.parametrize("max_in_flight", [0, 4])
+def test_last_update_stops_at_failed_day(tmp_path, max_in_flight):
+    api = StubApi()
+    api.failed_days = {get_day_start(date.today() - timedelta(days=3))}
+
+    executor = ThreadPoolExecutor(max_in_flight) if max_in_flight > 0 else None
+    site_manager = create_site_manager(api, tmp_path, executor=executor)
+
+    site_manager.update()
+
+    funnel_data = site_manager.data["1"]
+
+    # Days after the failed day are loaded, last update stays before it so the failed day is requested again
+    assert len(funnel_data[PROP_STEPS]["10"][PROP_COUNTERS]) == 5
+    assert funnel_data[PROP_LAST_UPDATE] == get_day_start(date.today() - timedelta(days=4))
+
+    api.failed_days = set()
+
+    site_manager.update()
+
+    assert len(funnel_data[PROP_STEPS]["10"][PROP_COUNTERS]) == 6
+    assert funnel_data[PROP_LAST_UPDATE] == get_day_start(date.today())
+
+    if executor is not None:
+        executor.shutdown()
+
+
+def test_counters_of_unknown_steps_reload_funnel_details(tmp_path):
+    api = StubApi()
+    api.counts = {"10": 1, "11": 2}
+
+    site_manager = create_site_manager(api, tmp_path)
+
+    site_manager.update()
+
+    funnel_data = site_manager.data["1"]
+
+    assert len(funnel_data[PROP_STEPS]["10"][PROP_COUNTERS]) == 0
+    assert PROP_FUNNEL_HASH not in funnel_data
+    assert PROP_LAST_UPDATE not in funnel_data
+    assert site_manager.is_funnels_refresh_due()
+
+    api.steps = api.steps + [{PROP_ID: 11, PROP_NAME: "Step 11", PROP_URL: "/11"}]
+
+    site_manager.update()
+
+    steps = site_manager.data["1"][PROP_STEPS]
+
+    assert len(steps["10"][PROP_COUNTERS]) == len(steps["11"][PROP_COUNTERS]) == 6
+    assert PROP_FUNNEL_HASH in site_manager.data["1"]
+
+
+def test_parallel_funnels(tmp_path):
+    api = StubApi(funnel_ids=(5, 3, 8, 1, 7, 2))
+    executor = ThreadPoolExecutor(4)
+    funnel_executor = ThreadPoolExecutor(3)
+
+    site_manager = create_site_manager(api, tmp_path, executor=executor, funnel_executor=funnel_executor)
+
+    site_manager.update()
+
+    data = site_manager.data
+    progress = site_manager.progress
+
+    # Funnels are stored in the funnels list order regardless of which funnel completed first
+    assert list(data.keys()) == ["5", "3", "8", "1", "7", "2"]
+    assert all(len(data[funnel_key][PROP_STEPS]["10"][PROP_COUNTERS]) == 6 for funnel_key in data)
+    assert (progress["funnels"], progress["completed"], progress["running"]) == (6, 6, {})
+
+    site_manager.unload()
+
+    assert list(site_manager.data.keys()) == ["5", "3", "8", "1", "7", "2"]
+
+    executor.shutdown()
+    funnel_executor.shutdown()
@@ -0,0 +1,91 @@
+import os
+import json
+
+import pytest
+
+import hotjar.snapshot_converter as snapshot_converter
+
+from hotjar.const import *
+from hotjar.counter_series import export_counter_series
+from hotjar.snapshot_converter import convert_snapshots
+from hotjar.storage import JsonStorage
+
+SITE_ID = 1
+
+
+def get_site_data(count: int) -> dict:
+    counters = {"2024-01-01": {PROP_EPOCH: 1704067200, PROP_COUNT: count}}
+
+    return {"1": {PROP_ID: 1, PROP_NAME: "Funnel", PROP_STEPS: {"10": {PROP_NAME: "Step", PROP_COUNTERS: counters}}}}
+
+
+def create_site(data_dir: str) -> dict:
+    """
+    Site with JSON snapshot and a journal entry
+    """
+    storage = JsonStorage(data_dir)
+    storage.save(SITE_ID, get_site_data(1), ["1"], {("1", "10", "2024-01-01")})
+
+    data = get_site_data(2)
+    storage.save(SITE_ID, data, [], {("1", "10", "2024-01-01")})
+
+    return data
+
+
+def get_files(storage: JsonStorage) -> list:
+    files = storage.get_snapshot_files(SITE_ID) + [storage.get_journal_file(SITE_ID)]
+
+    return sorted(os.path.basename(file) for file in files if os.path.exists(file))
+
+
+def dump(data: dict) -> str:
+    return json.dumps(data, default=export_counter_series, sort_keys=True)
+
+
+def test_snapshot_and_journal_are_replaced(tmp_path):
+    data_dir = f"{tmp_path}/"
+    data = create_site(data_dir)
+    storage = JsonStorage(data_dir)
+
+    assert get_files(storage) == [f"site_{SITE_ID}_v{VERSION}.journal", f"site_{SITE_ID}_v{VERSION}.json"]
+
+    [(site_id, _, _, _)] = convert_snapshots(data_dir, SNAPSHOT_FORMAT_BINARY)
+
+    assert site_id == str(SITE_ID)
+    assert get_files(storage) == [f"site_{SITE_ID}_v{VERSION}.bin"]
+    assert dump(storage.load(SITE_ID)) == dump(data)
+
+
+@pytest.mark.parametrize("snapshot_format", [SNAPSHOT_FORMAT_JSON, SNAPSHOT_FORMAT_BINARY])
+def test_invalid_content_keeps_previous_files(tmp_path, monkeypatch, snapshot_format):
+    data_dir = f"{tmp_path}/"
+    data = create_site(data_dir)
+    storage = JsonStorage(data_dir)
+    files = get_files(storage)
+
+    monkeypatch.setattr(snapshot_converter, "dump_snapshot", lambda *args: json.dumps({}).encode("utf-8"))
+
+    with pytest.raises(ValueError):
+        convert_snapshots(data_dir, snapshot_format)
+
+    assert get_files(storage) == files
+    assert dump(storage.load(SITE_ID)) == dump(data)
+
+
+def test_invalid_written_file_keeps_previous_files(tmp_path, monkeypatch):
+    data_dir = f"{tmp_path}/"
+    data = create_site(data_dir)
+    storage = JsonStorage(data_dir)
+    files = get_files(storage)
+
+    def write_truncated(file: str, content: bytes):
+        with open(file, "wb") as snapshot_file:
+            snapshot_file.write(content[:len(content) // 2])
+
+    monkeypatch.setattr(snapshot_converter, "write_atomic", write_truncated)
+
+    with pytest.raises(Exception):
+        convert_snapshots(data_dir, SNAPSHOT_FORMAT_BINARY)
+
+    assert get_files(storage) == files
+    assert dump(storage.load(SITE_ID)) == dump(data)
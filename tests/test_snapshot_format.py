@@ -0,0 +1,122 @@
+import sys
+import json
+import zlib
+import struct
+
+from array import array
+
+import pytest
+
+from hotjar.const import *
+from hotjar.counter_series import CounterSeries
+from hotjar.snapshot_format import (SNAPSHOT_ARRAY_TYPES, dump_binary_snapshot, dump_snapshot, load_binary_snapshot,
+                                    load_snapshot)
+
+
+def get_site_data() -> dict:
+    counters = {
+        f"2024-01-{day:02d}": {PROP_EPOCH: 1704067200 + day * 86400, PROP_COUNT: day * 1000} for day in range(1, 6)
+    }
+
+    data = {
+        "1": {
+            PROP_ID: 1,
+            PROP_NAME: "Funnel",
+            PROP_STEPS: {
+                "10": {PROP_NAME: "Step", PROP_COUNTERS: CounterSeries(counters)},
+                "11": {PROP_NAME: "Empty step", PROP_COUNTERS: CounterSeries()}
+            }
+        }
+    }
+
+    return data
+
+
+def get_counters(data: dict) -> dict:
+    result = {
+        step_key: data["1"][PROP_STEPS][step_key][PROP_COUNTERS].to_dict() for step_key in data["1"][PROP_STEPS]
+    }
+
+    return result
+
+
+@pytest.mark.parametrize("snapshot_format", [SNAPSHOT_FORMAT_JSON, SNAPSHOT_FORMAT_JSON_GZIP, SNAPSHOT_FORMAT_BINARY])
+def test_round_trip(snapshot_format):
+    data = get_site_data()
+
+    loaded = load_snapshot(dump_snapshot(data, snapshot_format))
+
+    if snapshot_format == SNAPSHOT_FORMAT_BINARY:
+        assert isinstance(loaded["1"][PROP_STEPS]["10"][PROP_COUNTERS], CounterSeries)
+        assert get_counters(loaded) == get_counters(data)
+
+    else:
+        assert loaded["1"][PROP_STEPS]["10"][PROP_COUNTERS] == data["1"][PROP_STEPS]["10"][PROP_COUNTERS].to_dict()
+
+    assert loaded["1"][PROP_STEPS]["11"][PROP_NAME] == "Empty step"
+
+
+def test_binary_snapshot_of_dictionary_counters():
+    data = get_site_data()
+    data["1"][PROP_STEPS]["10"][PROP_COUNTERS] = data["1"][PROP_STEPS]["10"][PROP_COUNTERS].to_dict()
+
+    loaded = load_binary_snapshot(dump_binary_snapshot(data))
+
+    assert loaded["1"][PROP_STEPS]["10"][PROP_COUNTERS].to_dict() == data["1"][PROP_STEPS]["10"][PROP_COUNTERS]
+
+
+def swap_byte_order(content: bytes, byteorder: str) -> bytes:
+    """
+    Rewrite binary snapshot as written on a machine with another byte order
+    """
+    payload = zlib.decompress(content[len(SNAPSHOT_BINARY_MAGIC):])
+
+    header_length = struct.unpack_from("<I", payload)[0]
+    header = json.loads(payload[4:4 + header_length])
+    header["byteorder"] = byteorder
+
+    chunks = []
+    offset = 4 + header_length
+
+    for funnel_key in header["funnels"]:
+        steps = header["funnels"][funnel_key][PROP_STEPS]
+
+        for step_key in steps:
+            for typecode in SNAPSHOT_ARRAY_TYPES:
+                values = array(typecode)
+                size = steps[step_key][PROP_COUNTERS] * values.itemsize
+
+                values.frombytes(payload[offset:offset + size])
+                values.byteswap()
+
+                chunks.append(values.tobytes())
+                offset += size
+
+    header_content = json.dumps(header).encode("utf-8")
+    payload = b"".join([struct.pack("<I", len(header_content)), header_content, *chunks])
+
+    return SNAPSHOT_BINARY_MAGIC + zlib.compress(payload)
+
+
+def test_binary_snapshot_of_other_byte_order():
+    data = get_site_data()
+    other_byteorder = "big" if sys.byteorder == "little" else "little"
+
+    content = swap_byte_order(dump_binary_snapshot(data), other_byteorder)
+
+    assert get_counters(load_binary_snapshot(content)) == get_counters(data)
+
+
+def test_binary_snapshot_of_other_item_sizes():
+    content = dump_binary_snapshot(get_site_data())
+    payload = zlib.decompress(content[len(SNAPSHOT_BINARY_MAGIC):])
+
+    header_length = struct.unpack_from("<I", payload)[0]
+    header = json.loads(payload[4:4 + header_length])
+    header["itemsizes"] = [2, 4, 4]
+
+    header_content = json.dumps(header).encode("utf-8")
+    payload = struct.pack("<I", len(header_content)) + header_content + payload[4 + header_length:]
+
+    with pytest.raises(ValueError):
+        load_binary_snapshot(SNAPSHOT_BINARY_MAGIC + zlib.compress(payload))
@@ -0,0 +1,165 @@
+import json
+
+import pytest
+
+from hotjar.const import *
+from hotjar.counter_series import CounterSeries, export_counter_series
+from hotjar.storage import JsonStorage, SQLiteStorage, replay_journal
+
+
+def get_entry(funnel_meta: dict, counters: list) -> str:
+    entry = {
+        JOURNAL_FUNNELS: {"1": funnel_meta},
+        JOURNAL_COUNTERS: counters
+    }
+
+    return json.dumps(entry)
+
+
+def write_journal(tmp_path, lines: list) -> str:
+    journal_file = tmp_path / "journal.jsonl"
+    journal_file.write_text("".join(f"{line}\n" for line in lines))
+
+    return str(journal_file)
+
+
+def get_funnel_meta(**kwargs) -> dict:
+    funnel_meta = {PROP_ID: 1, PROP_NAME: "Funnel", PROP_STEPS: {"10": {PROP_NAME: "Step"}}}
+    funnel_meta.update(kwargs)
+
+    return funnel_meta
+
+
+def test_missing_journal(tmp_path):
+    data = {}
+
+    assert replay_journal(str(tmp_path / "missing.jsonl"), data) == (0, True)
+    assert data == {}
+
+
+def test_entries_are_applied_in_order(tmp_path):
+    journal_file = write_journal(tmp_path, [
+        get_entry(get_funnel_meta(), [["1", "10", "2024-01-01", 100, 1], ["1", "10", "2024-01-02", 200, 2]]),
+        get_entry(get_funnel_meta(), [["1", "10", "2024-01-02", 200, 5]])
+    ])
+
+    data = {}
+
+    assert replay_journal(journal_file, data) == (2, True)
+
+    counters = data["1"][PROP_STEPS]["10"][PROP_COUNTERS]
+
+    assert data["1"][PROP_NAME] == "Funnel"
+    assert data["1"][PROP_STEPS]["10"][PROP_NAME] == "Step"
+    assert counters == {"2024-01-01": {PROP_EPOCH: 100, PROP_COUNT: 1}, "2024-01-02": {PROP_EPOCH: 200, PROP_COUNT: 5}}
+
+
+def test_removed_funnel_metadata_is_dropped(tmp_path):
+    journal_file = write_journal(tmp_path, [
+        get_entry(get_funnel_meta(**{PROP_PENDING: [["2024-01-01", "2024-01-02"]]}), []),
+        get_entry(get_funnel_meta(), [])
+    ])
+
+    data = {}
+
+    replay_journal(journal_file, data)
+
+    assert PROP_PENDING not in data["1"]
+
+
+def test_partial_last_line_stops_replay(tmp_path):
+    complete_entry = get_entry(get_funnel_meta(), [["1", "10", "2024-01-01", 100, 1]])
+    partial_entry = get_entry(get_funnel_meta(), [["1", "10", "2024-01-01", 100, 7]])
+
+    journal_file = write_journal(tmp_path, [complete_entry, partial_entry[:len(partial_entry) // 2]])
+
+    data = {}
+
+    assert replay_journal(journal_file, data) == (1, False)
+    assert data["1"][PROP_STEPS]["10"][PROP_COUNTERS]["2024-01-01"][PROP_COUNT] == 1
+
+
+def get_site_data() -> dict:
+    data = {
+        "1": {
+            PROP_ID: 1,
+            PROP_NAME: "Funnel",
+            PROP_STEPS: {
+                step_key: {
+                    PROP_ID: int(step_key),
+                    PROP_NAME: f"Step {step_key}",
+                    PROP_COUNTERS: CounterSeries({
+                        f"2024-01-{day:02d}": {PROP_EPOCH: day, PROP_COUNT: day} for day in range(1, 4)
+                    })
+                } for step_key in ["12", "10", "11"]
+            }
+        }
+    }
+
+    return data
+
+
+def get_all_counters(data: dict) -> set:
+    counters = {(funnel_key, step_key, date_iso)
+                for funnel_key in data
+                for step_key in data[funnel_key][PROP_STEPS]
+                for date_iso in data[funnel_key][PROP_STEPS][step_key][PROP_COUNTERS]}
+
+    return counters
+
+
+def export_data(data: dict) -> dict:
+    return json.loads(json.dumps(data, default=export_counter_series))
+
+
+@pytest.mark.parametrize("storage_class", [JsonStorage, SQLiteStorage])
+def test_save_and_load(tmp_path, storage_class):
+    data = get_site_data()
+
+    storage = storage_class(f"{tmp_path}/")
+    storage.load(100)
+    storage.save(100, data, ["1"], get_all_counters(data))
+
+    # Only changed counters and funnel metadata are written by the next saves
+    data["1"][PROP_STEPS]["10"][PROP_COUNTERS].set("2024-01-02", 2, 20)
+    data["1"][PROP_PENDING] = [["2024-01-01", "2024-01-01"]]
+
+    storage.save(100, data, ["1"], {("1", "10", "2024-01-02")})
+
+    del data["1"][PROP_PENDING]
+
+    storage.save(100, data, ["1"], set())
+    storage.close()
+
+    storage = storage_class(f"{tmp_path}/")
+    loaded = storage.load(100)
+
+    assert export_data(loaded) == export_data(data)
+    assert list(loaded["1"][PROP_STEPS].keys()) == ["12", "10", "11"]
+    assert storage.load(101) == {}
+    assert storage.get_size() > 0
+
+    storage.close()
+
+
+def test_sqlite_storage_imports_json_storage_files(tmp_path):
+    data = get_site_data()
+
+    storage = JsonStorage(f"{tmp_path}/")
+    storage.load(100)
+    storage.save(100, data, ["1"], get_all_counters(data))
+
+    storage = SQLiteStorage(f"{tmp_path}/")
+
+    assert export_data(storage.load(100)) == export_data(data)
+
+    storage.close()
+
+    # Imported once, the database is used from now on
+    (tmp_path / f"site_100_v{VERSION}.json").unlink()
+
+    storage = SQLiteStorage(f"{tmp_path}/")
+
+    assert export_data(storage.load(100)) == export_data(data)
+
+    storage.close()
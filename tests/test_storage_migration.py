@@ -0,0 +1,51 @@
+import json
+
+from datetime import datetime
+
+import pytest
+
+from hotjar.const import *
+from hotjar.storage import JsonStorage, SQLiteStorage
+
+
+def write_v1_2_site(data_dir, site_id: int):
+    """
+    Site file of version 1.2, counters of the second step (added to the funnel later) start on the 4th day
+    """
+    counters = {f"2024-01-{day:02d}": {PROP_EPOCH: day, PROP_COUNT: day} for day in range(1, 8)}
+
+    data = {
+        "1": {
+            PROP_ID: 1,
+            PROP_NAME: "Funnel",
+            PROP_LAST_UPDATE: datetime(2024, 1, 8).timestamp(),
+            PROP_LAST_UPDATE_ISO: "2024-01-08",
+            PROP_STEPS: {
+                "10": {PROP_ID: 10, PROP_NAME: "Step 10", PROP_COUNTERS: counters},
+                "11": {PROP_ID: 11, PROP_NAME: "Step 11",
+                       PROP_COUNTERS: {date_iso: counters[date_iso] for date_iso in list(counters)[3:]}}
+            }
+        }
+    }
+
+    (data_dir / f"site_{site_id}_v1.2.json").write_text(json.dumps(data))
+
+
+@pytest.mark.parametrize("storage_class", [JsonStorage, SQLiteStorage])
+def test_version_1_2_data_is_upgraded(tmp_path, storage_class):
+    write_v1_2_site(tmp_path, 100)
+
+    storage = storage_class(f"{tmp_path}/")
+    data = storage.load(100)
+    storage.close()
+
+    assert data["1"][PROP_PENDING] == [["2024-01-01", "2024-01-03"]]
+    assert len(data["1"][PROP_STEPS]["10"][PROP_COUNTERS]) == 7
+
+    # Upgraded data is stored as the current version, files of the previous version are kept
+    storage = storage_class(f"{tmp_path}/")
+
+    assert storage.load(100)["1"][PROP_PENDING] == [["2024-01-01", "2024-01-03"]]
+    assert (tmp_path / "site_100_v1.2.json").exists()
+
+    storage.close()